@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Aggregator Module
+This module reduces the per-cycle records of each location to window summaries,
+while passing significant changes through immediately.
+
+For each location, readings are collected in a window of
+AGGREGATION_CONFIG["window"] seconds, and one summary is uploaded when the first
+record past its end arrives.
+The summary is a normal format_data record stamped with the end of its window.
+Its readings are the window means, and it carries the per-metric statistics:
+
+    "aggregate": {
+        "window_start": "2025-04-14T15:00:00",
+        "window_end": "2025-04-14T16:00:00",
+        "samples": 12,
+        "metrics": {"soil.humidity": {"min": 61.2, "max": 64.0, "mean": 62.5, "count": 12}, ...}
+    }
+
+The database keeps summaries out of its latest readings.
+
+A record is instead uploaded as it is, with a "triggers" list saying why, when:
+- it is the first one of a location;
+- a reading moved past its deadband from the last uploaded sample (e.g. watering);
+- a reading crossed a threshold since the previous record;
+- a sensor stopped or resumed returning readings.
+Such a record is not counted in its window, so every reading reaches the server
+once, either raw or in a summary; a window of triggered records only has no summary.
+"""
+
+import copy
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from metrics.metrics import get_metrics
+from .config import AGGREGATION_CONFIG
+
+# Readings aggregated per location, as dotted paths into a format_data record
+METRICS = ["air.temperature", "air.humidity", "soil.humidity"]
+
+
+class Window:
+    """
+    Running statistics of one location's readings
+    """
+
+    def __init__(self, start: str):
+        self.start = start
+        self.samples = 0
+        self.stats = {path: {"min": None, "max": None, "sum": 0.0, "count": 0} for path in METRICS}
+
+    def add(self, values: Dict[str, Optional[float]]) -> None:
+        self.samples += 1
+        for path, value in values.items():
+            if value is None:
+                continue
+            stats = self.stats[path]
+            stats["min"] = value if stats["min"] is None else min(stats["min"], value)
+            stats["max"] = value if stats["max"] is None else max(stats["max"], value)
+            stats["sum"] += value
+            stats["count"] += 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            path: {
+                "min": stats["min"],
+                "max": stats["max"],
+                "mean": round(stats["sum"] / stats["count"], 2) if stats["count"] else None,
+                "count": stats["count"]
+            }
+            for path, stats in self.stats.items()
+        }
+
+
+class EdgeAggregator:
+    """
+    Turns a stream of format_data records into window summaries and triggered samples
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        """
+        Initialize the aggregator
+
+        Args:
+            config (dict): Overrides for AGGREGATION_CONFIG values
+        """
+        self.config = {**AGGREGATION_CONFIG, **(config or {})}
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Window] = {}
+        # Last record summarized in each location's window, the base of its summary
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        # Readings of each location's last uploaded sample, for the deadbands
+        self._reported: Dict[str, Dict[str, Optional[float]]] = {}
+        # Readings of each location's previous record, for the thresholds
+        self._previous: Dict[str, Dict[str, Optional[float]]] = {}
+
+    def add(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Add one record
+
+        Args:
+            record (dict): Record in the format_data schema
+
+        Returns:
+            list: Records to upload now, possibly none
+        """
+        if not self.config["enabled"]:
+            return [record]
+
+        location = record.get("location")
+        values = {path: _get_path(record, path) for path in METRICS}
+        metrics = get_metrics()
+        uploads = []
+        with self._lock:
+            window = self._windows.get(location)
+            if window is not None and _elapsed(window.start, record["timestamp"]) >= self.config["window"]:
+                summary = self._close(location, _shift(window.start, self.config["window"]))
+                if summary is not None:
+                    uploads.append(summary)
+                    metrics.inc("aggregation_records_total", kind="summary", location=location)
+                window = None
+            if window is None:
+                window = self._windows[location] = Window(record["timestamp"])
+
+            triggers = self._triggers(self._reported.get(location), self._previous.get(location), values)
+            self._previous[location] = values
+
+            if triggers:
+                sample = copy.deepcopy(record)
+                sample["triggers"] = triggers
+                uploads.append(sample)
+                self._reported[location] = values
+                metrics.inc("aggregation_records_total", kind="sample", location=location)
+            else:
+                window.add(values)
+                self._latest[location] = record
+
+        if not uploads:
+            metrics.inc("aggregation_records_total", kind="suppressed", location=location)
+        return uploads
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        Close every open window, e.g. before shutting down
+
+        Returns:
+            list: One summary per location with buffered readings
+        """
+        with self._lock:
+            summaries = [self._close(location) for location in list(self._windows)]
+        return [summary for summary in summaries if summary is not None]
+
+    def _close(self, location: str, end: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # A window still open ends with its last record
+        window = self._windows.pop(location)
+        record = self._latest.pop(location, None)
+        if not window.samples or record is None:
+            return None
+        summary = window.summary()
+        record = copy.deepcopy(record)
+        record["timestamp"] = end or record["timestamp"]
+        for path, stats in summary.items():
+            _set_path(record, path, stats["mean"])
+        record["aggregate"] = {"window_start": window.start, "window_end": record["timestamp"],
+                               "samples": window.samples, "metrics": summary}
+        return record
+
+    def _triggers(self, reported: Optional[Dict[str, Optional[float]]],
+                  previous_values: Optional[Dict[str, Optional[float]]],
+                  values: Dict[str, Optional[float]]) -> List[Dict[str, str]]:
+        if reported is None:
+            return [{"metric": "*", "reason": "initial"}]
+
+        triggers = []
+        for path, value in values.items():
+            previous = reported.get(path)
+            if value is None or previous is None:
+                if (value is None) != (previous is None):
+                    triggers.append({"metric": path, "reason": "fault" if value is None else "recovered"})
+                continue
+
+            deadband = self.config["deadbands"].get(path)
+            if deadband is not None and abs(value - previous) > deadband:
+                triggers.append({"metric": path, "reason": "deadband"})
+                continue
+
+            # Crossed since the previous record, whether or not that one was uploaded
+            last = (previous_values or {}).get(path)
+            if last is None:
+                continue
+            for limit in self.config["thresholds"].get(path, {}).values():
+                if (last < limit) != (value < limit):
+                    triggers.append({"metric": path, "reason": "threshold"})
+                    break
+        return triggers
+
+
+def _elapsed(start: str, end: str) -> float:
+    try:
+        return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+    except (TypeError, ValueError):
+        # Unparseable timestamps close the window on every record rather than never
+        return float("inf")
+
+
+def _shift(timestamp: str, seconds: float) -> Optional[str]:
+    try:
+        return (datetime.fromisoformat(timestamp) + timedelta(seconds=seconds)).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_path(record: Dict[str, Any], path: str) -> Any:
+    for key in path.split("."):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def _set_path(record: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, leaf = path.split(".")
+    for key in parents:
+        record = record.setdefault(key, {})
+    record[leaf] = value
@@ -0,0 +1,23 @@
+"""
+Aggregation Configuration
+This module contains configuration settings for on-device aggregation.
+"""
+
+# Aggregation Configuration
+AGGREGATION_CONFIG = {
+    "enabled": True,
+    # Seconds of readings summarized into one uploaded record per location
+    "window": 3600,
+    # A reading is uploaded at once when it differs from the last uploaded value by more than this
+    "deadbands": {
+        "air.temperature": 1.0,
+        "air.humidity": 5.0,
+        "soil.humidity": 5.0
+    },
+    # ... or when it crosses one of these limits in either direction
+    "thresholds": {
+        "air.temperature": {"min": 10.0, "max": 32.0},
+        "air.humidity": {"min": 25.0, "max": 90.0},
+        "soil.humidity": {"min": 30.0, "max": 95.0}
+    }
+}
@@ -0,0 +1,268 @@
+import asyncio
+import copy
+import inspect
+import logging
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pymongo.errors import BulkWriteError, CollectionInvalid, ConnectionFailure, PyMongoError
+from pymongo.server_api import ServerApi
+from metrics.metrics import get_metrics
+from .buffered_writer import AsyncBufferedWriter
+from .config import ASYNC_MONGO_CONFIG, LATEST_CONFIG, MONGO_CONFIG
+from .db_connection import (INDEXES, LATEST_COLLECTIONS, TIMESERIES_COLLECTIONS, _latest_cache, _load_env,
+                            _provision_lock, _provisioned, latest_entry_id, latest_write_failures, latest_writes,
+                            newest_per_key, timestamp_key)
+
+try:
+    # PyMongo's native asyncio client (4.10+), or motor on older installations
+    from pymongo import AsyncMongoClient
+except ImportError:
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    except ImportError:
+        AsyncMongoClient = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseConnection:
+    """
+    asyncio counterpart of DatabaseConnection, for services that take uploads
+    from many collectors in one event loop
+
+    Offers the same inserts, get_latest_* lookups and buffered writer as
+    coroutines, with the same configuration, provisioning, latest collection and
+    latest cache. Inserts write their latest entries before returning, like
+    DatabaseConnection.
+
+    Connects on first use. At most ASYNC_MONGO_CONFIG["max_in_flight"]
+    operations run at once; the rest wait for a slot instead of piling up in the
+    connection pool's wait queue.
+    """
+
+    def __init__(self, ensure_indexes: bool = True, ensure_timeseries: bool = True,
+                 uri: Optional[str] = None, database: Optional[str] = None,
+                 max_in_flight: int = ASYNC_MONGO_CONFIG['max_in_flight'], **client_options: Any):
+        _load_env()
+
+        self.auto_index = ensure_indexes
+        self.auto_timeseries = ensure_timeseries
+        self.uri = uri
+        self.database = database or MONGO_CONFIG['database']
+        self.client_options = {**MONGO_CONFIG['client_options'], **ASYNC_MONGO_CONFIG['client_options'],
+                               **client_options}
+        self.client = None
+        self.db = None
+        self.writers: List[AsyncBufferedWriter] = []
+        self._connect_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def connect(self) -> None:
+        # Every operation calls connect, so skip the lock once connected
+        if self.client is not None:
+            return
+        async with self._connect_lock:
+            if self.client is not None:
+                return
+            if AsyncMongoClient is None:
+                raise ImportError("AsyncDatabaseConnection requires pymongo>=4.10 or motor")
+
+            mongo_uri = self.uri or os.getenv(MONGO_CONFIG['uri_env'])
+            if not mongo_uri:
+                raise ValueError(f"{MONGO_CONFIG['uri_env']} environment variable not set")
+
+            client = AsyncMongoClient(mongo_uri, server_api=ServerApi('1'), **self.client_options)
+            try:
+                await client.admin.command('ping')
+                logger.info("Successfully connected to MongoDB", extra={"database": self.database})
+            except ConnectionFailure as e:
+                logger.error("Failed to connect to MongoDB: %s", e, extra={"database": self.database})
+                await _maybe_await(client.close())
+                raise
+
+            self.client = client
+            self.db = client[self.database]
+
+            # Shared with DatabaseConnection, so each database is provisioned once per process.
+            # The lock is not held across awaits, where it would block the event loop; two
+            # connections may then provision at the same time, which is harmless.
+            with _provision_lock:
+                timeseries = self.auto_timeseries and (mongo_uri, self.database, 'timeseries') not in _provisioned
+                indexes = self.auto_index and (mongo_uri, self.database, 'indexes') not in _provisioned
+            if timeseries:
+                await self.ensure_timeseries_collections()
+                with _provision_lock:
+                    _provisioned.add((mongo_uri, self.database, 'timeseries'))
+            if indexes:
+                await self.ensure_indexes()
+                with _provision_lock:
+                    _provisioned.add((mongo_uri, self.database, 'indexes'))
+
+    async def insert_plant_data(self, data: Dict[str, Any]) -> str:
+        return await self._insert('plant_data', data)
+
+    async def insert_weather_data(self, data: Dict[str, Any]) -> str:
+        return await self._insert('weather_data', data)
+
+    async def insert_news_data(self, data: Dict[str, Any]) -> str:
+        return await self._insert('news_data', data)
+
+    async def _insert(self, collection: str, data: Dict[str, Any]) -> str:
+        await self.connect()
+
+        document = dict(data)
+        document['timestamp'] = datetime.utcnow()
+        async with self._in_flight:
+            with get_metrics().timed('db_insert', collection=collection):
+                result = await self.db[collection].insert_one(document)
+        await self._update_latest(collection, [document])
+        return str(result.inserted_id)
+
+    async def get_latest_plant_data(self, location: Optional[str] = None) -> Dict[str, Any]:
+        """Newest plant document, of one location or of all of them"""
+        if location is not None:
+            return await self._get_latest('plant_data', location)
+
+        latest = await self.get_latest_by_location('plant_data')
+        if not latest:
+            # Nothing mirrored yet; the backfilled location serves the next lookup
+            return await self._backfill_latest('plant_data', None)
+        return max(latest.values(), key=timestamp_key)
+
+    async def get_latest_weather_data(self) -> Dict[str, Any]:
+        return await self._get_latest('weather_data', None)
+
+    async def get_latest_news(self) -> List[Dict[str, Any]]:
+        await self.connect()
+        async with self._in_flight:
+            return await self.db.news_data.find(sort=[('timestamp', -1)], limit=5).to_list(5)
+
+    async def get_latest_by_location(self, collection: str = 'plant_data') -> Dict[Any, Dict[str, Any]]:
+        """Newest document of every location, in one query on the latest collection"""
+        await self.connect()
+
+        async def load():
+            async with self._in_flight:
+                entries = await self.db[LATEST_CONFIG['collection']].find({'collection': collection}).to_list(None)
+            return {entry['key']: entry['document'] for entry in entries} or None
+
+        latest = await self._cached(f'{collection}/*', load)
+        return copy.deepcopy(latest) if latest else {}
+
+    async def _get_latest(self, collection: str, key: Any) -> Optional[Dict[str, Any]]:
+        await self.connect()
+        entry_id = latest_entry_id(collection, key)
+
+        async def load():
+            async with self._in_flight:
+                entry = await self.db[LATEST_CONFIG['collection']].find_one({'_id': entry_id})
+            if entry is not None:
+                return entry['document']
+            # Not mirrored yet; backfill from the history like DatabaseConnection
+            return await self._backfill_latest(collection, key)
+
+        return copy.deepcopy(await self._cached(entry_id, load))
+
+    async def _backfill_latest(self, collection: str, key: Any) -> Optional[Dict[str, Any]]:
+        field = LATEST_COLLECTIONS[collection]
+        query = {field: key} if field and key is not None else {}
+        async with self._in_flight:
+            document = await self.db[collection].find_one(
+                {**query, 'aggregate': {'$exists': False}}, sort=[('timestamp', -1)]
+            )
+        if document is not None:
+            await self._update_latest(collection, [document])
+        return document
+
+    async def _cached(self, entry_id: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        key = (self.uri, self.database, entry_id)
+        missing = object()
+        value = _latest_cache.get(key, missing)
+        if value is missing:
+            value = await load()
+            if value is not None:
+                _latest_cache.put(key, value)
+        return value
+
+    async def _update_latest(self, collection: str, documents: List[Dict[str, Any]]) -> None:
+        newest = newest_per_key(collection, documents)
+        if newest:
+            await self._write_latest(collection, newest)
+
+    async def _write_latest(self, collection: str, newest: Dict[Any, Dict[str, Any]]) -> None:
+        try:
+            async with self._in_flight:
+                await self.db[LATEST_CONFIG['collection']].bulk_write(latest_writes(collection, newest), ordered=False)
+        except BulkWriteError as e:
+            for failure in latest_write_failures(e):
+                logger.warning("Error updating latest %s: %s", collection, failure.get('errmsg'),
+                               extra={"collection": collection, "code": failure.get('code')})
+        except PyMongoError as e:
+            logger.warning("Error updating latest %s: %s", collection, e, extra={"collection": collection})
+        self._invalidate_latest(collection, newest)
+
+    def _invalidate_latest(self, collection: str, newest: Dict[Any, Dict[str, Any]]) -> None:
+        _latest_cache.invalidate((self.uri, self.database, f'{collection}/*'))
+        for key in newest:
+            _latest_cache.invalidate((self.uri, self.database, latest_entry_id(collection, key)))
+
+    async def is_timeseries(self, collection: str) -> bool:
+        await self.connect()
+        cursor = await self.db.list_collections(filter={'name': collection})
+        async for info in cursor:
+            return info.get('type') == 'timeseries'
+        return False
+
+    async def ensure_timeseries_collections(self) -> List[str]:
+        """Create missing time-series collections; existing plain ones need migrate_to_timeseries"""
+        created = []
+        existing = set(await self.db.list_collection_names())
+        for collection, options in TIMESERIES_COLLECTIONS.items():
+            if collection in existing:
+                if not await self.is_timeseries(collection):
+                    logger.warning("%s is not a time-series collection, run migrate_to_timeseries", collection,
+                                   extra={"collection": collection})
+                continue
+            try:
+                await self.db.create_collection(collection, timeseries=options)
+                created.append(collection)
+            except CollectionInvalid:
+                pass
+        return created
+
+    async def ensure_indexes(self) -> Dict[str, List[str]]:
+        return {
+            collection: await self.db[collection].create_indexes(indexes)
+            for collection, indexes in INDEXES.items()
+        }
+
+    async def buffered_writer(self, max_size: int = 500, max_age: float = 5.0) -> AsyncBufferedWriter:
+        await self.connect()
+        writer = AsyncBufferedWriter(self.db, max_size=max_size, max_age=max_age, on_insert=self._update_latest)
+        self.writers.append(writer)
+        return writer
+
+    async def close(self) -> None:
+        for writer in self.writers:
+            await writer.close()
+        self.writers = []
+
+        if self.client is not None:
+            await _maybe_await(self.client.close())
+            self.client = None
+            self.db = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def _maybe_await(result: Any) -> Any:
+    # AsyncMongoClient.close is a coroutine, motor's is not
+    if inspect.isawaitable(result):
+        return await result
+    return result
@@ -0,0 +1,372 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+from metrics.metrics import get_metrics
+from .config import BUFFERED_WRITER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Server error code for a duplicate _id; for a document requeued after a
+# connection failure it means the failed attempt did insert it
+DUPLICATE_KEY_ERROR = 11000
+
+
+class BufferedWriter:
+    """
+    Accumulates documents per collection and writes them with insert_many
+
+    A collection's buffer is flushed when it reaches max_size documents, when its
+    oldest document is older than max_age seconds, and on flush(), close() or
+    context-manager exit. The age is checked on every add and by a background
+    thread, started with the first add, so an idle buffer is written too. on_insert,
+    if given, is called after each flush with the collection and the documents that
+    were written.
+
+    Delivery is at least once: documents whose insert_many failed with a connection
+    error are retried, although the server may have written some of them. Where
+    _id is unique they are then refused as duplicates and counted as inserted, but
+    time-series collections have no unique _id index and store them twice.
+
+    After a connection failure, size and age flushes of that collection wait
+    retry_backoff seconds, doubling up to max_retry_backoff while it keeps failing.
+    At most max_pending documents are kept per collection meanwhile; older ones are
+    dropped and reported as errors. A requeued document only becomes an error when
+    it is dropped or still cannot be written on close().
+    """
+
+    def __init__(self, db, max_size: int = 500, max_age: float = 5.0,
+                 on_insert: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None,
+                 max_pending: int = BUFFERED_WRITER_CONFIG["max_pending"],
+                 retry_backoff: float = BUFFERED_WRITER_CONFIG["retry_backoff"],
+                 max_retry_backoff: float = BUFFERED_WRITER_CONFIG["max_retry_backoff"]):
+        self.db = db
+        self.max_size = max_size
+        self.max_age = max_age
+        self.on_insert = on_insert
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.errors: List[Dict[str, Any]] = []
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._oldest: Dict[str, float] = {}
+        self._requeued_ids = set()
+        # collection -> (current backoff, monotonic time of the next size or age flush)
+        self._retry: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+        self._timer_stop = threading.Event()
+
+    def add(self, collection: str, data: Dict[str, Any],
+            timestamp: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Buffer a copy of data stamped with timestamp, or the current time; returns
+        the flush result if one was triggered
+        """
+        self._start_timer()
+        if self._buffer(collection, data, timestamp):
+            return self.flush(collection)
+        return None
+
+    def add_plant_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.add('plant_data', data)
+
+    def add_weather_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.add('weather_data', data)
+
+    def add_news_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.add('news_data', data)
+
+    def flush_if_due(self) -> Dict[str, Any]:
+        """Flush only the collections whose buffers have exceeded max_age and are not backing off"""
+        with self._lock:
+            due = [name for name in self._buffers if self._is_stale(name) and not self._backing_off(name)]
+        return self._merge([self._flush_collection(name) for name in due])
+
+    def flush(self, collection: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Write buffered documents with insert_many(ordered=False)
+
+        Returns a dict with the number of documents inserted and a list of
+        per-document errors ({collection, document, code, message}). Errors are
+        also appended to self.errors. On a connection failure the documents are
+        kept and retried later, without being reported; on any other server error
+        they are reported as errors and dropped from the buffer.
+        """
+        with self._lock:
+            names = [collection] if collection is not None else list(self._buffers)
+        return self._merge([self._flush_collection(name) for name in names])
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(buffer) for buffer in self._buffers.values())
+
+    def close(self) -> Dict[str, Any]:
+        with self._lock:
+            timer, stop, self._timer = self._timer, self._timer_stop, None
+        if timer is not None:
+            stop.set()
+            timer.join()
+        # Last attempt: documents that still cannot be written are reported
+        with self._lock:
+            names = list(self._buffers)
+        return self._merge([self._flush_collection(name, final=True) for name in names])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _start_timer(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer_stop = threading.Event()
+            self._timer = threading.Thread(target=self._flush_stale, args=(self._timer_stop,),
+                                           name='buffered-writer', daemon=True)
+            self._timer.start()
+
+    def _flush_stale(self, stop: threading.Event) -> None:
+        # A buffer is written at most max_age / 2 after it became due
+        while not stop.wait(max(self.max_age / 2, 0.1)):
+            try:
+                self.flush_if_due()
+            except Exception as e:
+                logger.exception("Error flushing buffered documents: %s", e)
+
+    def _buffer(self, collection: str, data: Dict[str, Any], timestamp: Optional[datetime] = None) -> bool:
+        # Returns whether the collection is due for a flush
+        document = dict(data)
+        document['timestamp'] = timestamp or datetime.utcnow()
+
+        with self._lock:
+            buffer = self._buffers.setdefault(collection, [])
+            if not buffer:
+                self._oldest[collection] = time.monotonic()
+            buffer.append(document)
+            dropped = self._trim(collection)
+            due = not self._backing_off(collection) and \
+                (len(buffer) >= self.max_size or self._is_stale(collection))
+        self._report(collection, self._dropped_errors(collection, dropped), 'dropped')
+        return due
+
+    def _is_stale(self, collection: str) -> bool:
+        return bool(self._buffers.get(collection)) and \
+            time.monotonic() - self._oldest[collection] >= self.max_age
+
+    def _backing_off(self, collection: str) -> bool:
+        # Called with self._lock held
+        return collection in self._retry and time.monotonic() < self._retry[collection][1]
+
+    def _trim(self, collection: str) -> List[Dict[str, Any]]:
+        # Called with self._lock held; drops the oldest documents beyond max_pending
+        buffer = self._buffers[collection]
+        excess = len(buffer) - self.max_pending
+        if excess <= 0:
+            return []
+        dropped = buffer[:excess]
+        del buffer[:excess]
+        self._requeued_ids.difference_update(document.get('_id') for document in dropped)
+        return dropped
+
+    def _dropped_errors(self, collection: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if documents:
+            logger.error("Dropped %d buffered %s document(s) while MongoDB is unreachable", len(documents),
+                         collection, extra={"collection": collection, "max_pending": self.max_pending})
+        return [{'collection': collection, 'document': document, 'code': None,
+                 'message': f'dropped, more than {self.max_pending} documents pending'} for document in documents]
+
+    def _report(self, collection: str, errors: List[Dict[str, Any]], result: str = 'failed') -> None:
+        # Records documents that were given up, as refused ('failed') or for lack of room ('dropped')
+        if not errors:
+            return
+        get_metrics().inc('db_documents_total', len(errors), collection=collection, result=result)
+        with self._lock:
+            self.errors.extend(errors)
+
+    def _flush_collection(self, collection: str, final: bool = False) -> Dict[str, Any]:
+        documents, oldest = self._take(collection)
+        if not documents:
+            return {'inserted': 0, 'errors': []}
+
+        started = time.perf_counter()
+        try:
+            result = self.db[collection].insert_many(documents, ordered=False)
+        except PyMongoError as e:
+            outcome, written = self._complete(collection, documents, oldest, started, error=e, final=final)
+        else:
+            outcome, written = self._complete(collection, documents, oldest, started, len(result.inserted_ids))
+
+        if self.on_insert is not None and written:
+            self.on_insert(collection, written)
+        return outcome
+
+    def _take(self, collection: str) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        with self._lock:
+            return self._buffers.pop(collection, []), self._oldest.pop(collection, None)
+
+    def _complete(self, collection: str, documents: List[Dict[str, Any]], oldest: Optional[float],
+                  started: float, inserted: int = 0, error: Optional[Exception] = None,
+                  final: bool = False) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        # Accounts for one insert_many; returns the flush result and the documents written
+        errors = []
+        failed = set()
+        requeued = False
+        if isinstance(error, BulkWriteError):
+            inserted = error.details.get('nInserted', 0)
+            for write_error in error.details.get('writeErrors', []):
+                document = documents[write_error['index']]
+                if write_error.get('code') == DUPLICATE_KEY_ERROR and document.get('_id') in self._requeued_ids:
+                    inserted += 1
+                    continue
+                failed.add(write_error['index'])
+                errors.append({
+                    'collection': collection,
+                    'document': document,
+                    'code': write_error.get('code'),
+                    'message': write_error.get('errmsg')
+                })
+        elif isinstance(error, ConnectionFailure) and not final:
+            # insert_many has assigned _ids, so documents the failed attempt wrote are
+            # recognised as duplicates on retry, except in time-series collections
+            with self._lock:
+                self._buffers[collection] = documents + self._buffers.get(collection, [])
+                self._oldest[collection] = oldest
+                self._requeued_ids.update(document['_id'] for document in documents if '_id' in document)
+                dropped = self._trim(collection)
+                backoff = self._retry[collection][0] * 2 if collection in self._retry else self.retry_backoff
+                backoff = min(backoff, self.max_retry_backoff)
+                self._retry[collection] = (backoff, time.monotonic() + backoff)
+            logger.warning("Could not write %d %s document(s), retrying in %.1fs: %s", len(documents), collection,
+                           backoff, error, extra={"collection": collection})
+            errors = self._dropped_errors(collection, dropped)
+            requeued = True
+        elif error is not None:
+            # Not transient (e.g. OperationFailure): reported instead of retried forever
+            logger.error("Failed to write %d %s document(s): %s", len(documents), collection, error,
+                         extra={"collection": collection, "code": getattr(error, 'code', None)})
+            errors = [{'collection': collection, 'document': document, 'code': getattr(error, 'code', None),
+                       'message': str(error)} for document in documents]
+            failed = set(range(len(documents)))
+
+        metrics = get_metrics()
+        metrics.observe('stage_duration_seconds', time.perf_counter() - started, stage='db_insert', collection=collection)
+        metrics.inc('stage_total', stage='db_insert', collection=collection,
+                    result='failure' if errors or requeued else 'success')
+        metrics.inc('db_documents_total', inserted, collection=collection, result='inserted')
+
+        with self._lock:
+            if not requeued:
+                self._requeued_ids.difference_update(document.get('_id') for document in documents)
+                self._retry.pop(collection, None)
+        self._report(collection, errors, 'dropped' if requeued else 'failed')
+
+        written = [] if requeued else [document for index, document in enumerate(documents) if index not in failed]
+        return {'inserted': inserted, 'errors': errors}, written
+
+    @staticmethod
+    def _merge(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'inserted': sum(result['inserted'] for result in results),
+            'errors': [error for result in results for error in result['errors']]
+        }
+
+
+class AsyncBufferedWriter(BufferedWriter):
+    """
+    asyncio counterpart of BufferedWriter for an AsyncMongoClient or motor database
+
+    Same behaviour and results; add, add_*_data, flush, flush_if_due and close are
+    awaited, collections are flushed concurrently, and on_insert may be a
+    coroutine function. Idle buffers are written by a task on the running loop
+    instead of a thread. Use it with async with; plain with raises TypeError.
+    """
+
+    _task: Optional[asyncio.Task] = None
+    _task_stop: Optional[asyncio.Event] = None
+
+    async def add(self, collection: str, data: Dict[str, Any],
+                  timestamp: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        if self._task is None:
+            self._task_stop = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._flush_stale(self._task_stop))
+        if self._buffer(collection, data, timestamp):
+            return await self.flush(collection)
+        return None
+
+    async def add_plant_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self.add('plant_data', data)
+
+    async def add_weather_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self.add('weather_data', data)
+
+    async def add_news_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self.add('news_data', data)
+
+    async def flush_if_due(self) -> Dict[str, Any]:
+        with self._lock:
+            due = [name for name in self._buffers if self._is_stale(name) and not self._backing_off(name)]
+        return self._merge(await asyncio.gather(*(self._flush_collection(name) for name in due)))
+
+    async def flush(self, collection: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            names = [collection] if collection is not None else list(self._buffers)
+        return self._merge(await asyncio.gather(*(self._flush_collection(name) for name in names)))
+
+    async def close(self) -> Dict[str, Any]:
+        task, self._task = self._task, None
+        if task is not None:
+            # Stopped rather than cancelled, which could abandon documents mid-flush
+            self._task_stop.set()
+            await task
+        with self._lock:
+            names = list(self._buffers)
+        return self._merge(await asyncio.gather(*(self._flush_collection(name, final=True) for name in names)))
+
+    def __enter__(self):
+        raise TypeError("AsyncBufferedWriter is used with 'async with'")
+
+    def __exit__(self, exc_type, exc, tb):
+        raise TypeError("AsyncBufferedWriter is used with 'async with'")
+
+    async def _flush_stale(self, stop: asyncio.Event) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), max(self.max_age / 2, 0.1))
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush_if_due()
+            except Exception as e:
+                logger.exception("Error flushing buffered documents: %s", e)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _flush_collection(self, collection: str, final: bool = False) -> Dict[str, Any]:
+        documents, oldest = self._take(collection)
+        if not documents:
+            return {'inserted': 0, 'errors': []}
+
+        started = time.perf_counter()
+        try:
+            result = await self.db[collection].insert_many(documents, ordered=False)
+        except PyMongoError as e:
+            outcome, written = self._complete(collection, documents, oldest, started, error=e, final=final)
+        else:
+            outcome, written = self._complete(collection, documents, oldest, started, len(result.inserted_ids))
+
+        if self.on_insert is not None and written:
+            pending = self.on_insert(collection, written)
+            if inspect.isawaitable(pending):
+                await pending
+        return outcome
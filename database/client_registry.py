@@ -0,0 +1,63 @@
+import threading
+from typing import Any, Dict, Tuple
+from pymongo import MongoClient
+from pymongo.server_api import ServerApi
+
+# (uri, options) -> [client, reference count]
+_clients: Dict[Tuple[str, Tuple], list] = {}
+_lock = threading.Lock()
+
+
+def _key(uri: str, options: Dict[str, Any]) -> Tuple[str, Tuple]:
+    return uri, tuple(sorted(options.items()))
+
+
+def acquire_client(uri: str, options: Dict[str, Any]) -> Tuple[MongoClient, bool]:
+    """
+    Get the process-wide client for uri and options, creating it on first use
+
+    Returns the client and whether it was newly created. Every acquire must be
+    matched by a release_client call.
+    """
+    key = _key(uri, options)
+    with _lock:
+        entry = _clients.get(key)
+        if entry is not None:
+            entry[1] += 1
+            return entry[0], False
+
+        client = MongoClient(uri, server_api=ServerApi('1'), **options)
+        _clients[key] = [client, 1]
+        return client, True
+
+
+def release_client(client: MongoClient) -> None:
+    """Drop a reference to a shared client and close it when the last one is released"""
+    with _lock:
+        for key, entry in list(_clients.items()):
+            if entry[0] is client:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del _clients[key]
+                    client.close()
+                return
+
+
+def discard_client(client: MongoClient) -> None:
+    """
+    Drop a reference to a client that failed to connect and stop handing it out
+
+    Later acquires get a new client. The client is closed once no one else holds
+    it; other holders release it as usual.
+    """
+    with _lock:
+        for key, entry in list(_clients.items()):
+            if entry[0] is client:
+                del _clients[key]
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    client.close()
+                else:
+                    # Still found by release_client, but no longer under its uri
+                    _clients[('<discarded>', (('id', id(client)),))] = entry
+                return
@@ -0,0 +1,45 @@
+"""
+Database Configuration
+This module contains configuration settings for the MongoDB connection.
+"""
+
+# MongoDB Configuration
+MONGO_CONFIG = {
+    "uri_env": "MONGODB_URI",  # Environment variable holding the connection string
+    "database": "LeafMeAlone",
+    # Passed to MongoClient; one pool of this size is shared by every
+    # DatabaseConnection using the same URI in a process
+    "client_options": {
+        "maxPoolSize": 20,
+        "minPoolSize": 0,
+        "maxIdleTimeMS": 300000,
+        "serverSelectionTimeoutMS": 10000,
+        "connectTimeoutMS": 10000,
+        "socketTimeoutMS": 30000
+    }
+}
+
+# BufferedWriter: documents kept per collection while MongoDB is unreachable (the
+# oldest are dropped beyond that), and the wait before retrying a failed flush,
+# doubled on every further failure up to max_retry_backoff
+BUFFERED_WRITER_CONFIG = {
+    "max_pending": 10000,
+    "retry_backoff": 1.0,
+    "max_retry_backoff": 60.0
+}
+
+# "latest" collection: newest document per location, and the in-process cache in front of it
+LATEST_CONFIG = {
+    "collection": "latest",
+    "cache_ttl": 30,  # seconds a cached lookup is served without asking MongoDB
+    "cache_size": 256  # entries kept, least recently used evicted first
+}
+
+# AsyncDatabaseConnection: overrides of client_options, and the number of
+# operations allowed in flight at once (further ones wait for a slot)
+ASYNC_MONGO_CONFIG = {
+    "client_options": {
+        "maxPoolSize": 100
+    },
+    "max_in_flight": 500
+}
@@ -1,85 +1,699 @@
+import copy
+import logging
 import os
-from datetime import datetime
-from typing import Dict, Any, List
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+from bson import ObjectId
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from pymongo.server_api import ServerApi
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, ConnectionFailure, PyMongoError
+from metrics.metrics import get_metrics
+from .buffered_writer import DUPLICATE_KEY_ERROR, BufferedWriter
+from .cache import TTLCache
+from .client_registry import acquire_client, discard_client, release_client
+from .config import LATEST_CONFIG, MONGO_CONFIG
 
-class DatabaseConnection:
-    def __init__(self):
+logger = logging.getLogger(__name__)
+
+# Collections stored as time-series collections. weather_data has no per-location
+# field, so it has no metaField.
+TIMESERIES_COLLECTIONS = {
+    'plant_data': {'timeField': 'timestamp', 'metaField': 'location', 'granularity': 'minutes'},
+    'weather_data': {'timeField': 'timestamp', 'granularity': 'minutes'}
+}
+
+# Indexes backing the query methods below, created idempotently on connect
+INDEXES = {
+    'plant_data': [
+        IndexModel([('timestamp', DESCENDING)], name='timestamp_desc'),
+        IndexModel([('location', ASCENDING), ('timestamp', DESCENDING)], name='location_timestamp_desc')
+    ],
+    'weather_data': [
+        IndexModel([('timestamp', DESCENDING)], name='timestamp_desc')
+    ],
+    'news_data': [
+        IndexModel([('timestamp', DESCENDING)], name='timestamp_desc')
+    ],
+    LATEST_CONFIG['collection']: [
+        IndexModel([('collection', ASCENDING)], name='collection')
+    ]
+}
+
+# Collections mirrored into the latest collection, with the field holding the
+# location (None: a single entry for the whole collection)
+LATEST_COLLECTIONS = {
+    'plant_data': 'location',
+    'weather_data': None
+}
+
+# (collection, filter, sort, limit) issued by each query method, used by verify_indexes
+QUERY_SHAPES = {
+    'get_latest_plant_data': (LATEST_CONFIG['collection'], {'_id': 'plant_data/living_room'}, None, 1),
+    'get_latest_weather_data': (LATEST_CONFIG['collection'], {'_id': 'weather_data'}, None, 1),
+    'get_latest_news': ('news_data', {}, [('timestamp', -1)], 5),
+    'get_latest_by_location': (LATEST_CONFIG['collection'], {'collection': 'plant_data'}, None, 0)
+}
+
+# Numeric fields summarized per bucket by the range queries: output name -> document path
+PLANT_METRICS = {
+    'air_temperature': 'air.temperature',
+    'air_humidity': 'air.humidity',
+    'soil_humidity': 'soil.humidity',
+    'light_intensity': 'light.intensity',
+    'weather_temperature': 'weather.temperature',
+    'weather_precipitation': 'weather.precipitation',
+    'weather_cloud_cover': 'weather.cloud_cover'
+}
+WEATHER_METRICS = {
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'precipitation': 'precipitation',
+    'cloud_cover': 'cloud_cover'
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+_env_loaded = False
+_provisioned = set()
+_provision_lock = threading.Lock()
+
+# Lookups served from the latest collection, shared by every DatabaseConnection
+_latest_cache = TTLCache(LATEST_CONFIG['cache_size'], LATEST_CONFIG['cache_ttl'])
+
+
+def _load_env() -> None:
+    # .env is read once per process, however many connections are opened
+    global _env_loaded
+    if not _env_loaded:
         load_dotenv()
-        self.client = None
-        self.db = None
-        self.connect()
+        _env_loaded = True
+
+
+def latest_entry_id(collection: str, key: Any) -> str:
+    """_id in the latest collection of the entry for one location of a collection"""
+    return collection if key is None else f'{collection}/{key}'
+
+
+def newest_per_key(collection: str, documents: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """
+    Newest of documents per location, empty if collection is not mirrored into latest;
+    window summaries from edge aggregation are left out
+    """
+    field = LATEST_COLLECTIONS.get(collection, False)
+    if field is False:
+        return {}
+
+    newest = {}
+    for document in documents:
+        # Edge-aggregation summaries hold window means, not readings
+        if 'aggregate' in document:
+            continue
+        key = document.get(field) if field else None
+        if key not in newest or document['timestamp'] >= newest[key]['timestamp']:
+            newest[key] = document
+    return newest
+
+
+def latest_upsert(collection: str, key: Any, document: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Filter and update for upserting a latest entry
+
+    The timestamp condition keeps a newer entry from being overwritten; the
+    upsert then fails with a duplicate key, which callers ignore.
+    """
+    return (
+        {'_id': latest_entry_id(collection, key), 'timestamp': {'$lte': document['timestamp']}},
+        {'$set': {'collection': collection, 'key': key, 'timestamp': document['timestamp'], 'document': document}}
+    )
+
+
+def timestamp_key(document: Dict[str, Any]) -> datetime:
+    """Sort key of a document's timestamp, whether stored as a datetime or an ISO string"""
+    timestamp = DatabaseConnection._to_datetime(document.get('timestamp'))
+    if timestamp is None:
+        return EPOCH
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def latest_writes(collection: str, newest: Dict[Any, Dict[str, Any]]) -> List[UpdateOne]:
+    """Upserts of the latest entries of newest_per_key results, for one bulk_write"""
+    return [UpdateOne(*latest_upsert(collection, key, document), upsert=True) for key, document in newest.items()]
+
+
+def latest_write_failures(error: BulkWriteError) -> List[Dict[str, Any]]:
+    """Write errors of a latest bulk_write other than the duplicates of skipped older entries"""
+    return [failure for failure in error.details.get('writeErrors', []) if failure.get('code') != DUPLICATE_KEY_ERROR]
+
+class DatabaseConnection:
+    """
+    Connects lazily on first use of client or db, sharing one MongoClient (and
+    connection pool) per URI and client options across the process.
+
+    Inserts into the collections in LATEST_COLLECTIONS also upsert the newest
+    document per location into the latest collection, which the get_latest_*
+    methods read through an in-process TTL cache. Every insert writes its entries
+    right after the history write, with one bulk_write per batch, so other
+    processes see a reading in latest as soon as the insert call returns.
+
+    A client passed in, e.g. a mongomock client in tests, is used instead of the
+    shared one for uri. It is not pinged on connect nor closed by close().
+    """
+
+    def __init__(self, ensure_indexes: bool = True, ensure_timeseries: bool = True,
+                 uri: Optional[str] = None, database: Optional[str] = None,
+                 client: Optional[MongoClient] = None, **client_options: Any):
+        _load_env()
+
+        self.auto_index = ensure_indexes
+        self.auto_timeseries = ensure_timeseries
+        self.uri = uri
+        self.database = database or MONGO_CONFIG['database']
+        self.client_options = {**MONGO_CONFIG['client_options'], **client_options}
+        self._given_client = client
+        self._client = None
+        self._db = None
+        self.writers: List[BufferedWriter] = []
+
+    @property
+    def client(self) -> MongoClient:
+        if self._client is None:
+            self.connect()
+        return self._client
+
+    @property
+    def db(self):
+        if self._db is None:
+            self.connect()
+        return self._db
 
     def connect(self) -> None:
-        try:
+        if self._client is not None:
+            return
+
+        if self._given_client is not None:
+            client = self._given_client
+            # Provisioned per client object, as there may be no uri to key on
+            mongo_uri = f'<client {id(client)}>'
+        else:
             # Get MongoDB connection string from environment variable
-            mongo_uri = os.getenv('MONGODB_URI')
+            mongo_uri = self.uri or os.getenv(MONGO_CONFIG['uri_env'])
             if not mongo_uri:
-                raise ValueError("MONGODB_URI environment variable not set")
-
-            self.client = MongoClient(mongo_uri, server_api=ServerApi('1'))
-            self.db = self.client.LeafMeAlone
-            
-            # Verify connection
-            self.client.admin.command('ping')
-            print("Successfully connected to MongoDB!")
-            
-        except ConnectionFailure as e:
-            print(f"Failed to connect to MongoDB: {e}")
-            raise
+                raise ValueError(f"{MONGO_CONFIG['uri_env']} environment variable not set")
+
+            client, created = acquire_client(mongo_uri, self.client_options)
+            try:
+                if created:
+                    # Verify connection once per shared client
+                    client.admin.command('ping')
+                    logger.info("Successfully connected to MongoDB", extra={"database": self.database})
+            except ConnectionFailure as e:
+                logger.error("Failed to connect to MongoDB: %s", e, extra={"database": self.database})
+                discard_client(client)
+                raise
+
+        self._client = client
+        self._db = client[self.database]
+
+        # Schema provisioning only needs to happen once per process and database.
+        # Only what was actually done is marked, so an instance opened with
+        # provisioning off does not stop later ones from provisioning.
+        with _provision_lock:
+            if self.auto_timeseries and (mongo_uri, self.database, 'timeseries') not in _provisioned:
+                self.ensure_timeseries_collections()
+                _provisioned.add((mongo_uri, self.database, 'timeseries'))
+            if self.auto_index and (mongo_uri, self.database, 'indexes') not in _provisioned:
+                self.ensure_indexes()
+                _provisioned.add((mongo_uri, self.database, 'indexes'))
 
     def insert_plant_data(self, data: Dict[str, Any]) -> str:
-        if self.db is None:
-            raise ConnectionError("Database not connected")
-            
-        data['timestamp'] = datetime.utcnow()
-        result = self.db.plant_data.insert_one(data)
+        document = dict(data)
+        document['timestamp'] = datetime.utcnow()
+        with get_metrics().timed('db_insert', collection='plant_data'):
+            result = self.db.plant_data.insert_one(document)
+        self._update_latest('plant_data', [document])
         return str(result.inserted_id)
 
     def insert_weather_data(self, data: Dict[str, Any]) -> str:
-        if self.db is None:
-            raise ConnectionError("Database not connected")
-            
-        data['timestamp'] = datetime.utcnow()
-        result = self.db.weather_data.insert_one(data)
+        document = dict(data)
+        document['timestamp'] = datetime.utcnow()
+        with get_metrics().timed('db_insert', collection='weather_data'):
+            result = self.db.weather_data.insert_one(document)
+        self._update_latest('weather_data', [document])
         return str(result.inserted_id)
 
     def insert_news_data(self, data: Dict[str, Any]) -> str:
-        if self.db is None:
-            raise ConnectionError("Database not connected")
-            
-        data['timestamp'] = datetime.utcnow()
-        result = self.db.news_data.insert_one(data)
+        document = dict(data)
+        document['timestamp'] = datetime.utcnow()
+        with get_metrics().timed('db_insert', collection='news_data'):
+            result = self.db.news_data.insert_one(document)
         return str(result.inserted_id)
 
-    def get_latest_plant_data(self) -> Dict[str, Any]:
-        if self.db is None:
-            raise ConnectionError("Database not connected")
-            
-        return self.db.plant_data.find_one(
-            sort=[('timestamp', -1)]
-        )
+    def insert_plant_data_batch(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.insert_batch('plant_data', documents)
+
+    def insert_weather_data_batch(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.insert_batch('weather_data', documents)
+
+    def insert_batch(self, collection: str, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Insert documents with one insert_many(ordered=False)
+
+        Documents keep a datetime timestamp and are stamped with the current time
+        otherwise. Returns the number inserted and the documents the server
+        refused as errors ({index, code, message}). If the batch fails as a whole,
+        e.g. on a connection failure, the PyMongoError is raised; any part of the
+        batch may have been written then.
+        """
+        documents = [
+            {**data, 'timestamp': data['timestamp'] if isinstance(data.get('timestamp'), datetime)
+                else datetime.utcnow()}
+            for data in documents
+        ]
+        if not documents:
+            return {'inserted': 0, 'errors': []}
+
+        errors = []
+        with get_metrics().timed('db_insert', collection=collection) as timer:
+            try:
+                inserted = len(self.db[collection].insert_many(documents, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                inserted = e.details.get('nInserted', 0)
+                errors = [
+                    {'index': error['index'], 'code': error.get('code'), 'message': error.get('errmsg')}
+                    for error in e.details.get('writeErrors', [])
+                ]
+                timer.success = False
+
+        metrics = get_metrics()
+        metrics.inc('db_documents_total', inserted, collection=collection, result='inserted')
+        if errors:
+            metrics.inc('db_documents_total', len(errors), collection=collection, result='failed')
+
+        failed = {error['index'] for error in errors}
+        self._update_latest(collection, [document for index, document in enumerate(documents) if index not in failed])
+        return {'inserted': inserted, 'errors': errors}
+
+    def get_latest_plant_data(self, location: Optional[str] = None) -> Dict[str, Any]:
+        """Newest plant document, of one location or of all of them"""
+        if location is not None:
+            return self._get_latest('plant_data', location)
+
+        latest = self.get_latest_by_location('plant_data')
+        if not latest:
+            # Nothing mirrored yet; the backfilled location serves the next lookup
+            return self._backfill_latest('plant_data', None)
+        return max(latest.values(), key=timestamp_key)
 
     def get_latest_weather_data(self) -> Dict[str, Any]:
-        if self.db is None:
-            raise ConnectionError("Database not connected")
-            
-        return self.db.weather_data.find_one(
-            sort=[('timestamp', -1)]
-        )
+        return self._get_latest('weather_data', None)
+
+    def get_latest_by_location(self, collection: str = 'plant_data') -> Dict[Any, Dict[str, Any]]:
+        """Newest document of every location, in one query on the latest collection"""
+        def load():
+            entries = self.db[LATEST_CONFIG['collection']].find({'collection': collection})
+            return {entry['key']: entry['document'] for entry in entries} or None
+
+        latest = _latest_cache.get_or_load(self._latest_cache_key(f'{collection}/*'), load)
+        return copy.deepcopy(latest) if latest else {}
+
+    def rebuild_latest(self) -> int:
+        """Fill the latest collection from the history, e.g. after upgrading; returns the number of entries"""
+        entries = 0
+        for collection, field in LATEST_COLLECTIONS.items():
+            keys = self.db[collection].distinct(field) if field else [None]
+            for key in keys:
+                document = self.db[collection].find_one({field: key} if field else {}, sort=[('timestamp', -1)])
+                if document is not None:
+                    self._update_latest(collection, [document])
+                    entries += 1
+        return entries
+
+    def _get_latest(self, collection: str, key: Any) -> Optional[Dict[str, Any]]:
+        entry_id = latest_entry_id(collection, key)
+
+        def load():
+            entry = self.db[LATEST_CONFIG['collection']].find_one({'_id': entry_id})
+            if entry is not None:
+                return entry['document']
+            # Not mirrored yet (e.g. history from before the latest collection)
+            return self._backfill_latest(collection, key)
+
+        return copy.deepcopy(_latest_cache.get_or_load(self._latest_cache_key(entry_id), load))
+
+    def _backfill_latest(self, collection: str, key: Any) -> Optional[Dict[str, Any]]:
+        # Mirrors the newest history document of a location, or of any location when key is None
+        field = LATEST_COLLECTIONS[collection]
+        query = {field: key} if field and key is not None else {}
+        document = self.db[collection].find_one({**query, 'aggregate': {'$exists': False}}, sort=[('timestamp', -1)])
+        if document is not None:
+            self._update_latest(collection, [document])
+        return document
+
+    def _update_latest(self, collection: str, documents: List[Dict[str, Any]]) -> None:
+        newest = newest_per_key(collection, documents)
+        if newest:
+            self._write_latest(collection, newest)
+
+    def _write_latest(self, collection: str, newest: Dict[Any, Dict[str, Any]]) -> None:
+        try:
+            self.db[LATEST_CONFIG['collection']].bulk_write(latest_writes(collection, newest), ordered=False)
+        except BulkWriteError as e:
+            for failure in latest_write_failures(e):
+                logger.warning("Error updating latest %s: %s", collection, failure.get('errmsg'),
+                               extra={"collection": collection, "code": failure.get('code')})
+        except PyMongoError as e:
+            # The history write succeeded; the latest entry catches up on the next insert
+            logger.warning("Error updating latest %s: %s", collection, e, extra={"collection": collection})
+        # Also drops what a concurrent lookup loaded before the write
+        self._invalidate_latest(collection, newest)
+
+    def _invalidate_latest(self, collection: str, newest: Dict[Any, Dict[str, Any]]) -> None:
+        _latest_cache.invalidate(self._latest_cache_key(f'{collection}/*'))
+        for key in newest:
+            _latest_cache.invalidate(self._latest_cache_key(latest_entry_id(collection, key)))
+
+    def _latest_cache_key(self, entry_id: str) -> tuple:
+        return self.uri, self.database, entry_id
 
     def get_latest_news(self) -> List[Dict[str, Any]]:
-        if self.db is None:
-            raise ConnectionError("Database not connected")
-            
         return list(self.db.news_data.find(
             sort=[('timestamp', -1)],
             limit=5
         ))
 
+    def iter_plant_data(self, location: Optional[str] = None, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, bucket: Union[timedelta, float, None] = None,
+                        batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        query = {'location': location} if location is not None else {}
+        return self._iter_range('plant_data', PLANT_METRICS, query, start, end, bucket, batch_size)
+
+    def iter_weather_data(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          bucket: Union[timedelta, float, None] = None,
+                          batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        return self._iter_range('weather_data', WEATHER_METRICS, {}, start, end, bucket, batch_size)
+
+    def iter_inserted(self, collection: str, after: Optional[datetime] = None, before: Optional[datetime] = None,
+                      query: Optional[Dict[str, Any]] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the documents inserted in [after, before), in timestamp order
+
+        Insertion time is read from _id, the ObjectId the driver generates on insert,
+        so documents count when they arrived rather than when they were measured.
+        query narrows the selection further. The server sorts the selection,
+        spilling to disk if needed.
+        """
+        def bound(value: datetime) -> ObjectId:
+            # Naive datetimes are UTC, like the stored timestamps
+            return ObjectId.from_datetime(value if value.tzinfo else value.replace(tzinfo=timezone.utc))
+
+        match = dict(query or {})
+        if after is not None or before is not None:
+            match['_id'] = {}
+            if after is not None:
+                match['_id']['$gte'] = bound(after)
+            if before is not None:
+                match['_id']['$lt'] = bound(before)
+
+        cursor = self.db[collection].find(match, sort=[('timestamp', ASCENDING)], batch_size=batch_size,
+                                          allow_disk_use=True)
+        with cursor:
+            for document in cursor:
+                yield document
+
+    def _iter_range(self, collection: str, metrics: Dict[str, str], query: Dict[str, Any],
+                    start: Optional[datetime], end: Optional[datetime],
+                    bucket: Union[timedelta, float, None], batch_size: int) -> Iterator[Dict[str, Any]]:
+        """
+        Stream documents in [start, end) in timestamp order
+
+        Without a bucket, raw documents are yielded. With a bucket (timedelta or
+        seconds), the server groups documents into buckets of that width and each
+        yielded document is {timestamp, count, <metric>: {min, max, mean}}.
+        """
+        match = dict(query)
+        if start is not None or end is not None:
+            match['timestamp'] = {}
+            if start is not None:
+                match['timestamp']['$gte'] = start
+            if end is not None:
+                match['timestamp']['$lt'] = end
+
+        if bucket is None:
+            cursor = self.db[collection].find(match, sort=[('timestamp', ASCENDING)], batch_size=batch_size)
+        else:
+            cursor = self.db[collection].aggregate(
+                self._bucket_pipeline(match, metrics, bucket),
+                allowDiskUse=True,
+                batchSize=batch_size
+            )
+
+        with cursor:
+            for document in cursor:
+                yield document
+
+    @staticmethod
+    def _bucket_pipeline(match: Dict[str, Any], metrics: Dict[str, str],
+                         bucket: Union[timedelta, float]) -> List[Dict[str, Any]]:
+        seconds = bucket.total_seconds() if isinstance(bucket, timedelta) else bucket
+        bucket_ms = int(seconds * 1000)
+        if bucket_ms <= 0:
+            raise ValueError("bucket must be positive")
+
+        # date - date gives milliseconds and date - number gives a date, so this
+        # truncates timestamp to the bucket start on any server version
+        epoch_ms = {'$subtract': ['$timestamp', EPOCH]}
+        group = {
+            '_id': {'$subtract': ['$timestamp', {'$mod': [epoch_ms, bucket_ms]}]},
+            'count': {'$sum': 1}
+        }
+        project = {'_id': 0, 'timestamp': '$_id', 'count': 1}
+        for name, path in metrics.items():
+            group[f'{name}_min'] = {'$min': f'${path}'}
+            group[f'{name}_max'] = {'$max': f'${path}'}
+            group[f'{name}_mean'] = {'$avg': f'${path}'}
+            project[name] = {'min': f'${name}_min', 'max': f'${name}_max', 'mean': f'${name}_mean'}
+
+        return [
+            {'$match': match},
+            {'$group': group},
+            {'$sort': {'_id': 1}},
+            {'$project': project}
+        ]
+
+    def is_timeseries(self, collection: str) -> bool:
+        for info in self.db.list_collections(filter={'name': collection}):
+            return info.get('type') == 'timeseries'
+        return False
+
+    def ensure_timeseries_collections(self) -> List[str]:
+        """Create missing time-series collections; existing plain ones need migrate_to_timeseries"""
+        created = []
+        existing = set(self.db.list_collection_names())
+        for collection, options in TIMESERIES_COLLECTIONS.items():
+            if collection in existing:
+                if not self.is_timeseries(collection):
+                    logger.warning("%s is not a time-series collection, run migrate_to_timeseries", collection,
+                                   extra={"collection": collection})
+                continue
+            try:
+                self.db.create_collection(collection, timeseries=options)
+                created.append(collection)
+            except CollectionInvalid:
+                # Created concurrently by another process
+                pass
+        return created
+
+    def migrate_to_timeseries(self, collection: str, batch_size: int = 1000,
+                              drop_legacy: bool = False) -> Dict[str, Any]:
+        """
+        Migration of a plain collection into a time-series collection
+
+        The plain collection is renamed to <collection>_legacy and its documents are
+        copied in _id order and in batches into a new time-series collection. ISO-string
+        timestamps are converted to dates; documents without a usable timestamp are
+        skipped. Stop the writers first and keep them stopped until the migration is
+        complete, since an insert during the rename recreates a plain collection.
+
+        An interrupted migration is resumed by running it again: the copy continues
+        after the last document copied. A plain collection recreated next to the legacy
+        one is merged into it first. The migration is complete once the time-series
+        collection holds every legacy document with a timestamp; the legacy collection
+        is then dropped if drop_legacy is set, and otherwise kept for the operator to
+        check and drop. An incomplete migration never touches it.
+
+        Returns:
+            dict: copied, skipped and failed (refused by the server) documents of this
+            run, whether the migration is complete, and the legacy collection name
+            (None if there is none left)
+        """
+        if collection not in TIMESERIES_COLLECTIONS:
+            raise ValueError(f"No time-series options for {collection}")
+
+        legacy = f'{collection}_legacy'
+        result = {'copied': 0, 'skipped': 0, 'failed': 0, 'complete': False, 'legacy': legacy}
+        names = set(self.db.list_collection_names())
+        if legacy not in names:
+            if self.is_timeseries(collection):
+                return {**result, 'complete': True, 'legacy': None}
+            if collection not in names:
+                self.db.create_collection(collection, timeseries=TIMESERIES_COLLECTIONS[collection])
+                return {**result, 'complete': True, 'legacy': None}
+            self.db[collection].rename(legacy)
+        elif collection in names and not self.is_timeseries(collection):
+            if not self._merge_into_legacy(collection, legacy, batch_size):
+                return result
+            self.db[collection].drop()
+        if collection not in self.db.list_collection_names():
+            self.db.create_collection(collection, timeseries=TIMESERIES_COLLECTIONS[collection])
+
+        target = self.db[collection]
+        time_field = TIMESERIES_COLLECTIONS[collection]['timeField']
+        # Documents are copied in _id order with ordered inserts, so everything up to
+        # the newest _id already copied is in place
+        newest = target.find_one({}, {'_id': 1}, sort=[('_id', DESCENDING)])
+        if newest is not None:
+            with self.db[legacy].find({'_id': {'$lte': newest['_id']}}, {time_field: 1},
+                                      batch_size=batch_size) as cursor:
+                result['skipped'] += sum(self._to_datetime(document.get(time_field)) is None for document in cursor)
+
+        batch = []
+        query = {'_id': {'$gt': newest['_id']}} if newest is not None else {}
+        with self.db[legacy].find(query, sort=[('_id', ASCENDING)], batch_size=batch_size) as cursor:
+            for document in cursor:
+                timestamp = self._to_datetime(document.get(time_field))
+                if timestamp is None:
+                    result['skipped'] += 1
+                    continue
+                document[time_field] = timestamp
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    self._copy_batch(target, batch, result)
+                    batch = []
+        if batch:
+            self._copy_batch(target, batch, result)
+
+        if self.auto_index:
+            target.create_indexes(INDEXES[collection])
+
+        expected = self.db[legacy].count_documents({}) - result['skipped']
+        present = target.count_documents({})
+        result['complete'] = present == expected
+        if not result['complete']:
+            logger.warning("%s holds %d of %d documents, keeping %s", collection, present, expected, legacy,
+                           extra={"collection": collection, "present": present, "expected": expected})
+        elif drop_legacy:
+            self.db[legacy].drop()
+            result['legacy'] = None
+        logger.info("Migrated %d documents into time-series %s, skipped %d", result['copied'], collection,
+                    result['skipped'], extra={"collection": collection, **result})
+        return result
+
+    @staticmethod
+    def _copy_batch(target, batch: List[Dict[str, Any]], result: Dict[str, Any]) -> None:
+        # Ordered, so an interruption leaves a prefix of the batch; after a refused
+        # document the rest of the batch is copied on
+        while batch:
+            try:
+                result['copied'] += len(target.insert_many(batch, ordered=True).inserted_ids)
+                return
+            except BulkWriteError as e:
+                error = e.details['writeErrors'][0]
+                result['copied'] += e.details.get('nInserted', 0)
+                result['failed'] += 1
+                logger.error("Could not copy %s: %s", batch[error['index']].get('_id'), error.get('errmsg'),
+                             extra={"collection": target.name, "code": error.get('code')})
+                batch = batch[error['index'] + 1:]
+
+    def _merge_into_legacy(self, collection: str, legacy: str, batch_size: int) -> bool:
+        # Moves the documents of a plain collection recreated after the rename into
+        # the legacy one; returns whether every one of them is there
+        logger.warning("%s was recreated after being renamed to %s, merging it", collection, legacy,
+                       extra={"collection": collection})
+        merged = True
+        with self.db[collection].find(sort=[('_id', ASCENDING)], batch_size=batch_size) as cursor:
+            while True:
+                batch = [document for _, document in zip(range(batch_size), cursor)]
+                if not batch:
+                    return merged
+                try:
+                    self.db[legacy].insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Duplicates were merged by an earlier, interrupted run
+                    refused = [error for error in e.details['writeErrors'] if error.get('code') != DUPLICATE_KEY_ERROR]
+                    for error in refused:
+                        logger.error("Could not merge %s: %s", batch[error['index']].get('_id'), error.get('errmsg'),
+                                     extra={"collection": collection, "code": error.get('code')})
+                    merged = merged and not refused
+
+    @staticmethod
+    def _to_datetime(value: Any) -> Optional[datetime]:
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, str):
+            try:
+                parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        return None
+
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        # create_indexes is a no-op for indexes that already exist with the same spec
+        return {
+            collection: self.db[collection].create_indexes(indexes)
+            for collection, indexes in INDEXES.items()
+        }
+
+    def verify_indexes(self) -> Dict[str, Dict[str, Any]]:
+        """Explain every query method and flag the ones that fall back to a collection scan"""
+        report = {}
+        for method, (collection, query, sort, limit) in QUERY_SHAPES.items():
+            plan = self.db[collection].find(query, sort=sort, limit=limit).explain()
+            stages = self._plan_stages(plan.get('queryPlanner', {}).get('winningPlan', {}))
+            report[method] = {
+                'collection': collection,
+                'stages': stages,
+                'collection_scan': 'COLLSCAN' in stages
+            }
+            if 'COLLSCAN' in stages:
+                logger.warning("%s performs a collection scan on %s", method, collection,
+                               extra={"collection": collection, "method": method})
+        return report
+
+    @classmethod
+    def _plan_stages(cls, plan: Dict[str, Any]) -> List[str]:
+        # Plans nest through inputStage/inputStages, and through queryPlan on newer servers
+        stages = [plan['stage']] if 'stage' in plan else []
+        for key in ('queryPlan', 'inputStage'):
+            if key in plan:
+                stages += cls._plan_stages(plan[key])
+        for child in plan.get('inputStages', []):
+            stages += cls._plan_stages(child)
+        return stages
+
+    def buffered_writer(self, max_size: int = 500, max_age: float = 5.0) -> BufferedWriter:
+        writer = BufferedWriter(self.db, max_size=max_size, max_age=max_age, on_insert=self._update_latest)
+        self.writers.append(writer)
+        return writer
+
     def close(self) -> None:
-        if self.client is not None:
-            self.client.close() 
\ No newline at end of file
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+        if self._client is not None:
+            if self._given_client is None:
+                release_client(self._client)
+            self._client = None
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close() 
\ No newline at end of file
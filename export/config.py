@@ -0,0 +1,26 @@
+"""
+Export Configuration
+This module contains configuration settings for the Parquet export.
+"""
+
+import os
+from storage.config import DATA_DIR
+
+# Parquet Export Configuration
+EXPORT_CONFIG = {
+    "output_dir": os.path.join(DATA_DIR, "export"),
+    # Insertion time exported up to per collection, kept in the output directory
+    # (files starting with "_" are skipped by Parquet dataset readers)
+    "watermark_file": "_watermark.json",
+    # Subdirectory of the output directory holding one dataset per --since/--until range
+    "range_dir": "ranges",
+    "collections": ["plant_data", "weather_data"],
+    "batch_size": 5000,  # Documents per cursor batch
+    # Rows buffered per partition before they are written as one row group;
+    # memory use is about this times the number of locations
+    "row_group_size": 50000,
+    "compression": "zstd",
+    # Seconds; documents inserted more recently are left for the next run, so
+    # inserts still in flight when a run starts are not skipped
+    "settle": 60
+}
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Parquet Export Module
+This module exports plant_data and weather_data from MongoDB to Parquet files
+for offline analysis.
+
+Documents are streamed in timestamp order through a batched cursor, their
+nested air/soil/weather fields flattened into columns (air.temperature becomes
+air_temperature) and written as Arrow record batches into a Hive-partitioned
+dataset:
+
+    data/export/plant_data/date=2025-04-14/location=living_room/part-20250414T000000.parquet
+    data/export/weather_data/date=2025-04-14/part-20250414T000000.parquet
+
+Each run exports the documents inserted since the previous one, up to
+EXPORT_CONFIG["settle"] seconds ago, and then advances the watermark, so
+repeated runs only add new files. The watermark follows insertion time (the
+_id), not the readings' timestamps, so uploads that arrive late, e.g. from a
+collector's outbox, go into the next run and the partition of their day. Files
+are written under a temporary name and renamed when complete, and the watermark
+only moves once every file of a run is in place; a failed run is simply
+repeated. Memory use is bounded by the cursor batch and the rows buffered per
+open partition, not by the size of the collection.
+
+--since/--until re-export the readings of a time range into a dataset of their
+own, next to the incremental one rather than inside it, so readers of either
+never see a reading twice:
+
+    data/export/ranges/20250401T000000-20250415T000000/plant_data/date=2025-04-14/location=living_room/part.parquet
+
+Usage:
+    python -m export.parquet_export
+    python -m export.parquet_export --collections plant_data --since 2025-01-01 --output /tmp/export
+
+Requires pyarrow.
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+from database.db_connection import PLANT_METRICS, WEATHER_METRICS, DatabaseConnection
+from logs.structured import configure_logging, shutdown_logging
+from .config import EXPORT_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# (column, document path, kind) per collection; other fields are not exported
+COLUMNS = {
+    "plant_data": [(name, path, "float") for name, path in PLANT_METRICS.items()] + [
+        ("light_duration", "light.duration", "float"),
+        ("weather_moon_phase", "weather.moon_phase", "string"),
+        ("weather_air_quality", "weather.air_quality", "float")
+    ],
+    "weather_data": [(name, path, "float") for name, path in WEATHER_METRICS.items()] + [
+        ("moon_phase", "moon_phase", "string"),
+        ("air_quality", "air_quality", "float")
+    ]
+}
+
+# Field partitioned on besides the day; it is stored in the path rather than the files
+PARTITION_FIELDS = {
+    "plant_data": "location",
+    "weather_data": None
+}
+
+# Hive's name for the partition of documents without a value
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def export_schema(collection: str) -> "pa.Schema":
+    """Arrow schema of the files exported from a collection"""
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    kinds = {"float": pa.float64(), "string": pa.string()}
+    return pa.schema(
+        [pa.field("timestamp", pa.timestamp("ms", tz="UTC"), nullable=False)]
+        + [pa.field(name, kinds[kind]) for name, _, kind in COLUMNS[collection]]
+    )
+
+
+class _PartitionFile:
+    """One output file, with the rows not yet written to it"""
+
+    def __init__(self, path: str, schema: "pa.Schema", compression: str):
+        self.path = path
+        self.schema = schema
+        self.compression = compression
+        # Readers skip dot files, so an unfinished file is never picked up
+        self.temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        self.columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+        self.buffered = 0
+        self.rows = 0
+        self._writer = None
+
+    def append(self, row: Tuple[Any, ...]) -> None:
+        for values, value in zip(self.columns.values(), row):
+            values.append(value)
+        self.buffered += 1
+
+    def write(self) -> None:
+        """Write the buffered rows as one row group"""
+        if not self.buffered:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pq.ParquetWriter(self.temp_path, self.schema, compression=self.compression)
+        self._writer.write_batch(pa.RecordBatch.from_pydict(self.columns, schema=self.schema))
+        self.rows += self.buffered
+        self.columns = {name: [] for name in self.schema.names}
+        self.buffered = 0
+
+    def close(self) -> None:
+        self.write()
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self.temp_path, self.path)
+
+    def discard(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self.temp_path)
+
+
+class ParquetExporter:
+    """
+    Incremental export of MongoDB collections to a partitioned Parquet dataset
+    """
+
+    def __init__(self, db: DatabaseConnection, output_dir: str = EXPORT_CONFIG["output_dir"],
+                 config: Optional[dict] = None):
+        """
+        Initialize the exporter
+
+        Args:
+            db (DatabaseConnection): Source database
+            output_dir (str): Dataset root; one subdirectory per collection
+            config (dict): Overrides of EXPORT_CONFIG
+        """
+        if pa is None:
+            raise RuntimeError("Parquet export requires pyarrow")
+        self.db = db
+        self.output_dir = output_dir
+        self.config = {**EXPORT_CONFIG, **(config or {})}
+        self.watermark_path = os.path.join(output_dir, self.config["watermark_file"])
+        self.range_dir = os.path.join(output_dir, self.config["range_dir"])
+
+    def watermarks(self) -> Dict[str, datetime]:
+        """Insertion time up to which each collection has been exported (naive UTC)"""
+        return {
+            collection: datetime.fromisoformat(value["inserted"])
+            for collection, value in self._load_watermarks().items() if isinstance(value, dict)
+        }
+
+    def _load_watermarks(self) -> Dict[str, Any]:
+        # Watermarks of older versions are plain timestamps of the last exported reading
+        try:
+            with open(self.watermark_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def export(self, collection: str, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Export the documents of a collection
+
+        By default, exports the documents inserted since the last run and up to
+        EXPORT_CONFIG["settle"] seconds ago, then moves the watermark. With start or
+        end, exports the documents timestamped in [start, end) instead, e.g. to
+        re-export a range, into a separate dataset under range_dir named after the
+        range, and keeps the watermark.
+
+        Args:
+            collection (str): plant_data or weather_data
+            start (datetime): Start of the timestamps to re-export, or the beginning
+            end (datetime): End of the timestamps to re-export, or now
+
+        Returns:
+            dict: start, end, rows, skipped (documents without a usable timestamp) and files
+        """
+        if collection not in COLUMNS:
+            raise ValueError(f"Cannot export {collection!r}, expected one of {sorted(COLUMNS)}")
+
+        if start is not None or end is not None:
+            return self._export_range(collection, start, end or datetime.utcnow())
+
+        watermark = self._load_watermarks().get(collection)
+        after = datetime.fromisoformat(watermark["inserted"]) if isinstance(watermark, dict) else None
+        before = datetime.utcnow() - timedelta(seconds=self.config["settle"])
+        result = {"start": after, "end": before, "rows": 0, "skipped": 0, "files": []}
+        if after is not None and after >= before:
+            logger.info("Nothing to export from %s", collection, extra={"collection": collection})
+            return result
+
+        # Carry on from an older version's watermark by timestamp, once
+        query = _timestamp_range(datetime.fromisoformat(watermark), None) if isinstance(watermark, str) else None
+        documents = self.db.iter_inserted(collection, after, before, query, batch_size=self.config["batch_size"])
+        # Named after the start, so repeating a failed run replaces its files
+        name = f"part-{after:%Y%m%dT%H%M%S}" if after is not None else "part-initial"
+        self._write(collection, documents, self.output_dir, name, result)
+
+        self._save_watermark(collection, before)
+        logger.info("Exported %d %s rows to %d file(s)", result["rows"], collection, len(result["files"]),
+                    extra={"collection": collection, "start": after and after.isoformat(), "end": before.isoformat(),
+                           "skipped": result["skipped"]})
+        return result
+
+    def _export_range(self, collection: str, start: Optional[datetime], end: datetime) -> Dict[str, Any]:
+        result = {"start": start, "end": end, "rows": 0, "skipped": 0, "files": []}
+        if start is not None and start >= end:
+            logger.info("Nothing to export from %s", collection, extra={"collection": collection})
+            return result
+
+        documents = self.db.iter_inserted(collection, query=_timestamp_range(start, end),
+                                          batch_size=self.config["batch_size"])
+        # Exporting the same range again replaces its files
+        name = f"{start:%Y%m%dT%H%M%S}" if start is not None else "initial"
+        root = os.path.join(self.range_dir, f"{name}-{end:%Y%m%dT%H%M%S}")
+        self._write(collection, documents, root, "part", result, start, end)
+        logger.info("Exported %d %s rows to %d file(s)", result["rows"], collection, len(result["files"]),
+                    extra={"collection": collection, "start": start and start.isoformat(), "end": end.isoformat(),
+                           "skipped": result["skipped"]})
+        return result
+
+    def _write(self, collection: str, documents: Iterable[Dict[str, Any]], root: str, name: str,
+               result: Dict[str, Any], start: Optional[datetime] = None, end: Optional[datetime] = None) -> None:
+        schema = export_schema(collection)
+        columns = COLUMNS[collection]
+        partition_field = PARTITION_FIELDS[collection]
+
+        open_files: Dict[Tuple[date, Any], _PartitionFile] = {}
+        # Files per partition so far; the server sorts string timestamps before dates,
+        # so a day can come round twice and then gets a second file
+        file_counts: Dict[Tuple[date, Any], int] = {}
+        current_day = None
+        try:
+            for document in documents:
+                timestamp = _timestamp(document.get("timestamp"))
+                if timestamp is None:
+                    result["skipped"] += 1
+                    continue
+                # String timestamps are matched by text, which can be off by a time zone
+                if (start is not None and timestamp < start) or (end is not None and timestamp >= end):
+                    continue
+
+                # Documents arrive in timestamp order, so a new day closes the files of the previous one
+                day = timestamp.date()
+                if day != current_day:
+                    self._close(open_files, result)
+                    current_day = day
+
+                key = document.get(partition_field) if partition_field else None
+                partition = open_files.get((day, key))
+                if partition is None:
+                    count = file_counts[(day, key)] = file_counts.get((day, key), 0) + 1
+                    file_name = f"{name}.parquet" if count == 1 else f"{name}-{count}.parquet"
+                    path = self._partition_path(root, collection, day, partition_field, key, file_name)
+                    partition = open_files[(day, key)] = _PartitionFile(path, schema, self.config["compression"])
+
+                partition.append((timestamp,) + tuple(
+                    _coerce(_get_path(document, path), kind) for _, path, kind in columns
+                ))
+                if partition.buffered >= self.config["row_group_size"]:
+                    partition.write()
+                result["rows"] += 1
+
+            self._close(open_files, result)
+        except BaseException:
+            for partition in open_files.values():
+                partition.discard()
+            raise
+
+    def _close(self, open_files: Dict[Tuple[date, Any], _PartitionFile], result: Dict[str, Any]) -> None:
+        while open_files:
+            _, partition = open_files.popitem()
+            partition.close()
+            result["files"].append(partition.path)
+
+    @staticmethod
+    def _partition_path(root: str, collection: str, day: date, partition_field: Optional[str], key: Any,
+                        file_name: str) -> str:
+        parts = [root, collection, f"date={day.isoformat()}"]
+        if partition_field:
+            value = NULL_PARTITION if key is None else quote(str(key), safe="")
+            parts.append(f"{partition_field}={value}")
+        return os.path.join(*parts, file_name)
+
+    def _save_watermark(self, collection: str, end: datetime) -> None:
+        watermarks = self._load_watermarks()
+        watermarks[collection] = {"inserted": end.isoformat()}
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = f"{self.watermark_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(temp_path, self.watermark_path)
+
+
+def _timestamp_range(start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+    # Matches dates, and the ISO strings of records stored before timestamps were converted
+    dates, strings = {}, {}
+    if start is not None:
+        dates["$gte"], strings["$gte"] = start, start.isoformat()
+    if end is not None:
+        dates["$lt"], strings["$lt"] = end, end.isoformat()
+    if not dates:
+        return {}
+    return {"$or": [{"timestamp": dates}, {"timestamp": strings}]}
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    # Naive UTC, like the documents DatabaseConnection inserts
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    # Values of the wrong type become nulls rather than failing the whole export
+    if value is None:
+        return None
+    if kind == "float":
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    return str(value)
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    for key in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(key)
+    return document
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export LeafMeAlone data to Parquet")
+    parser.add_argument("--collections", nargs="+", choices=sorted(COLUMNS), default=EXPORT_CONFIG["collections"])
+    parser.add_argument("--output", default=EXPORT_CONFIG["output_dir"], help="dataset root directory")
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        help="re-export readings from this UTC time on into a separate dataset under "
+                             "<output>/ranges, instead of what was inserted since the last run")
+    parser.add_argument("--until", type=datetime.fromisoformat,
+                        help="re-export readings before this UTC time (default with --since: now)")
+    parser.add_argument("--mongodb-uri", help="MongoDB connection string (default: $MONGODB_URI)")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    db = DatabaseConnection(uri=args.mongodb_uri)
+    try:
+        exporter = ParquetExporter(db, args.output)
+        for collection in args.collections:
+            exporter.export(collection, start=args.since, end=args.until)
+    finally:
+        db.close()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Gateway Configuration
+This module contains configuration settings for the ingest gateway.
+"""
+
+# Gateway Configuration
+GATEWAY_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 3000,  # Collectors post to http://<host>:3000/api/plantdata by default
+    "path": "/api/plantdata",
+    "max_body_bytes": 4 * 1024 * 1024,
+    "max_batch_records": 5000,
+    # Records received but not yet written; beyond this, uploads get 429
+    "max_pending_records": 20000,
+    "retry_after": 5,  # seconds, sent with 429 and 503
+    # Records per insert_many; uploads that arrive while one is running are
+    # written together in the next
+    "flush_size": 500,
+    "flush_interval": 1.0,  # seconds the writer waits for uploads before checking for shutdown
+    # Seconds an upload waits for its insert to start; after that it is withdrawn
+    # and answered with 503, so the collector keeps the records
+    "ack_timeout": 30,
+    # Static blocks of compact payloads kept in memory, least recently used
+    # dropped first; collectors resend them after a 409
+    "max_static_blocks": 4096,
+    "static_block_ttl": 24 * 3600
+}
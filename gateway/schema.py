@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Schema Module
+This module validates uploaded records against the format_data schema of the
+collector (see leaf_me_alone.format_data).
+"""
+
+from datetime import datetime, timezone
+from numbers import Real
+from typing import Any, Dict, List, Optional
+
+# Expected type of every field; readings may be None when a sensor or API failed.
+# Other fields (e.g. "aggregate" from edge aggregation) are allowed and stored as they are.
+NUMBER = "number or null"
+STRING = "string or null"
+SCHEMA = {
+    "timestamp": "timestamp",
+    "location": "string",
+    "air": {"humidity": NUMBER, "temperature": NUMBER},
+    "soil": {"humidity": NUMBER},
+    "light": {"intensity": NUMBER, "duration": NUMBER},
+    "weather": {
+        "temperature": NUMBER,
+        "precipitation": NUMBER,
+        "cloud_cover": NUMBER,
+        "moon_phase": STRING,
+        "air_quality": NUMBER
+    },
+    "market_indices": {"dow_jones": NUMBER, "nasdaq": NUMBER},
+    "news": "list"
+}
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Parse an ISO 8601 timestamp into a naive UTC datetime
+
+    Returns:
+        datetime or None: None if value is not a valid timestamp
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def validate_record(record: Any) -> List[str]:
+    """
+    Check a record against SCHEMA
+
+    Args:
+        record: Decoded record
+
+    Returns:
+        list: Problems found, empty if the record is valid
+    """
+    if not isinstance(record, dict):
+        return ["record is not an object"]
+    return _validate(record, SCHEMA, "")
+
+
+def _validate(record: Dict[str, Any], schema: Dict[str, Any], prefix: str) -> List[str]:
+    errors = []
+    for key, expected in schema.items():
+        path = f"{prefix}{key}"
+        if key not in record:
+            errors.append(f"{path} is missing")
+            continue
+
+        value = record[key]
+        if isinstance(expected, dict):
+            if isinstance(value, dict):
+                errors += _validate(value, expected, f"{path}.")
+            else:
+                errors.append(f"{path} must be an object")
+        elif not _matches(value, expected):
+            errors.append(f"{path} must be a {expected}")
+    return errors
+
+
+def _matches(value: Any, expected: str) -> bool:
+    if expected == NUMBER:
+        return value is None or (isinstance(value, Real) and not isinstance(value, bool))
+    if expected == STRING:
+        return value is None or isinstance(value, str)
+    if expected == "string":
+        return isinstance(value, str) and bool(value)
+    if expected == "list":
+        return isinstance(value, list)
+    if expected == "timestamp":
+        return parse_timestamp(value) is not None
+    return False
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Ingest Gateway
+This service receives plant-data uploads from many collectors and writes them
+to MongoDB in bulk.
+
+POST /api/plantdata takes one record or a list of records, in any format of
+network.payload. Records are checked against the format_data schema and
+queued. A single writer thread writes everything queued with one insert_many,
+so while an insert runs, the uploads of every client pile up for the next one
+and MongoDB sees a few large inserts rather than one per request. An upload is
+only answered with 201 once its records are written, so the collectors' outbox
+never drops records the gateway could still lose; if the insert fails, it is
+answered with 503 and Retry-After. When more than
+GATEWAY_CONFIG["max_pending_records"] records are waiting, uploads are answered
+with 429 and Retry-After.
+
+Delivery is at least once: a connection failure during an insert is answered
+with 503 even if the server applied the write, and the records are written
+again when the collector retries.
+
+OPTIONS lists the accepted content types in Accept-Post, which is how
+collectors find out they may send compact payloads. GET /metrics serves the
+request, record, queue-depth and insert metrics in the Prometheus text format,
+and GET /health reports whether the writer is running.
+
+Usage:
+    python -m gateway.server --port 3000
+    python -m gateway.server --mongodb-uri mongodb://localhost:27017
+"""
+
+import argparse
+import json
+import logging
+import queue
+import signal
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from database.cache import TTLCache
+from database.db_connection import DatabaseConnection
+from logs.structured import configure_logging, shutdown_logging
+from metrics.metrics import Metrics, get_metrics
+from network.payload import (CONTENT_TYPES, PayloadError, UnknownStaticBlockError, UnsupportedPayloadError,
+                             decode_payload, msgpack)
+from .config import GATEWAY_CONFIG
+from .schema import parse_timestamp, validate_record
+
+logger = logging.getLogger("gateway")
+
+
+class OverloadedError(Exception):
+    """Raised when accepting a batch would exceed max_pending_records"""
+
+
+class IngestQueue:
+    """
+    Bounded hand-off from the request threads to the writer thread
+
+    put returns a future per batch that resolves once the batch has been written.
+    Counts records rather than requests, including those being written.
+    """
+
+    def __init__(self, db: DatabaseConnection, config: Optional[dict] = None, metrics: Optional[Metrics] = None):
+        self.db = db
+        self.config = {**GATEWAY_CONFIG, **(config or {})}
+        self.metrics = metrics or get_metrics()
+        self._batches: "queue.Queue[Tuple[List[Dict[str, Any]], Future]]" = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def depth(self) -> int:
+        """Records received but not yet written"""
+        with self._lock:
+            return self._pending
+
+    def put(self, documents: List[Dict[str, Any]]) -> Future:
+        """
+        Queue documents for writing
+
+        Returns:
+            Future: Resolves to {inserted, errors} as returned by
+            DatabaseConnection.insert_batch (error indices refer to documents),
+            or fails with the PyMongoError of an insert that failed as a whole.
+            Cancelling it before the insert starts withdraws the documents.
+
+        Raises:
+            OverloadedError: If the batch does not fit; nothing is queued then
+        """
+        future = Future()
+        with self._lock:
+            if self._pending + len(documents) > self.config["max_pending_records"]:
+                raise OverloadedError()
+            self._pending += len(documents)
+            self._batches.put((documents, future))
+        self.metrics.set_gauge("gateway_queue_depth", self.depth())
+        return future
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._write_loop, name="gateway-writer", daemon=True)
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write everything queued and stop the writer thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _write_loop(self) -> None:
+        while not (self._stop_event.is_set() and self._batches.empty()):
+            try:
+                batches = [self._batches.get(timeout=self.config["flush_interval"])]
+            except queue.Empty:
+                continue
+            # Everything that queued up during the previous insert goes into this one
+            size = len(batches[0][0])
+            while size < self.config["flush_size"]:
+                try:
+                    batches.append(self._batches.get_nowait())
+                except queue.Empty:
+                    break
+                size += len(batches[-1][0])
+            self._write(batches)
+
+    def _write(self, batches: List[Tuple[List[Dict[str, Any]], Future]]) -> None:
+        taken = sum(len(documents) for documents, _ in batches)
+        # Uploads that gave up waiting have been answered with 503 already
+        batches = [(documents, future) for documents, future in batches if future.set_running_or_notify_cancel()]
+        documents = [document for batch, _ in batches for document in batch]
+        try:
+            result = self.db.insert_plant_data_batch(documents)
+        except Exception as e:
+            # Also catches unexpected errors, which must not kill the writer
+            logger.error("Failed to write %d record(s): %s", len(documents), e, extra={"stage": "db_insert"})
+            for _, future in batches:
+                future.set_exception(e)
+        else:
+            offset = 0
+            for batch, future in batches:
+                errors = [
+                    {**error, "index": error["index"] - offset}
+                    for error in result["errors"] if offset <= error["index"] < offset + len(batch)
+                ]
+                future.set_result({"inserted": len(batch) - len(errors), "errors": errors})
+                offset += len(batch)
+            if result["errors"]:
+                logger.error("MongoDB refused %d record(s): %s", len(result["errors"]),
+                             result["errors"][0]["message"], extra={"stage": "db_insert"})
+        finally:
+            with self._lock:
+                self._pending -= taken
+            self.metrics.set_gauge("gateway_queue_depth", self.depth())
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    """Handles uploads, /metrics and /health; state lives on the server"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if self.path.split("?")[0] != self.server.config["path"]:
+            self._reply(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers["Content-Length"])
+        except TypeError:
+            self._reply(411, {"error": "Content-Length required"}, close=True)
+            return
+        except ValueError:
+            self._reply(400, {"error": "Invalid Content-Length"}, close=True)
+            return
+        if length < 0:
+            self._reply(400, {"error": "Invalid Content-Length"}, close=True)
+            return
+        if length > self.server.config["max_body_bytes"]:
+            self._reply(413, {"error": "Payload too large"}, close=True)
+            return
+        body = self.rfile.read(length)
+
+        try:
+            records = decode_payload(body, self.headers.get("Content-Type"),
+                                     self.headers.get("Content-Encoding"), self.server.static_blocks)
+        except UnsupportedPayloadError as e:
+            self._reply(415, {"error": str(e)})
+            return
+        except UnknownStaticBlockError as e:
+            self._reply(409, {"error": str(e)})
+            return
+        except PayloadError as e:
+            self._reply(400, {"error": str(e)})
+            return
+
+        if len(records) > self.server.config["max_batch_records"]:
+            self._reply(413, {"error": f"More than {self.server.config['max_batch_records']} records"})
+            return
+
+        # 422 rather than 400, so collectors can tell bad records from a bad request
+        errors = {index: validate_record(record) for index, record in enumerate(records)}
+        errors = {index: problems for index, problems in errors.items() if problems}
+        if errors:
+            self.server.metrics.inc("gateway_records_total", len(records), result="invalid")
+            self._reply(422, {"error": "Invalid records", "records": errors})
+            return
+
+        documents = [{**record, "timestamp": parse_timestamp(record["timestamp"])} for record in records]
+        try:
+            future = self.server.ingest.put(documents)
+        except OverloadedError:
+            self.server.metrics.inc("gateway_records_total", len(records), result="throttled")
+            self._reply(429, {"error": "Too many pending records"}, headers=self._retry_after())
+            return
+
+        try:
+            result = self._wait(future)
+        except Exception as e:
+            self.server.metrics.inc("gateway_records_total", len(records), result="unavailable")
+            self._reply(503, {"error": f"Could not write records: {e}"}, headers=self._retry_after())
+            return
+
+        self.server.metrics.inc("gateway_records_total", result["inserted"], result="accepted")
+        body = {"accepted": result["inserted"]}
+        if result["errors"]:
+            # Refused by MongoDB itself; resending them would fail the same way
+            self.server.metrics.inc("gateway_records_total", len(result["errors"]), result="failed")
+            body["failed"] = [{"index": error["index"], "message": error["message"]} for error in result["errors"]]
+        self._reply(201, body)
+
+    def do_OPTIONS(self):
+        if self.path.split("?")[0] != self.server.config["path"]:
+            self._reply(404, {"error": "Not found"})
+            return
+        # Collectors switch to a compact format only when it is listed here
+        accepted = [content_type for name, content_type in CONTENT_TYPES.items()
+                    if name != "msgpack" or msgpack is not None]
+        self._reply(204, b"", headers={"Allow": "POST, OPTIONS", "Accept-Post": ", ".join(accepted)})
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self.server.metrics.set_gauge("gateway_queue_depth", self.server.ingest.depth())
+            self._reply(200, self.server.metrics.render_prometheus().encode(),
+                        content_type="text/plain; version=0.0.4")
+        elif path == "/health":
+            running = self.server.ingest.is_running()
+            self._reply(200 if running else 503, {"writer": running, "queue_depth": self.server.ingest.depth()})
+        else:
+            self._reply(404, {"error": "Not found"})
+
+    def _wait(self, future: Future) -> Dict[str, Any]:
+        try:
+            return future.result(timeout=self.server.config["ack_timeout"])
+        except FutureTimeoutError:
+            if future.cancel():
+                raise TimeoutError("Timed out waiting for the writer")
+            # The insert has started; its outcome decides the answer
+            return future.result()
+
+    def _retry_after(self) -> Dict[str, str]:
+        return {"Retry-After": str(self.server.config["retry_after"])}
+
+    def _reply(self, status: int, body: Any, content_type: str = "application/json",
+               headers: Optional[Dict[str, str]] = None, close: bool = False) -> None:
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.server.metrics.inc("gateway_requests_total", method=self.command, status=str(status))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if close:
+            # The unread body would otherwise be parsed as the next request
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args, extra={"client": self.client_address[0]})
+
+
+class IngestServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the gateway state shared by the handler threads
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], db: DatabaseConnection, config: Optional[dict] = None,
+                 metrics: Optional[Metrics] = None):
+        self.config = {**GATEWAY_CONFIG, **(config or {})}
+        self.metrics = metrics or get_metrics()
+        self.ingest = IngestQueue(db, self.config, self.metrics)
+        # Static blocks of compact payloads, shared by all handler threads
+        self.static_blocks = TTLCache(maxsize=self.config["max_static_blocks"], ttl=self.config["static_block_ttl"])
+        super().__init__(address, IngestHandler)
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        self.ingest.start()
+        super().serve_forever(poll_interval)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.ingest.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LeafMeAlone ingest gateway")
+    parser.add_argument("--host", default=GATEWAY_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=GATEWAY_CONFIG["port"])
+    parser.add_argument("--mongodb-uri", help="MongoDB connection string (default: $MONGODB_URI)")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    db = DatabaseConnection(uri=args.mongodb_uri)
+    server = IngestServer((args.host, args.port), db)
+
+    def handle_signal(signum, frame):
+        logger.info("Received signal %s, shutting down...", signum)
+        # shutdown() waits for serve_forever, so it cannot run in the serving thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    logger.info("Gateway listening on %s:%d", args.host, args.port, extra={"path": GATEWAY_CONFIG["path"]})
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        db.close()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
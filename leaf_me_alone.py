@@ -5,74 +5,165 @@ This script reads data from various sensors connected to a Raspberry Pi
 and sends it to the LeafMeAlone API.
 """
 
+import argparse
+import logging
+import signal
+import threading
 import time
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-import RPi.GPIO as GPIO
-from sensors.dht22 import DHT22Sensor
-from sensors.soil_moisture import SoilMoistureSensor
+from aggregation.aggregator import EdgeAggregator
+from logs.structured import configure_logging, shutdown_logging, toggle_debug
+from metrics.metrics import export_metrics, get_metrics
+from network.http_transport import get_transport
+from network.config import PAYLOAD_CONFIG
+from network.payload import PayloadEncoder
+from storage.config import OUTBOX_CONFIG
+from storage.outbox import BACKLOG, DRAINED, FAILED, REJECTED, SENT, STOPPED, UNREACHABLE, Outbox
+from sensors.hardware import get_backend
+from sensors.registry import SensorRegistry
 from weather.weather_reader import WeatherReader
 
+logger = logging.getLogger("leaf_me_alone")
+
 # Configuration
 API_URL = "http://localhost:3000/api/plantdata"  # Update with your API URL
 SENSOR_READ_INTERVAL = 300  # 5 minutes in seconds
 
-# Initialize sensors
-dht22 = DHT22Sensor(pin=4)  # Update with your actual pin
-soil_moisture = SoilMoistureSensor(pin=17)  # Update with your actual pin
+# Deadline in seconds for each collection stage, measured from the start of the cycle.
+# A stage that has not returned by then is reported as missing.
+STAGE_DEADLINES = {
+    "dht22": 45,  # read_retry can take up to ~30s on a bad bus
+    "soil_moisture": 5,
+    "weather": 15
+}
+# Seconds of the weather stage left for the cache and parsing; the API request,
+# retries included, must finish in the rest or the stage would miss its deadline
+# and the next cycle would skip weather while it is still running
+WEATHER_DEADLINE_MARGIN = 2
+
+# Initialize sensors, one set per location in LOCATIONS_CONFIG
+sensors = SensorRegistry()  # Update sensors/config.py with your actual pins
 weather_reader = WeatherReader(latitude=52.52, longitude=13.41)  # Update with your location
 
-def read_sensors():
-    """Read all sensors and return formatted data"""
-    try:
-        # Read DHT22 sensor
-        temp_humidity = dht22.read()
-        if temp_humidity:
-            air_temp, air_humidity = temp_humidity
-        else:
-            air_temp = None
-            air_humidity = None
-        
-        # Read soil moisture
-        soil_moisture_level = soil_moisture.read()
-        
-        return {
-            "air_temp": air_temp,
-            "air_humidity": air_humidity,
-            "soil_moisture": soil_moisture_level
-        }
-    
-    except Exception as e:
-        print(f"Error reading sensors: {e}")
-        return None
+# Worker pools for the collection stages, one per stage kind, so soil reads never
+# queue behind DHT22 reads waiting for the bus lock. A stage still running from a
+# previous cycle is skipped, so one worker per stage is enough for none to wait.
+collection_executors = {
+    "dht22": ThreadPoolExecutor(max_workers=max(1, len(sensors)), thread_name_prefix="collect-dht22"),
+    "soil_moisture": ThreadPoolExecutor(max_workers=max(1, len(sensors)), thread_name_prefix="collect-soil"),
+    "weather": ThreadPoolExecutor(max_workers=1, thread_name_prefix="collect-weather")
+}
+pending_stages = {}
+
+# Pooled keep-alive transport, shared with the weather reader
+transport = get_transport()
+
+# Upload encoding: plain JSON unless the server advertises a compact format
+payload_encoder = PayloadEncoder()
+
+# Stage latencies and outcomes, exported after every cycle
+metrics = get_metrics()
+
+# Summarizes readings per location in daemon mode, see aggregation/aggregator.py
+aggregator = EdgeAggregator()
+
+# Samples are queued here first and only removed once the API has accepted them;
+# opened by get_outbox on first use
+outbox = None
+
+# Upload failures that say nothing about the records, retried without counting attempts
+UNAVAILABLE_STATUSES = {408, 429, 502, 503, 504}
 
 def get_weather_data():
-    """Get weather data from external API"""
+    """Get weather data for every location from external API"""
     try:
-        # Use the WeatherReader class to get weather data
-        weather_data = weather_reader.get_data()
-        
-        if weather_data:
-            return weather_data
-        else:
-            # Fallback to placeholder data if API call fails
-            return {
-                "temperature": 22.5,
-                "precipitation": 0,
-                "cloud_cover": 25,
-                "moon_phase": "waxing_gibbous",
-                "air_quality": 87
-            }
+        # Locations without their own coordinates use the reader's default location
+        coordinates = {
+            location: (pins.get("latitude", weather_reader.latitude), pins.get("longitude", weather_reader.longitude))
+            for location, pins in sensors.locations.items()
+        }
+        # Use the WeatherReader class to get weather data in a single batch. It serves
+        # the shared cache while fresh and the cached forecast when Open-Meteo is unreachable.
+        weather = weather_reader.get_data_batch(coordinates.values(),
+                                                deadline=STAGE_DEADLINES["weather"] - WEATHER_DEADLINE_MARGIN)
+        weather_data = {location: weather[coordinate] for location, coordinate in coordinates.items()}
+        return weather_data if any(weather_data.values()) else None
     except Exception as e:
-        print(f"Error getting weather data: {e}")
+        logger.error("Error getting weather data: %s", e, extra={"stage": "weather"})
         return None
 
-def get_manual_variables():
+def collect_data():
+    """
+    Run the sensor and soil stages of every location and the weather stage concurrently
+
+    Each stage gets its own deadline from STAGE_DEADLINES, so a cycle takes as long
+    as the slowest stage rather than the sum of all of them. A stage that times out,
+    fails, or is still running from a previous cycle is reported as missing.
+
+    Returns:
+        tuple: (sensor_data, weather_data, missing) where sensor_data and weather_data map
+        each location to its readings and missing is a list of stage names such as "kitchen/dht22"
+    """
+    stages = {"weather": get_weather_data}
+    for sensor_set in sensors:
+        stages[f"{sensor_set.location}/dht22"] = sensor_set.dht22.read
+        stages[f"{sensor_set.location}/soil_moisture"] = sensor_set.soil_moisture.read
+
+    def kind(name):
+        return name.rsplit("/", 1)[-1]
+
+    def deadline(name):
+        return STAGE_DEADLINES[kind(name)]
+
+    def fields(name):
+        location, _, stage = name.rpartition("/")
+        return {"stage": stage, "location": location} if location else {"stage": stage}
+
+    start = time.monotonic()
+    futures = {}
+    missing = []
+    for name, stage in stages.items():
+        previous = pending_stages.get(name)
+        if previous is not None and not previous.done():
+            # Never run two reads of the same source at once
+            logger.warning("Stage still running from a previous cycle, skipping", extra=fields(name))
+            missing.append(name)
+            continue
+        futures[name] = pending_stages[name] = collection_executors[kind(name)].submit(stage)
+
+    results = {}
+    for name in sorted(futures, key=deadline):
+        remaining = deadline(name) - (time.monotonic() - start)
+        try:
+            results[name] = futures[name].result(timeout=max(0, remaining))
+        except FutureTimeoutError:
+            futures[name].cancel()
+            metrics.inc("stage_deadline_missed_total", stage=name)
+            logger.warning("Stage missed its %ss deadline", deadline(name), extra=fields(name))
+        except Exception as e:
+            logger.error("Error in stage: %s", e, extra=fields(name))
+
+        if results.get(name) is None:
+            missing.append(name)
+
+    sensor_data = {}
+    for sensor_set in sensors:
+        air = results.get(f"{sensor_set.location}/dht22")
+        sensor_data[sensor_set.location] = {
+            "air_temp": air[0] if air else None,
+            "air_humidity": air[1] if air else None,
+            "soil_moisture": results.get(f"{sensor_set.location}/soil_moisture")
+        }
+
+    return sensor_data, results.get("weather") or {}, missing
+
+def get_manual_variables(location="living_room"):
     """Get manually set variables"""
     # These would be variables that don't come from sensors
     return {
-        "location": "living_room",
+        "location": location,
         "light": {
             "intensity": 5400,
             "duration": 6.5
@@ -120,53 +211,231 @@ def format_data(sensor_data, weather_data, manual_data):
     
     return data
 
+def negotiate_format():
+    """Ask the API which upload formats it accepts, keeping plain JSON if it lists none"""
+    try:
+        response = transport.request("OPTIONS", API_URL)
+    except Exception as e:
+        logger.warning("Could not query upload formats: %s", e, extra={"stage": "upload"})
+        return
+    if response.status_code in transport.config["retry_statuses"]:
+        # Temporarily unavailable; ask again on the next upload
+        return
+    payload_encoder.negotiate(response.headers.get("Accept-Post"))
+    logger.info("Upload format negotiated", extra={"stage": "upload", "format": payload_encoder.format})
+
+def get_outbox():
+    """Get the outbox, opening OUTBOX_CONFIG["path"] on first use"""
+    global outbox
+    if outbox is None:
+        outbox = Outbox(OUTBOX_CONFIG["path"])
+    return outbox
+
 def send_to_api(data):
-    """Send sensor data to LeafMeAlone API"""
+    """Send sensor data (one record or a list of records) to LeafMeAlone API"""
+    return upload(data) == 201
+
+def upload(data):
+    """
+    Send one record or a list of records to the LeafMeAlone API
+
+    Returns:
+        int: Status of the last response, None if the API could not be reached
+    """
+    records = data if isinstance(data, list) else [data]
+    if PAYLOAD_CONFIG["negotiate"] and not payload_encoder.negotiated:
+        negotiate_format()
     try:
-        response = requests.post(API_URL, json=data)
-        if response.status_code == 201:
-            print("Data sent successfully")
-            return True
-        else:
-            print(f"Error sending data: {response.status_code}")
-            return False
+        # Re-encode while the server asks for plain JSON or for the static blocks
+        while True:
+            body, headers = payload_encoder.encode(records)
+            with metrics.timed("upload") as timer:
+                response = transport.post(API_URL, data=body, headers=headers)
+                timer.success = response.status_code == 201
+            if response.status_code == 201:
+                payload_encoder.accepted()
+                logger.info("Data sent successfully", extra={"stage": "upload", "records": len(records),
+                                                             "format": payload_encoder.format,
+                                                             "duration": timer.duration})
+                return response.status_code
+            if not payload_encoder.rejected(response.status_code):
+                logger.error("Error sending data", extra={"stage": "upload", "status": response.status_code,
+                                                          "records": len(records), "duration": timer.duration})
+                return response.status_code
     except Exception as e:
-        print(f"Error sending to API: {e}")
-        return False
+        logger.error("Error sending to API: %s", e, extra={"stage": "upload", "records": len(records)})
+        return None
 
-def main():
-    """Gather data from all sources and send it to the API"""
-    print("Starting LeafMeAlone sensor reader...")
-    
+def send_batch_to_api(records):
+    """Send a batch of queued records and classify the result for the outbox"""
+    status = upload(records)
+    if status == 201:
+        return SENT
+    if status is None or status in UNAVAILABLE_STATUSES:
+        return UNREACHABLE
+    if 400 <= status < 500:
+        return REJECTED
+    return FAILED
+
+def flush_outbox():
+    """
+    Upload queued records in order, OUTBOX_CONFIG["batch_size"] per request
+
+    Returns:
+        str: DRAINED, BACKLOG if uploads succeeded but records are left for the
+        next flush, or STOPPED if an upload failed
+    """
+    queue = get_outbox()
+    result = queue.flush(send_batch_to_api, batch_size=OUTBOX_CONFIG["batch_size"])
+    remaining = queue.depth()
+    metrics.set_gauge("outbox_depth", remaining)
+    metrics.set_gauge("outbox_dead_letters", queue.dead_letter_depth())
+    if result["dead_lettered"]:
+        metrics.inc("outbox_dead_lettered_total", result["dead_lettered"])
+    if result["outcome"] == BACKLOG:
+        logger.info("Uploaded %d record(s), backlog of %d remaining", result["delivered"], remaining,
+                    extra={"stage": "upload", "delivered": result["delivered"], "queued": remaining})
+    elif result["outcome"] != DRAINED:
+        logger.warning("Uploaded %d record(s), %d still queued", result["delivered"], remaining,
+                       extra={"stage": "upload", "delivered": result["delivered"], "queued": remaining})
+    return result["outcome"]
+
+def run_cycle(aggregate=False):
+    """
+    Gather data from all sources and send it to the API once
+
+    Args:
+        aggregate (bool): Pass records through the edge aggregator, which uploads
+            window summaries and significant changes instead of every record
+    """
+    with metrics.timed("cycle") as timer:
+        timer.success = _run_cycle(aggregate)
+    logger.info("Cycle finished", extra={"stage": "cycle", "success": timer.success, "duration": timer.duration})
+    export_metrics()
+    return timer.success
+
+def _run_cycle(aggregate):
     try:
-        # 1. Get data from sensors
-        sensor_data = read_sensors()
-        
-        # 2. Get data from weather API
-        weather_data = get_weather_data()
+        # 1-2. Get data from sensors and weather API concurrently
+        sensor_data, weather_data, missing = collect_data()
+        if missing:
+            logger.warning("Missing data from: %s", ", ".join(missing), extra={"stage": "collect"})
         
-        # 3. Get manual variables
-        manual_data = get_manual_variables()
+        for location, location_data in sensor_data.items():
+            # 3. Get manual variables
+            manual_data = get_manual_variables(location)
+            
+            # 4. Format data, one record per location
+            with metrics.timed("format", location=location):
+                formatted_data = format_data(location_data, weather_data.get(location), manual_data)
+            
+            # 5. Queue data, or only what the aggregator lets through
+            for record in aggregator.add(formatted_data) if aggregate else [formatted_data]:
+                get_outbox().append(record)
         
-        # 4. Format data
-        formatted_data = format_data(sensor_data, weather_data, manual_data)
+        # 6. Send everything pending to the API
+        success = flush_outbox() != STOPPED
         
-        # 5. Send data to API
-        success = send_to_api(formatted_data)
-        
-        if success:
-            print("Data collection and transmission completed successfully")
-        else:
-            print("Failed to send data to API")
+        if not success:
+            logger.error("Failed to send data to API", extra={"stage": "upload"})
+        return success
     
     except Exception as e:
-        print(f"Error in data collection: {e}")
+        logger.exception("Error in data collection: %s", e, extra={"stage": "cycle"})
+        return False
+
+def run_daemon(interval=SENSOR_READ_INTERVAL):
+    """
+    Run collection cycles until SIGTERM or SIGINT is received
+
+    Cycles are scheduled on the monotonic clock at fixed multiples of the interval,
+    so slow cycles do not make the schedule drift. If a cycle overruns one or more
+    slots, the missed slots are skipped instead of being run back to back.
+
+    Args:
+        interval (float): Seconds between the start of two cycles
+    """
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info("Received signal %s, shutting down...", signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, "SIGUSR1"):
+        # kill -USR1 switches debug output on and off without a restart
+        signal.signal(signal.SIGUSR1, lambda signum, frame: toggle_debug())
+
+    # Keep fresh DHT22 readings cached so cycles never block on sensor retries
+    sensors.start()
+    sensors.wait_for_readings(STAGE_DEADLINES["dht22"])
+
+    next_run = time.monotonic()
+    while not stop_event.is_set():
+        run_cycle(aggregate=True)
+
+        next_run += interval
+        now = time.monotonic()
+        if now >= next_run:
+            skipped = int((now - next_run) // interval) + 1
+            logger.warning("Collection fell behind schedule, skipping %d cycle(s)", skipped,
+                           extra={"stage": "schedule", "skipped": skipped})
+            next_run += skipped * interval
+
+        stop_event.wait(next_run - now)
+
+    # Queue the partial aggregation windows so no readings are lost
+    for record in aggregator.flush():
+        get_outbox().append(record)
+    flush_outbox()
+
+def cleanup():
+    """Release sensors, GPIO and network resources"""
+    sensors.cleanup()
+    get_backend().cleanup()
+    for executor in collection_executors.values():
+        executor.shutdown(wait=False)
+    transport.close()
+    if outbox is not None:
+        outbox.close()
+
+def positive_seconds(value):
+    """argparse type for a number of seconds greater than zero"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+    # Also rejects nan, which compares false with everything
+    if not seconds > 0 or seconds == float("inf"):
+        raise argparse.ArgumentTypeError(f"must be a positive number of seconds, got {value}")
+    return seconds
+
+def main(argv=None):
+    """Run a single collection cycle, or keep collecting in daemon mode"""
+    parser = argparse.ArgumentParser(description="LeafMeAlone sensor reader")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and collect every --interval seconds")
+    parser.add_argument("--interval", type=positive_seconds, default=SENSOR_READ_INTERVAL,
+                        help=f"seconds between collections in daemon mode (default: {SENSOR_READ_INTERVAL})")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (default: LOGGING_CONFIG or "
+                                            "$LEAFMEALONE_LOG_LEVEL)")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    logger.info("Starting LeafMeAlone sensor reader...")
+    
+    try:
+        get_outbox()
+        if args.daemon:
+            run_daemon(args.interval)
+        else:
+            run_cycle()
     
     finally:
         # Clean up GPIO resources
-        soil_moisture.cleanup()
-        dht22.cleanup()
-        GPIO.cleanup()
+        cleanup()
+        shutdown_logging()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,20 @@
+"""
+Logging Configuration
+This module contains configuration settings for the collector's logging.
+"""
+
+# Logging Configuration
+LOGGING_CONFIG = {
+    "level": "INFO",
+    "env_var": "LEAFMEALONE_LOG_LEVEL",  # Overrides "level" when set
+    "format": "text",  # "text" (key=value fields) or "json" (one object per line)
+    "file": None,  # Also append to this file when set; stderr is always written
+    # Records waiting for the background writer; more are dropped and counted
+    "queue_size": 10000,
+    # At most repeat_burst records per call site and level every repeat_interval
+    # seconds; DEBUG records are never suppressed
+    "repeat_interval": 60,
+    "repeat_burst": 5,
+    # Third-party loggers kept at WARNING whatever the level
+    "quiet_loggers": ["urllib3", "pymongo"]
+}
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Structured Logging Module
+This module configures non-blocking, structured logging for the collector.
+
+Modules log through the standard library (logging.getLogger(__name__)) and pass
+context such as stage, location or duration with extra={...}. configure_logging()
+puts a bounded queue in front of the real handlers, so callers only pay for an
+enqueue while a background thread does the formatting and writing.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Tuple, Union
+from .config import LOGGING_CONFIG
+
+# Attributes every LogRecord has; anything else was passed through extra={...}
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats records with their extra fields, as key=value text or JSON lines
+    """
+
+    def __init__(self, style: str = LOGGING_CONFIG["format"]):
+        super().__init__()
+        self.json = style == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        fields.update((key, value) for key, value in vars(record).items() if key not in STANDARD_ATTRIBUTES)
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+
+        if self.json:
+            return json.dumps(fields, default=str)
+        extra = " ".join(f"{key}={_text_value(value)}" for key, value in list(fields.items())[4:])
+        line = f"{fields['time']} {fields['level']:7} {fields['logger']}: {fields['message']}"
+        return f"{line} {extra}" if extra else line
+
+
+def _text_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    text = str(value)
+    return json.dumps(text) if not text or any(c in text for c in ' "=\n') else text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Suppresses repeats from the same call site and level
+
+    Within each interval at most burst records pass; the first record of the
+    next interval carries the number suppressed in its "suppressed" field.
+    """
+
+    def __init__(self, interval: float = LOGGING_CONFIG["repeat_interval"],
+                 burst: int = LOGGING_CONFIG["repeat_burst"]):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._lock = threading.Lock()
+        # (pathname, lineno, levelno) -> [window start, passed, suppressed]
+        self._windows: Dict[Tuple[str, int, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG:
+            return True
+
+        key = (record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records instead of blocking or raising when the queue is full
+    """
+
+    def __init__(self, maxsize: int = LOGGING_CONFIG["queue_size"]):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare() renders the traceback into the message and clears
+        # exc_info, for queues that pickle records. This queue stays in the process,
+        # so only the message is merged with its args, which may change after the
+        # call, and the exception is left for the formatter's "exception" field.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+_configured_level = logging.INFO
+
+
+def configure_logging(level: Union[str, int, None] = None) -> None:
+    """
+    Route all logging through a background writer
+
+    Safe to call more than once; later calls only change the level.
+
+    Args:
+        level (str or int): Level name or number, defaults to the environment
+            variable LOGGING_CONFIG["env_var"] or LOGGING_CONFIG["level"]
+    """
+    global _listener, _queue_handler
+    level = level or os.environ.get(LOGGING_CONFIG["env_var"]) or LOGGING_CONFIG["level"]
+    set_level(level)
+    if _listener is not None:
+        return
+
+    formatter = StructuredFormatter()
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if LOGGING_CONFIG["file"]:
+        handlers.append(logging.FileHandler(LOGGING_CONFIG["file"]))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    for name in LOGGING_CONFIG["quiet_loggers"]:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _queue_handler = BoundedQueueHandler()
+    _queue_handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def set_level(level: Union[str, int]) -> None:
+    """
+    Change the level of all loggers at runtime
+
+    Args:
+        level (str or int): Level name or number
+    """
+    global _configured_level
+    _configured_level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    if not isinstance(_configured_level, int):
+        raise ValueError(f"Unknown log level {level!r}")
+    logging.getLogger().setLevel(_configured_level)
+
+
+def toggle_debug() -> None:
+    """Switch between DEBUG and the configured level, e.g. from a signal handler"""
+    root = logging.getLogger()
+    root.setLevel(_configured_level if root.level == logging.DEBUG else logging.DEBUG)
+
+
+def dropped_records() -> int:
+    """Get the number of records dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the background writer"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,19 @@
+"""
+Metrics Configuration
+This module contains configuration settings for collector instrumentation.
+"""
+
+import os
+from storage.config import DATA_DIR
+
+# Metrics Configuration
+METRICS_CONFIG = {
+    "prefix": "leafmealone",
+    # Upper bounds in seconds of the latency histogram buckets
+    "buckets": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    # Prometheus text file rewritten after every cycle (for node_exporter's
+    # textfile collector), None to disable
+    "textfile": os.path.join(DATA_DIR, "leafmealone.prom"),
+    # StatsD daemon receiving every event over UDP, e.g. ("127.0.0.1", 8125), None to disable
+    "statsd": None
+}
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Metrics Module
+This module records per-stage latency histograms, success and failure counters
+and gauges, and exports them as a Prometheus text file or to StatsD.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from .config import METRICS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class StageTimer:
+    """
+    Handle yielded by Metrics.timed; set success to False to count a failure
+    without raising. duration holds the elapsed seconds once the block exits.
+    """
+
+    def __init__(self):
+        self.success = True
+        self.duration = None
+
+
+class StatsdSink:
+    """
+    Sends every metric event to a StatsD daemon over UDP
+    """
+
+    def __init__(self, host: str, port: int, prefix: str = METRICS_CONFIG["prefix"]):
+        """
+        Initialize the sink
+
+        Args:
+            host (str): StatsD host
+            port (int): StatsD UDP port
+            prefix (str): Prefix for every metric name
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def send(self, name: str, value: float, kind: str, labels: Dict[str, str]) -> None:
+        """
+        Send one event; losses are ignored, as is usual for StatsD
+
+        Args:
+            name (str): Metric name
+            value (float): Value (seconds for timings)
+            kind (str): "ms", "c" or "g"
+            labels (dict): Appended to the name as dotted segments
+        """
+        if kind == "ms" and name.endswith("_seconds"):
+            name = name[:-len("_seconds")]
+        path = ".".join([self.prefix, name] + [str(value) for _, value in sorted(labels.items())])
+        try:
+            self.socket.sendto(f"{path}:{value:g}|{kind}".encode(), self.address)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+class Metrics:
+    """
+    Thread-safe in-process metrics store
+    """
+
+    def __init__(self, buckets: Optional[List[float]] = None, prefix: str = METRICS_CONFIG["prefix"]):
+        """
+        Initialize the store
+
+        Args:
+            buckets (list): Histogram bucket upper bounds in seconds
+            prefix (str): Prefix for exported metric names
+        """
+        self.buckets = sorted(buckets or METRICS_CONFIG["buckets"])
+        self.prefix = prefix
+        self.sinks: List[StatsdSink] = []
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        # name -> labels -> [per-bucket counts..., +Inf count, sum]
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increase a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        for sink in self.sinks:
+            sink.send(name, value, "c", labels)
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """Set a gauge"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+        for sink in self.sinks:
+            sink.send(name, value, "g", labels)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Record a duration in a histogram"""
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += seconds
+        for sink in self.sinks:
+            sink.send(name, seconds * 1000, "ms", labels)
+
+    @contextmanager
+    def timed(self, stage: str, **labels: str):
+        """
+        Time a stage and count its outcome
+
+        Records stage_duration_seconds and stage_total{result="success"|"failure"}.
+        An exception, or setting the yielded timer's success to False, counts as
+        a failure.
+
+        Args:
+            stage (str): Stage name, e.g. "dht22_read"
+            **labels: Extra labels such as location
+        """
+        timer = StageTimer()
+        started = time.perf_counter()
+        try:
+            yield timer
+        except Exception:
+            timer.success = False
+            raise
+        finally:
+            timer.duration = time.perf_counter() - started
+            self.observe("stage_duration_seconds", timer.duration, stage=stage, **labels)
+            self.inc("stage_total", stage=stage, result="success" if timer.success else "failure", **labels)
+
+    def render_prometheus(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Returns:
+            str: Exposition text
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{self.prefix}_{name}{_labels(key)} {value:g}")
+
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{self.prefix}_{name}{_labels(key)} {value:g}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} histogram")
+                for key, counts in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + [float("inf")], counts[:-1]):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{self.prefix}_{name}_bucket{_labels(key + (('le', le),))} {cumulative:g}")
+                    lines.append(f"{self.prefix}_{name}_sum{_labels(key)} {counts[-1]:g}")
+                    lines.append(f"{self.prefix}_{name}_count{_labels(key)} {cumulative:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Atomically write the Prometheus exposition to a file
+
+        Args:
+            path (str): Target file, usually in node_exporter's textfile directory
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """
+    Get the process-wide metrics store, creating it on first use
+
+    A StatsD sink is attached when METRICS_CONFIG["statsd"] is set.
+
+    Returns:
+        Metrics: Shared metrics store
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+            if METRICS_CONFIG["statsd"]:
+                _metrics.sinks.append(StatsdSink(*METRICS_CONFIG["statsd"]))
+        return _metrics
+
+
+def export_metrics() -> None:
+    """Write the Prometheus text file if METRICS_CONFIG["textfile"] is set"""
+    if METRICS_CONFIG["textfile"]:
+        try:
+            get_metrics().write_textfile(METRICS_CONFIG["textfile"])
+        except OSError as e:
+            logger.error("Error writing metrics: %s", e, extra={"path": METRICS_CONFIG["textfile"]})
@@ -0,0 +1,28 @@
+"""
+Network Configuration
+This module contains configuration settings for outgoing HTTP traffic.
+"""
+
+# Shared HTTP transport configuration
+HTTP_CONFIG = {
+    "connect_timeout": 5,  # Seconds to establish a TCP/TLS connection
+    "read_timeout": 30,  # Seconds to wait for the server between bytes
+    "max_retries": 3,  # Extra attempts after the first one
+    "backoff_base": 0.5,  # Seconds, doubled on every retry
+    "backoff_max": 30,  # Upper bound for a single backoff sleep
+    "retry_statuses": [429, 502, 503, 504],  # Responses worth retrying
+    "pool_connections": 4,  # Number of hosts to keep a connection pool for
+    "pool_maxsize": 4  # Maximum open connections per host
+}
+
+# Upload payload configuration
+PAYLOAD_CONFIG = {
+    # Compact body formats in order of preference, used once the server lists
+    # them in the Accept-Post header of its OPTIONS response; until then, and
+    # for servers that list none, the original plain JSON is sent. "gzip" is the
+    # smallest on the wire, "msgpack" the cheapest to encode.
+    "formats": ["gzip", "msgpack"],
+    "negotiate": True,  # False always sends plain JSON, without the OPTIONS request
+    "scale": 1000,  # Fixed-point factor for delta-encoded readings (3 decimals)
+    "gzip_level": 6
+}
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+HTTP Transport Module
+This module provides a pooled, keep-alive HTTP session with timeouts and retries,
+shared by the API uploader and the weather reader.
+"""
+
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Optional
+from urllib3.exceptions import NewConnectionError
+from .config import HTTP_CONFIG
+
+# Methods that can be retried after the request may have reached the server
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class HttpTransport:
+    """
+    Pooled HTTP session with connect/read timeouts and jittered exponential backoff
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        """
+        Initialize the transport
+
+        Args:
+            config (dict): Overrides for HTTP_CONFIG values
+        """
+        self.config = {**HTTP_CONFIG, **(config or {})}
+        self.timeout = (self.config["connect_timeout"], self.config["read_timeout"])
+
+        # pool_block makes pool_maxsize a hard per-host connection limit
+        adapter = HTTPAdapter(
+            pool_connections=self.config["pool_connections"],
+            pool_maxsize=self.config["pool_maxsize"],
+            pool_block=True,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying connection errors and retryable status codes
+
+        Non-idempotent requests (POST) are only retried when the server cannot have
+        processed them: when no connection could be opened (connect timeout, refused
+        connection, failed name lookup) and on retryable status codes. A connection
+        lost or timing out after the request was sent is not retried, since the
+        server may have acted on it.
+
+        With a deadline, every attempt's timeouts are cut to the time left and no
+        retry is started that would begin after it, so the call returns or raises
+        within about deadline seconds (a server trickling bytes can stretch the
+        last read).
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            deadline (float): Seconds the whole call, retries included, may take
+            **kwargs: Passed through to requests.Session.request
+
+        Returns:
+            requests.Response: The last response received
+
+        Raises:
+            requests.RequestException: If the last attempt failed without a response
+        """
+        deadline = kwargs.pop("deadline", None)
+        timeout = kwargs.pop("timeout", self.timeout)
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        ends = time.monotonic() + deadline if deadline is not None else None
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        max_retries = self.config["max_retries"]
+
+        for attempt in range(max_retries + 1):
+            if ends is not None:
+                remaining = max(ends - time.monotonic(), 0.001)
+                kwargs["timeout"] = (min(timeout[0], remaining), min(timeout[1], remaining))
+            else:
+                kwargs["timeout"] = timeout
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == max_retries or not (idempotent or self._not_sent(e)):
+                    raise
+                delay = self._backoff(attempt)
+                if ends is not None and time.monotonic() + delay >= ends:
+                    raise
+            else:
+                if response.status_code not in self.config["retry_statuses"] or attempt == max_retries:
+                    return response
+                delay = self._backoff(attempt, self._parse_retry_after(response.headers.get("Retry-After")))
+                if ends is not None and time.monotonic() + delay >= ends:
+                    return response
+                response.close()
+
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request"""
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        """Close all pooled connections"""
+        self.session.close()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Compute the sleep before the next attempt
+
+        Args:
+            attempt (int): Zero-based index of the attempt that just failed
+            retry_after (float): Delay requested by the server, if any
+
+        Returns:
+            float: Seconds to sleep
+        """
+        # "Full jitter": spreads retries from many collectors over the whole window
+        ceiling = min(self.config["backoff_max"], self.config["backoff_base"] * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.config["backoff_max"]))
+        return delay
+
+    @staticmethod
+    def _not_sent(error: requests.RequestException) -> bool:
+        """Whether a request failed while connecting, before anything was sent"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        # requests wraps urllib3's MaxRetryError, whose reason is the actual failure
+        reason = error.args[0] if error.args else None
+        return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Parse a Retry-After header given in seconds"""
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """
+    Get the process-wide shared transport, creating it on first use
+
+    Returns:
+        HttpTransport: Shared transport instance
+    """
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Payload Module
+This module encodes batches of plant-data records into a compact wire format
+and decodes them again on the receiving side.
+
+A compact document moves the fields that rarely change (light, market indices,
+news, air quality) into static blocks that are sent once under a version id and
+then only referenced. The per-record readings are stored column-wise, with
+numbers delta-encoded as fixed-point integers:
+
+    {
+        "format": "leafmealone-compact/1",
+        "count": 3,
+        "static": {"<id>": {"light": {...}, "news": [...], ...}},
+        "static_ref": [["<id>", 3]],
+        "timestamp": {"delta_us": [1744644645000000, 300000000, 300000000]},
+        "columns": {"air.temperature": {"scale": 1000, "values": [21300, 100, -50]}, ...},
+        "extra": {}
+    }
+
+static_ref is run-length encoded as [id, count] pairs and extra holds, by
+record index, any fields outside the known schema. A column's "absent" list
+holds the indices of records that did not have the field at all, so decoding
+does not add it as null.
+
+The body is gzip-compressed JSON or msgpack. Plain JSON, the format the API has
+always accepted, is sent until the server lists a compact content type in the
+Accept-Post header of its OPTIONS response; the encoder then uses the first of
+PAYLOAD_CONFIG["formats"] the server accepts, and goes back to plain JSON if
+the server later answers 415. Readings are rounded to 1/PAYLOAD_CONFIG["scale"].
+"""
+
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from .config import PAYLOAD_CONFIG
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COMPACT_FORMAT = "leafmealone-compact/1"
+
+CONTENT_TYPES = {
+    "msgpack": "application/vnd.leafmealone.compact+msgpack",
+    "gzip": "application/vnd.leafmealone.compact+json",
+    "json": "application/json"
+}
+
+# Fields that rarely change between records, sent once per version
+STATIC_FIELDS = ["light", "market_indices", "news", "weather.air_quality"]
+
+# Numeric readings, delta-encoded per column
+NUMERIC_FIELDS = [
+    "air.humidity",
+    "air.temperature",
+    "soil.humidity",
+    "weather.temperature",
+    "weather.precipitation",
+    "weather.cloud_cover"
+]
+
+# Other per-record values, sent as plain columns
+PLAIN_FIELDS = ["location", "weather.moon_phase"]
+
+EPOCH = datetime(1970, 1, 1)
+
+# Status codes that make the encoder change what it sends
+UNSUPPORTED_MEDIA_TYPE = 415
+UNKNOWN_STATIC_REF = 409
+
+# Marks a field a record does not have, as opposed to one that is null
+_MISSING = object()
+
+
+class PayloadError(ValueError):
+    """Raised when a payload cannot be decoded"""
+
+
+class UnsupportedPayloadError(PayloadError):
+    """Raised for a content type or format the receiver cannot decode (answer 415)"""
+
+
+class UnknownStaticBlockError(PayloadError):
+    """Raised when a payload references a static block the receiver does not have (answer 409)"""
+
+
+class PayloadEncoder:
+    """
+    Encodes record batches in the best format the server accepts
+
+    Starts with plain JSON and only switches to a compact format once the server
+    has advertised it (see negotiate). Keeps track of the static blocks the
+    server has already stored, so later batches only reference them.
+    """
+
+    def __init__(self, formats: Optional[List[str]] = None):
+        """
+        Initialize the encoder
+
+        Args:
+            formats (list): Compact formats in order of preference, defaults to PAYLOAD_CONFIG["formats"]
+        """
+        formats = PAYLOAD_CONFIG["formats"] if formats is None else formats
+        self.formats = [name for name in formats if name != "msgpack" or msgpack is not None]
+        if "json" not in self.formats:
+            self.formats.append("json")
+        self.format = "json"
+        self.negotiated = False
+        self.acknowledged = set()
+        self._pending = set()
+
+    def negotiate(self, accept_post: Optional[str]) -> str:
+        """
+        Pick the format from the media types the server accepts
+
+        Args:
+            accept_post (str): Accept-Post header of the server's OPTIONS response;
+                None or empty if it sent none, which keeps plain JSON
+
+        Returns:
+            str: The format now in use
+        """
+        accepted = {media_type.split(";")[0].strip() for media_type in (accept_post or "").split(",")}
+        self.format = next((name for name in self.formats if CONTENT_TYPES[name] in accepted), "json")
+        self.negotiated = True
+        return self.format
+
+    def encode(self, records: List[Dict[str, Any]]) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Encode records for upload
+
+        Args:
+            records (list): Records in the format_data schema
+
+        Returns:
+            tuple: (body, headers)
+        """
+        headers = {"Content-Type": CONTENT_TYPES[self.format]}
+
+        if self.format == "json":
+            # The original API accepts one record as an object
+            self._pending = set()
+            body = records[0] if len(records) == 1 else records
+            return json.dumps(body).encode(), headers
+
+        document = encode_compact(records, self.acknowledged)
+        self._pending = set(document["static"])
+
+        if self.format == "msgpack":
+            return msgpack.packb(document, use_bin_type=True), headers
+
+        headers["Content-Encoding"] = "gzip"
+        return gzip.compress(json.dumps(document).encode(), PAYLOAD_CONFIG["gzip_level"]), headers
+
+    def accepted(self) -> None:
+        """Record that the last encoded body was accepted, along with its static blocks"""
+        self.acknowledged |= self._pending
+        self._pending = set()
+
+    def rejected(self, status_code: int) -> bool:
+        """
+        Adapt to a rejected upload
+
+        Args:
+            status_code (int): HTTP status of the rejection
+
+        Returns:
+            bool: True if re-encoding and sending again may succeed
+        """
+        if status_code == UNSUPPORTED_MEDIA_TYPE and self.format != "json":
+            # The server no longer takes what it advertised; plain JSON always works
+            self.format = "json"
+            return True
+        if status_code == UNKNOWN_STATIC_REF and self.acknowledged:
+            # The server lost its static blocks (e.g. it restarted); send them again
+            self.acknowledged = set()
+            return True
+        return False
+
+
+def encode_compact(records: List[Dict[str, Any]], known_static: Optional[set] = None) -> Dict[str, Any]:
+    """
+    Build a compact document from records
+
+    Args:
+        records (list): Records in the format_data schema
+        known_static (set): Static block ids the receiver already has
+
+    Returns:
+        dict: Compact document
+    """
+    known_static = known_static or set()
+    remainders = [json.loads(json.dumps(record)) for record in records]
+
+    static = {}
+    static_ref = []
+    for remainder in remainders:
+        block = {}
+        for path in STATIC_FIELDS:
+            value = _pop_path(remainder, path)
+            if value is not _MISSING:
+                block[path] = value
+        block_id = hashlib.sha1(json.dumps(block, sort_keys=True).encode()).hexdigest()[:12]
+        if block_id not in known_static:
+            static[block_id] = block
+        if static_ref and static_ref[-1][0] == block_id:
+            static_ref[-1][1] += 1
+        else:
+            static_ref.append([block_id, 1])
+
+    timestamps = [_pop_path(remainder, "timestamp") for remainder in remainders]
+    columns = {}
+    for path in NUMERIC_FIELDS:
+        values = [_pop_path(remainder, path) for remainder in remainders]
+        columns[path] = _with_absent(_encode_numeric([_present(value) for value in values]), values)
+    for path in PLAIN_FIELDS:
+        values = [_pop_path(remainder, path) for remainder in remainders]
+        columns[path] = _with_absent({"values": [_present(value) for value in values]}, values)
+
+    return {
+        "format": COMPACT_FORMAT,
+        "count": len(records),
+        "static": static,
+        "static_ref": static_ref,
+        "timestamp": _with_absent(_encode_timestamps([_present(value) for value in timestamps]), timestamps),
+        "columns": columns,
+        "extra": {str(index): remainder for index, remainder in enumerate(map(_prune, remainders)) if remainder}
+    }
+
+
+def decode_compact(document: Dict[str, Any], static_store: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rebuild records from a compact document
+
+    Args:
+        document (dict): Compact document
+        static_store (dict): Static blocks known to the receiver, updated in place;
+            a dict, or a thread-safe store with get and put such as database.cache.TTLCache
+
+    Returns:
+        list: Records in the format_data schema
+
+    Raises:
+        PayloadError: If the document is malformed or references an unknown static block
+    """
+    if document.get("format") != COMPACT_FORMAT:
+        raise UnsupportedPayloadError(f"Unsupported payload format {document.get('format')!r}")
+
+    try:
+        # Blocks sent with this document are used from here, so a concurrent
+        # eviction from the store cannot make them unknown
+        static = dict(document.get("static", {}))
+        store = static_store.put if hasattr(static_store, "put") else static_store.__setitem__
+        for block_id, block in static.items():
+            store(block_id, block)
+
+        count = document["count"]
+        records = [dict(document["extra"].get(str(index), {})) for index in range(count)]
+        block_ids = [block_id for block_id, run in document["static_ref"] for _ in range(run)]
+        for record, block_id in zip(records, block_ids):
+            block = static[block_id] if block_id in static else static_store.get(block_id)
+            if block is None:
+                raise UnknownStaticBlockError(f"Unknown static block {block_id}")
+            for path, value in block.items():
+                _set_path(record, path, value)
+
+        absent = set(document["timestamp"].get("absent", []))
+        for index, (record, timestamp) in enumerate(zip(records, _decode_timestamps(document["timestamp"]))):
+            if index not in absent:
+                record["timestamp"] = timestamp
+        for path, column in document["columns"].items():
+            values = _decode_numeric(column) if "scale" in column else column["values"]
+            absent = set(column.get("absent", []))
+            for index, (record, value) in enumerate(zip(records, values)):
+                if index not in absent:
+                    _set_path(record, path, value)
+    except (KeyError, TypeError) as e:
+        raise PayloadError(f"Malformed compact payload: {e}")
+
+    if len(block_ids) != count:
+        raise PayloadError("Record count does not match payload")
+    return records
+
+
+def decode_payload(body: bytes, content_type: str, content_encoding: Optional[str],
+                   static_store: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Decode an upload body in any supported format
+
+    Args:
+        body (bytes): Request body
+        content_type (str): Content-Type header
+        content_encoding (str): Content-Encoding header, if any
+        static_store (dict): Static blocks known to the receiver, see decode_compact
+
+    Returns:
+        list: Records in the format_data schema
+
+    Raises:
+        PayloadError: If the body cannot be decoded; UnsupportedPayloadError and
+            UnknownStaticBlockError for the cases answered with 415 and 409
+    """
+    media_type = (content_type or "application/json").split(";")[0].strip()
+    try:
+        if content_encoding == "gzip":
+            body = gzip.decompress(body)
+        if media_type == CONTENT_TYPES["msgpack"]:
+            if msgpack is None:
+                raise UnsupportedPayloadError("msgpack is not installed")
+            return decode_compact(msgpack.unpackb(body, raw=False), static_store)
+        if media_type == CONTENT_TYPES["gzip"]:
+            return decode_compact(json.loads(body), static_store)
+        if media_type == CONTENT_TYPES["json"]:
+            data = json.loads(body)
+            return data if isinstance(data, list) else [data]
+    except (OSError, ValueError) as e:
+        if isinstance(e, PayloadError):
+            raise
+        raise PayloadError(f"Cannot decode payload: {e}")
+    raise UnsupportedPayloadError(f"Unsupported content type {media_type}")
+
+
+def _encode_numeric(values: List[Any]) -> Dict[str, Any]:
+    # Integer columns are kept exact; floats become fixed-point with PAYLOAD_CONFIG["scale"]
+    if all(value is None or (isinstance(value, int) and not isinstance(value, bool)) for value in values):
+        scale = 1
+    elif all(value is None or isinstance(value, (int, float)) for value in values):
+        scale = PAYLOAD_CONFIG["scale"]
+    else:
+        return {"values": values}
+
+    deltas = []
+    previous = 0
+    for value in values:
+        if value is None:
+            deltas.append(None)
+            continue
+        fixed = round(value * scale)
+        deltas.append(fixed - previous)
+        previous = fixed
+    return {"scale": scale, "values": deltas}
+
+
+def _decode_numeric(column: Dict[str, Any]) -> List[Any]:
+    scale = column["scale"]
+    values = []
+    previous = 0
+    for delta in column["values"]:
+        if delta is None:
+            values.append(None)
+            continue
+        previous += delta
+        values.append(previous if scale == 1 else previous / scale)
+    return values
+
+
+def _encode_timestamps(timestamps: List[Any]) -> Dict[str, Any]:
+    try:
+        micros = [(datetime.fromisoformat(timestamp) - EPOCH) // timedelta(microseconds=1) for timestamp in timestamps]
+    except (TypeError, ValueError):
+        # Timezone-aware or non-ISO timestamps are sent as they are
+        return {"values": timestamps}
+    deltas = [micros[0]] + [current - previous for previous, current in zip(micros, micros[1:])] if micros else []
+    return {"delta_us": deltas}
+
+
+def _decode_timestamps(column: Dict[str, Any]) -> List[Any]:
+    if "values" in column:
+        return column["values"]
+    timestamps = []
+    total = 0
+    for delta in column["delta_us"]:
+        total += delta
+        timestamps.append((EPOCH + timedelta(microseconds=total)).isoformat())
+    return timestamps
+
+
+def _pop_path(record: Dict[str, Any], path: str) -> Any:
+    # Returns _MISSING if the record does not have the field
+    *parents, leaf = path.split(".")
+    for key in parents:
+        record = record.get(key)
+        if not isinstance(record, dict):
+            return _MISSING
+    return record.pop(leaf, _MISSING)
+
+
+def _present(value: Any) -> Any:
+    return None if value is _MISSING else value
+
+
+def _with_absent(column: Dict[str, Any], values: List[Any]) -> Dict[str, Any]:
+    absent = [index for index, value in enumerate(values) if value is _MISSING]
+    if absent:
+        column["absent"] = absent
+    return column
+
+
+def _set_path(record: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, leaf = path.split(".")
+    for key in parents:
+        record = record.setdefault(key, {})
+    record[leaf] = value
+
+
+def _prune(record: Dict[str, Any]) -> Dict[str, Any]:
+    # Drops the containers emptied by _pop_path
+    for key in list(record):
+        if isinstance(record[key], dict):
+            _prune(record[key])
+            if not record[key]:
+                del record[key]
+    return record
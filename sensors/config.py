@@ -3,15 +3,64 @@ Sensor Configuration
 This module contains configuration settings for all sensors.
 """
 
+import os
+from storage.config import DATA_DIR
+
 # Soil Moisture Sensor Configuration
 SOIL_MOISTURE_CONFIG = {
     "pin": 7,  # GPIO pin number
     "min_value": 0,  # Value when sensor is in air (to be calibrated)
     "max_value": 1,  # Value when sensor is in water (to be calibrated)
-    "calibration_samples": 10  # Number of samples to take during calibration
+    "calibration_samples": 10,  # Number of samples to take during calibration
+    "burst_samples": 64,  # Samples collected per reading
+    "sample_interval": 0.0,  # Seconds between samples in a burst
+    "filter": "trimmed_mean",  # "median", "trimmed_mean" or "ema"
+    "trim_fraction": 0.1,  # Fraction cut from each end for "trimmed_mean"
+    "ema_alpha": 0.1  # Smoothing factor for "ema"
 }
 
 # DHT22 Sensor Configuration
 DHT22_CONFIG = {
-    "pin": 4  # GPIO pin number
-} 
\ No newline at end of file
+    "pin": 4,  # GPIO pin number
+    "min_read_interval": 2.0,  # Seconds; the DHT22 cannot be read more often
+    "sample_interval": 10.0,  # Seconds between background reads after a good one
+    "max_staleness": 600  # Seconds a cached reading stays valid, None for no limit
+}
+
+# Locations monitored by one collector process and the pins of their sensors.
+# Every pin must be unique across all locations. Optional "latitude" and
+# "longitude" select the weather for a location; the collector's default
+# coordinates are used otherwise.
+LOCATIONS_CONFIG = {
+    "living_room": {
+        "dht22_pin": 4,
+        "soil_moisture_pin": 17
+    }
+}
+
+# Hardware Backend Configuration
+HARDWARE_CONFIG = {
+    # "gpio" (Raspberry Pi), "simulated" or "replay"; overridden by the env var below
+    "backend": "gpio",
+    "env_var": "LEAFMEALONE_HARDWARE",
+    # Trace every reading is recorded to for the "replay" backend, None for no
+    # recording; overridden by the env var below
+    "record": None,
+    "record_env_var": "LEAFMEALONE_HARDWARE_RECORD",
+    "simulated": {
+        "temperature": 21.0,  # Mean air temperature in Celsius
+        "temperature_swing": 3.0,  # Amplitude of the daily temperature cycle
+        "humidity": 55.0,  # Mean air humidity in percent
+        "soil_moisture": 0.6,  # Probability that the digital soil pin reads 1
+        "noise": 0.3,  # Standard deviation of the noise added to DHT22 values
+        "dht22_failure_rate": 0.1,  # Fraction of DHT22 reads that fail
+        "dht22_latency": (0.0, 0.0),  # Seconds, uniform range per DHT22 read
+        "digital_latency": (0.0, 0.0),  # Seconds, uniform range per digital read
+        "seed": None
+    },
+    "replay": {
+        "trace": os.path.join(DATA_DIR, "hardware_trace.jsonl"),  # Recorded with RecordingBackend
+        "speed": 60.0,  # Trace seconds played back per wall-clock second
+        "loop": True  # Restart from the beginning at the end of the trace
+    }
+}
@@ -4,67 +4,192 @@ DHT22 Sensor Module
 This module provides functions to read temperature and humidity from a DHT22 sensor.
 """
 
-import Adafruit_DHT
-import RPi.GPIO as GPIO
+import logging
+import threading
+import time
 from typing import Optional, Tuple
+from metrics.metrics import get_metrics
 from .config import DHT22_CONFIG
+from .hardware import HardwareBackend, get_backend
+
+logger = logging.getLogger(__name__)
 
 class DHT22Sensor:
-    def __init__(self, pin: int = DHT22_CONFIG["pin"]):
+    def __init__(self, pin: int = DHT22_CONFIG["pin"], backend: Optional[HardwareBackend] = None):
         """
         Initialize DHT22 sensor
         
         Args:
             pin (int): GPIO pin number where sensor is connected
+            backend (HardwareBackend): Hardware backend, defaults to the configured one
         """
         self.config = DHT22_CONFIG
         self.pin = pin
-        self.sensor = Adafruit_DHT.DHT22
+        self.backend = backend or get_backend()
+
+        # Last good reading as (temperature, humidity, monotonic time)
+        self._latest = None
+        self._lock = threading.Lock()
+        self._has_reading = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the background sampler thread"""
+        if self.is_sampling():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name=f"dht22-{self.pin}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the background sampler thread
+        
+        Args:
+            timeout (float): Seconds to wait for an in-flight read to finish
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_sampling(self) -> bool:
+        """Check whether the background sampler is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait_for_reading(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until a first good reading is available
+        
+        Args:
+            timeout (float): Seconds to wait, None to wait forever
+            
+        Returns:
+            bool: True if a reading is available
+        """
+        return self._has_reading.wait(timeout)
+
+    def get_age(self) -> Optional[float]:
+        """
+        Get the age of the last good reading
+        
+        Returns:
+            float or None: Seconds since the reading or None if there is none
+        """
+        with self._lock:
+            return time.monotonic() - self._latest[2] if self._latest else None
 
-    def read(self) -> Optional[Tuple[float, float]]:
+    def read(self, max_staleness: Optional[float] = None) -> Optional[Tuple[float, float]]:
         """
         Read temperature and humidity from sensor
         
+        While the background sampler runs, this returns the last good reading
+        immediately. Otherwise it does a blocking read, unless a cached reading
+        younger than max_staleness is available.
+        
+        Args:
+            max_staleness (float): Maximum age in seconds of a cached reading,
+                defaults to the "max_staleness" setting when sampling in background
+        
         Returns:
             tuple or None: (temperature, humidity) or None if reading failed
         """
+        if self.is_sampling():
+            if max_staleness is None:
+                max_staleness = self.config["max_staleness"]
+            return self._cached(max_staleness)
+
+        if max_staleness is not None:
+            cached = self._cached(max_staleness)
+            if cached:
+                return cached
+
         try:
-            humidity, temperature = Adafruit_DHT.read_retry(self.sensor, self.pin)
-            
-            if humidity is not None and temperature is not None:
+            with get_metrics().timed("dht22_read", pin=str(self.pin)) as timer:
+                humidity, temperature = self.backend.read_dht22_retry(self.pin)
+                timer.success = humidity is not None and temperature is not None
+
+            if timer.success:
+                self._store(temperature, humidity)
                 return temperature, humidity
             return None
             
         except Exception as e:
-            print(f"Error reading DHT22 sensor: {e}")
+            logger.error("Error reading DHT22 sensor: %s", e, extra={"stage": "dht22", "pin": self.pin})
             return None
 
-    def get_temperature(self) -> Optional[float]:
+    def get_temperature(self, max_staleness: Optional[float] = None) -> Optional[float]:
         """
         Get only temperature reading
         
+        Args:
+            max_staleness (float): See read()
+        
         Returns:
             float or None: Temperature in Celsius or None if reading failed
         """
-        reading = self.read()
+        reading = self.read(max_staleness)
         return reading[0] if reading else None
 
-    def get_humidity(self) -> Optional[float]:
+    def get_humidity(self, max_staleness: Optional[float] = None) -> Optional[float]:
         """
         Get only humidity reading
         
+        Args:
+            max_staleness (float): See read()
+        
         Returns:
             float or None: Humidity percentage or None if reading failed
         """
-        reading = self.read()
+        reading = self.read(max_staleness)
         return reading[1] if reading else None 
 
+    def _cached(self, max_staleness: Optional[float]) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            if self._latest is None:
+                return None
+            temperature, humidity, read_at = self._latest
+        if max_staleness is not None and time.monotonic() - read_at > max_staleness:
+            return None
+        return temperature, humidity
+
+    def _store(self, temperature: float, humidity: float) -> None:
+        with self._lock:
+            self._latest = (temperature, humidity, time.monotonic())
+        self._has_reading.set()
+
+    def _sample_loop(self) -> None:
+        """
+        Read the sensor once per interval, never faster than min_read_interval
+        
+        Failed samples are counted in dht22_sampler_failures_total, apart from
+        the dht22_retries_total of blocking reads.
+        """
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            success = False
+            try:
+                # Single attempt; the loop itself is the retry
+                with get_metrics().timed("dht22_read", pin=str(self.pin)) as timer:
+                    humidity, temperature = self.backend.read_dht22(self.pin)
+                    timer.success = humidity is not None and temperature is not None
+                if timer.success:
+                    self._store(temperature, humidity)
+                    success = True
+            except Exception as e:
+                logger.error("Error reading DHT22 sensor: %s", e, extra={"stage": "dht22", "pin": self.pin})
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("DHT22 sample", extra={"stage": "dht22", "pin": self.pin, "success": success,
+                                                    "duration": time.monotonic() - started})
+            if not success:
+                get_metrics().inc("dht22_sampler_failures_total", pin=str(self.pin))
+
+            interval = self.config["sample_interval"] if success else self.config["min_read_interval"]
+            interval = max(interval, self.config["min_read_interval"])
+            self._stop_event.wait(max(0, interval - (time.monotonic() - started)))
+
     def cleanup(self):
-        """Clean up GPIO resources"""
-        # The Adafruit_DHT library might handle GPIO internally, 
-        # but we'll clean up our pin just in case
-        try:
-            GPIO.cleanup(self.pin)
-        except:
-            # If GPIO wasn't set up by us directly, this might fail
-            pass 
\ No newline at end of file
+        """Stop the background sampler and clean up GPIO resources"""
+        self.stop(timeout=self.config["min_read_interval"])
+        self.backend.cleanup(self.pin)
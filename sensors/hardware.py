@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Hardware Backend Module
+This module abstracts the GPIO and DHT22 access used by the sensors, so the
+collection pipeline can run on the Raspberry Pi, against simulated hardware,
+or by replaying a recorded trace.
+"""
+
+import bisect
+import json
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from metrics.metrics import get_metrics
+from .config import HARDWARE_CONFIG
+
+
+class HardwareBackend(ABC):
+    """
+    Base class for hardware backends
+    """
+
+    def setup_input(self, pin: int) -> None:
+        """Configure a pin as a digital input"""
+
+    @abstractmethod
+    def read_digital(self, pin: int) -> int:
+        """Read a digital input pin"""
+
+    @abstractmethod
+    def read_dht22(self, pin: int) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Make a single DHT22 read attempt
+
+        Returns:
+            tuple: (humidity, temperature), both None if the attempt failed
+        """
+
+    def read_dht22_retry(self, pin: int, retries: int = 15,
+                         delay_seconds: float = 2) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Read the DHT22, retrying failed attempts like Adafruit_DHT.read_retry
+
+        Every attempt after the first is counted in dht22_retries_total.
+
+        Returns:
+            tuple: (humidity, temperature), both None if every attempt failed
+        """
+        for attempt in range(retries):
+            humidity, temperature = self.read_dht22(pin)
+            if humidity is not None and temperature is not None:
+                return humidity, temperature
+            if attempt < retries - 1:
+                get_metrics().inc("dht22_retries_total", pin=str(pin))
+                time.sleep(delay_seconds)
+        return None, None
+
+    def cleanup(self, pin: Optional[int] = None) -> None:
+        """Release one pin, or all pins when pin is None"""
+
+
+class GPIOBackend(HardwareBackend):
+    """
+    Real Raspberry Pi hardware through RPi.GPIO and Adafruit_DHT
+    """
+
+    def __init__(self):
+        # Imported here so other backends work on machines without these libraries
+        import Adafruit_DHT
+        import RPi.GPIO as GPIO
+
+        self.dht = Adafruit_DHT
+        self.gpio = GPIO
+        self.gpio.setmode(GPIO.BCM)
+        # DHT22 reads bit-bang a timing-critical protocol; concurrent reads on
+        # different pins make each other miss bits, so they are serialized
+        self._dht_lock = threading.Lock()
+
+    def setup_input(self, pin: int) -> None:
+        self.gpio.setup(pin, self.gpio.IN)
+
+    def read_digital(self, pin: int) -> int:
+        return self.gpio.input(pin)
+
+    def read_dht22(self, pin: int) -> Tuple[Optional[float], Optional[float]]:
+        with self._dht_lock:
+            return self.dht.read(self.dht.DHT22, pin)
+
+    def cleanup(self, pin: Optional[int] = None) -> None:
+        # The Adafruit_DHT library might handle GPIO internally, so the pin may
+        # not have been set up by us and cleanup can fail
+        try:
+            if pin is None:
+                self.gpio.cleanup()
+            else:
+                self.gpio.cleanup(pin)
+        except Exception:
+            pass
+
+
+class SimulatedBackend(HardwareBackend):
+    """
+    Synthetic sensors with a daily temperature cycle, noise, failures and latency
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        """
+        Initialize the simulation
+
+        Args:
+            config (dict): Overrides for HARDWARE_CONFIG["simulated"] values
+        """
+        self.config = {**HARDWARE_CONFIG["simulated"], **(config or {})}
+        self.random = random.Random(self.config["seed"])
+        self._lock = threading.Lock()
+
+    def read_digital(self, pin: int) -> int:
+        self._sleep(self.config["digital_latency"])
+        with self._lock:
+            return int(self.random.random() < self.config["soil_moisture"])
+
+    def read_dht22(self, pin: int) -> Tuple[Optional[float], Optional[float]]:
+        self._sleep(self.config["dht22_latency"])
+        with self._lock:
+            if self.random.random() < self.config["dht22_failure_rate"]:
+                return None, None
+            noise = self.config["noise"]
+            # Coldest around 04:00, warmest around 16:00
+            hour = time.localtime().tm_hour + time.localtime().tm_min / 60
+            cycle = -math.cos((hour - 4) / 24 * 2 * math.pi)
+            temperature = self.config["temperature"] + self.config["temperature_swing"] * cycle
+            humidity = self.config["humidity"] - 2 * self.config["temperature_swing"] * cycle
+            return (round(humidity + self.random.gauss(0, noise), 1),
+                    round(temperature + self.random.gauss(0, noise), 1))
+
+    def _sleep(self, latency: Tuple[float, float]) -> None:
+        low, high = latency
+        if high > 0:
+            time.sleep(self.random.uniform(low, high))
+
+
+class ReplayBackend(HardwareBackend):
+    """
+    Plays back a recorded JSON Lines trace, optionally faster than real time
+
+    Each line is one reading, for example
+    {"t": 12.5, "kind": "dht22", "pin": 4, "humidity": 54.1, "temperature": 21.3}
+    {"t": 12.6, "kind": "digital", "pin": 17, "value": 1}
+    where t is seconds since the start of the recording. A read returns the latest
+    reading at the current playback position; pins missing from the trace use the
+    readings of any pin of the same kind.
+    """
+
+    def __init__(self, trace: str = HARDWARE_CONFIG["replay"]["trace"],
+                 speed: float = HARDWARE_CONFIG["replay"]["speed"],
+                 loop: bool = HARDWARE_CONFIG["replay"]["loop"]):
+        """
+        Load a trace
+
+        Args:
+            trace (str): Path to the JSON Lines trace
+            speed (float): Trace seconds played back per wall-clock second
+            loop (bool): Restart from the beginning at the end of the trace
+        """
+        self.speed = speed
+        self.loop = loop
+        self.series: Dict[Tuple[str, Optional[int]], Tuple[List[float], List[dict]]] = {}
+
+        records = []
+        with open(trace) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+        if not records:
+            raise ValueError(f"Trace {trace} is empty")
+        records.sort(key=lambda record: record["t"])
+
+        for record in records:
+            # A record without a pin belongs to the any-pin series only once
+            for key in dict.fromkeys(((record["kind"], record.get("pin")), (record["kind"], None))):
+                times, values = self.series.setdefault(key, ([], []))
+                times.append(record["t"])
+                values.append(record)
+
+        self.duration = records[-1]["t"]
+        self.started = time.monotonic()
+
+    def read_digital(self, pin: int) -> int:
+        return self._lookup("digital", pin)["value"]
+
+    def read_dht22(self, pin: int) -> Tuple[Optional[float], Optional[float]]:
+        record = self._lookup("dht22", pin)
+        return record.get("humidity"), record.get("temperature")
+
+    def read_dht22_retry(self, pin: int, retries: int = 15,
+                         delay_seconds: float = 2) -> Tuple[Optional[float], Optional[float]]:
+        # Retry delays elapse in trace time, so they shrink with the playback speed
+        return super().read_dht22_retry(pin, retries, delay_seconds / self.speed)
+
+    def position(self) -> float:
+        """Get the current playback position in trace seconds"""
+        elapsed = (time.monotonic() - self.started) * self.speed
+        if self.loop and self.duration > 0:
+            return elapsed % self.duration
+        return min(elapsed, self.duration)
+
+    def _lookup(self, kind: str, pin: int) -> dict:
+        series = self.series.get((kind, pin)) or self.series.get((kind, None))
+        if series is None:
+            raise KeyError(f"Trace has no {kind} readings")
+        times, values = series
+        index = bisect.bisect_right(times, self.position()) - 1
+        return values[max(index, 0)]
+
+
+class RecordingBackend(HardwareBackend):
+    """
+    Wraps another backend and appends every reading to a trace for ReplayBackend
+    """
+
+    def __init__(self, backend: HardwareBackend, trace: str = HARDWARE_CONFIG["replay"]["trace"]):
+        """
+        Start recording
+
+        Args:
+            backend (HardwareBackend): Backend doing the actual reads
+            trace (str): Path of the JSON Lines trace to append to
+        """
+        self.backend = backend
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(trace)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(trace, "a")
+
+    def setup_input(self, pin: int) -> None:
+        self.backend.setup_input(pin)
+
+    def read_digital(self, pin: int) -> int:
+        value = self.backend.read_digital(pin)
+        self._record({"kind": "digital", "pin": pin, "value": value})
+        return value
+
+    def read_dht22(self, pin: int) -> Tuple[Optional[float], Optional[float]]:
+        humidity, temperature = self.backend.read_dht22(pin)
+        self._record({"kind": "dht22", "pin": pin, "humidity": humidity, "temperature": temperature})
+        return humidity, temperature
+
+    def cleanup(self, pin: Optional[int] = None) -> None:
+        self.backend.cleanup(pin)
+        if pin is None:
+            with self._lock:
+                self._file.close()
+
+    def _record(self, record: dict) -> None:
+        record["t"] = round(time.monotonic() - self.started, 3)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(json.dumps(record) + "\n")
+                self._file.flush()
+
+
+BACKENDS = {
+    "gpio": GPIOBackend,
+    "simulated": SimulatedBackend,
+    "replay": ReplayBackend
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> HardwareBackend:
+    """
+    Get the process-wide hardware backend, creating it on first use
+
+    The backend is chosen by the LEAFMEALONE_HARDWARE environment variable,
+    falling back to HARDWARE_CONFIG["backend"]. If LEAFMEALONE_HARDWARE_RECORD or
+    HARDWARE_CONFIG["record"] names a trace, it is wrapped in a RecordingBackend
+    appending to that trace.
+
+    Returns:
+        HardwareBackend: Shared backend instance
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.getenv(HARDWARE_CONFIG["env_var"]) or HARDWARE_CONFIG["backend"]
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown hardware backend '{name}', use one of {', '.join(BACKENDS)}")
+            _backend = BACKENDS[name]()
+            trace = os.getenv(HARDWARE_CONFIG["record_env_var"]) or HARDWARE_CONFIG["record"]
+            if trace:
+                _backend = RecordingBackend(_backend, trace)
+        return _backend
+
+
+def set_backend(backend: HardwareBackend) -> None:
+    """
+    Replace the process-wide hardware backend, e.g. with a RecordingBackend
+
+    Args:
+        backend (HardwareBackend): Backend used by sensors created afterwards
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
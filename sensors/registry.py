@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Sensor Registry Module
+This module builds one set of sensors per monitored location from LOCATIONS_CONFIG.
+"""
+
+import time
+from typing import Dict, Optional
+from .config import LOCATIONS_CONFIG
+from .dht22 import DHT22Sensor
+from .hardware import HardwareBackend, get_backend
+from .soil_moisture import SoilMoistureSensor
+
+
+class SensorSet:
+    """
+    The sensors installed at one location
+    """
+
+    def __init__(self, location: str, dht22: DHT22Sensor, soil_moisture: SoilMoistureSensor):
+        self.location = location
+        self.dht22 = dht22
+        self.soil_moisture = soil_moisture
+
+    def read(self) -> Dict[str, Optional[float]]:
+        """
+        Read all sensors of this location one after the other
+
+        Returns:
+            dict: {"air_temp", "air_humidity", "soil_moisture"}, None for failed readings
+        """
+        temp_humidity = self.dht22.read()
+        return {
+            "air_temp": temp_humidity[0] if temp_humidity else None,
+            "air_humidity": temp_humidity[1] if temp_humidity else None,
+            "soil_moisture": self.soil_moisture.read()
+        }
+
+
+class SensorRegistry:
+    """
+    Maps each configured location to its SensorSet
+    """
+
+    def __init__(self, locations: Dict[str, dict] = LOCATIONS_CONFIG, backend: Optional[HardwareBackend] = None):
+        """
+        Create the sensors for every location
+
+        Args:
+            locations (dict): Location name -> {"dht22_pin", "soil_moisture_pin", ...}
+            backend (HardwareBackend): Hardware backend, defaults to the configured one
+
+        Raises:
+            ValueError: If two sensors are assigned the same pin
+        """
+        self.locations = locations
+        backend = backend or get_backend()
+
+        owners = {}
+        for location, pins in locations.items():
+            for key in ("dht22_pin", "soil_moisture_pin"):
+                pin = pins[key]
+                if pin in owners:
+                    raise ValueError(f"Pin {pin} of {location} is already used by {owners[pin]}")
+                owners[pin] = f"{location}.{key}"
+
+        self.sensor_sets = {
+            location: SensorSet(
+                location,
+                DHT22Sensor(pin=pins["dht22_pin"], backend=backend),
+                SoilMoistureSensor(pin=pins["soil_moisture_pin"], backend=backend)
+            )
+            for location, pins in locations.items()
+        }
+
+    def __iter__(self):
+        return iter(self.sensor_sets.values())
+
+    def __len__(self) -> int:
+        return len(self.sensor_sets)
+
+    def get(self, location: str) -> SensorSet:
+        """Get the sensors of a location"""
+        return self.sensor_sets[location]
+
+    def start(self) -> None:
+        """Start the background DHT22 sampler of every location"""
+        for sensor_set in self:
+            sensor_set.dht22.start()
+
+    def wait_for_readings(self, timeout: float) -> None:
+        """
+        Wait until every DHT22 has a first reading, for at most timeout seconds in total
+
+        Args:
+            timeout (float): Seconds to wait
+        """
+        deadline = time.monotonic() + timeout
+        for sensor_set in self:
+            sensor_set.dht22.wait_for_reading(max(0, deadline - time.monotonic()))
+
+    def cleanup(self) -> None:
+        """Stop the samplers and release the pins of every location"""
+        for sensor_set in self:
+            sensor_set.soil_moisture.cleanup()
+            sensor_set.dht22.cleanup()
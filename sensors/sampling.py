@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Sampling Module
+This module provides a preallocated ring buffer and vectorized filters for
+oversampled sensor readings.
+"""
+
+import math
+import statistics
+from array import array
+from typing import Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FILTERS = ("median", "trimmed_mean", "ema")
+
+
+class SampleBuffer:
+    """
+    Fixed-capacity ring buffer of float samples
+
+    Storage is allocated once (a NumPy array when available, otherwise an
+    array('d')), so collecting a burst never allocates per sample.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Initialize the buffer
+
+        Args:
+            capacity (int): Maximum number of samples kept
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._data = np.zeros(capacity) if np is not None else array("d", [0.0] * capacity)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: float) -> None:
+        """Add a sample, overwriting the oldest one when full"""
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def clear(self) -> None:
+        """Drop all samples without releasing storage"""
+        self._next = 0
+        self._count = 0
+
+    def values(self):
+        """
+        Get the samples in arrival order
+
+        Returns:
+            numpy.ndarray or list: Samples, oldest first
+        """
+        start = (self._next - self._count) % self.capacity
+        if start + self._count <= self.capacity:
+            chunk = self._data[start:start + self._count]
+        else:
+            head = self._data[start:]
+            tail = self._data[:self._next]
+            chunk = np.concatenate((head, tail)) if np is not None else head + tail
+        return chunk if np is not None else list(chunk)
+
+
+def filter_samples(samples: Sequence[float], method: str = "trimmed_mean",
+                   trim_fraction: float = 0.1, ema_alpha: float = 0.1) -> Tuple[float, float]:
+    """
+    Reduce a burst of samples to a single value and a noise estimate
+
+    Args:
+        samples (sequence): Samples in arrival order
+        method (str): "median", "trimmed_mean" or "ema"
+        trim_fraction (float): Fraction cut from each end for "trimmed_mean"
+        ema_alpha (float): Smoothing factor for "ema", weight of the newest sample
+
+    Returns:
+        tuple: (filtered value, noise) where noise is the population standard deviation
+            (ddof=0) of the samples
+    """
+    if method not in FILTERS:
+        raise ValueError(f"Unknown filter '{method}', use one of {', '.join(FILTERS)}")
+    n = len(samples)
+    if n == 0:
+        raise ValueError("No samples to filter")
+
+    if np is not None:
+        return _filter_numpy(np.asarray(samples, dtype=float), method, trim_fraction, ema_alpha)
+    return _filter_python(list(samples), method, trim_fraction, ema_alpha)
+
+
+def _filter_numpy(samples, method: str, trim_fraction: float, ema_alpha: float) -> Tuple[float, float]:
+    n = samples.size
+    noise = float(samples.std())
+
+    if method == "median":
+        return float(np.median(samples)), noise
+
+    if method == "trimmed_mean":
+        cut = int(n * trim_fraction)
+        if cut == 0 or 2 * cut >= n:
+            return float(samples.mean()), noise
+        # Partial sort is enough to drop the extremes
+        trimmed = np.partition(samples, (cut, n - cut - 1))[cut:n - cut]
+        return float(trimmed.mean()), noise
+
+    # Closed-form EMA seeded with the first sample:
+    # y = (1-a)^(n-1) * x0 + sum_{i>=1} a * (1-a)^(n-1-i) * x_i
+    weights = ema_alpha * (1 - ema_alpha) ** np.arange(n - 1, -1, -1, dtype=float)
+    weights[0] = (1 - ema_alpha) ** (n - 1)
+    return float(np.dot(weights, samples)), noise
+
+
+def _filter_python(samples: list, method: str, trim_fraction: float, ema_alpha: float) -> Tuple[float, float]:
+    n = len(samples)
+    noise = statistics.pstdev(samples) if n > 1 else 0.0
+
+    if method == "median":
+        return float(statistics.median(samples)), noise
+
+    if method == "trimmed_mean":
+        cut = int(n * trim_fraction)
+        if cut == 0 or 2 * cut >= n:
+            return math.fsum(samples) / n, noise
+        trimmed = sorted(samples)[cut:n - cut]
+        return math.fsum(trimmed) / len(trimmed), noise
+
+    value = samples[0]
+    for sample in samples[1:]:
+        value += ema_alpha * (sample - value)
+    return value, noise
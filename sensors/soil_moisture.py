@@ -4,24 +4,31 @@ Soil Moisture Sensor Module
 This module provides functions to read soil moisture from a capacitive sensor.
 """
 
-import RPi.GPIO as GPIO
+import logging
 import time
-from typing import Optional
-from config import SOIL_MOISTURE_CONFIG
+from typing import Optional, Tuple
+from metrics.metrics import get_metrics
+from .config import SOIL_MOISTURE_CONFIG
+from .hardware import HardwareBackend, get_backend
+from .sampling import SampleBuffer, filter_samples
+
+logger = logging.getLogger(__name__)
 
 class SoilMoistureSensor:
-    def __init__(self, pin: int = SOIL_MOISTURE_CONFIG["pin"]):
+    def __init__(self, pin: int = SOIL_MOISTURE_CONFIG["pin"], backend: Optional[HardwareBackend] = None):
         """
         Initialize soil moisture sensor
         
         Args:
             pin (int): GPIO pin number where sensor is connected
+            backend (HardwareBackend): Hardware backend, defaults to the configured one
         """
         self.pin = pin
         self.config = SOIL_MOISTURE_CONFIG
+        self.buffer = SampleBuffer(self.config["burst_samples"])
+        self.backend = backend or get_backend()
         
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.pin, GPIO.IN)
+        self.backend.setup_input(self.pin)
 
     def calibrate(self, mode: str = "air"):
         """
@@ -43,7 +50,7 @@ class SoilMoistureSensor:
         
         try:
             for i in range(self.config["calibration_samples"]):
-                raw_value = GPIO.input(self.pin)
+                raw_value = self.backend.read_digital(self.pin)
                 values.append(raw_value)
                 print(f"Sample {i+1}: {raw_value}")
                 time.sleep(0.5)
@@ -65,32 +72,72 @@ class SoilMoistureSensor:
         Returns:
             float or None: Moisture level (0-100) or None if reading failed
         """
+        reading = self.read_with_noise()
+        return reading[0] if reading else None
+
+    def read_with_noise(self) -> Optional[Tuple[float, float]]:
+        """
+        Read a burst of samples and filter them into one moisture level
+        
+        The burst size and filter come from the "burst_samples", "filter",
+        "trim_fraction" and "ema_alpha" settings.
+        
+        Returns:
+            tuple or None: (moisture level 0-100, noise in percentage points) or None if reading failed
+        """
+        with get_metrics().timed("soil_read", pin=str(self.pin)) as timer:
+            reading = self._read_burst()
+            timer.success = reading is not None
+        if reading is not None and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Soil moisture reading", extra={"stage": "soil_moisture", "pin": self.pin,
+                                                         "moisture": reading[0], "noise": reading[1],
+                                                         "duration": timer.duration})
+        return reading
+
+    def _read_burst(self) -> Optional[Tuple[float, float]]:
         try:
-            # Read raw value from sensor
-            raw_value = GPIO.input(self.pin)
+            # Collect a burst of raw values into the preallocated buffer
+            self.buffer.clear()
+            interval = self.config["sample_interval"]
+            # Checked once per burst, so disabled per-sample output costs one branch per sample
+            debug = logger.isEnabledFor(logging.DEBUG)
+            for index in range(self.buffer.capacity):
+                raw_value = self.backend.read_digital(self.pin)
+                self.buffer.append(raw_value)
+                if debug:
+                    logger.debug("Soil moisture sample", extra={"stage": "soil_moisture", "pin": self.pin,
+                                                                "sample": index, "raw": raw_value})
+                if interval:
+                    time.sleep(interval)
 
-            print(f"Raw value: {raw_value}")
+            raw_value, raw_noise = filter_samples(
+                self.buffer.values(),
+                method=self.config["filter"],
+                trim_fraction=self.config["trim_fraction"],
+                ema_alpha=self.config["ema_alpha"]
+            )
             
             # Convert to percentage (adjust these values based on your sensor calibration)
             # You might need to adjust these values based on your specific sensor
             min_value = self.config["min_value"]  # Value when sensor is in air
             max_value = self.config["max_value"]  # Value when sensor is in water
+            scale = 100 / (max_value - min_value)
             
             # Calculate percentage
-            percentage = ((raw_value - min_value) / (max_value - min_value)) * 100
+            percentage = (raw_value - min_value) * scale
             
             # Ensure value is between 0 and 100
             percentage = max(0, min(100, percentage))
             
-            return percentage
+            return percentage, abs(raw_noise * scale)
             
         except Exception as e:
-            print(f"Error reading soil moisture sensor: {e}")
+            logger.error("Error reading soil moisture sensor: %s", e, extra={"stage": "soil_moisture", "pin": self.pin})
             return None
 
     def cleanup(self):
         """Clean up GPIO resources"""
-        GPIO.cleanup(self.pin)
+        self.backend.cleanup(self.pin)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,24 @@
+"""
+Storage Configuration
+This module contains configuration settings for on-device storage.
+"""
+
+import os
+
+# Directory for local state (outbox, caches), relative to the project root
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Outbox Configuration
+OUTBOX_CONFIG = {
+    "path": os.path.join(DATA_DIR, "outbox.db"),
+    "batch_size": 50,  # Records per upload request
+    "max_batches_per_flush": 20,  # Upper bound on requests per flush
+    "max_depth": 100000,  # Records kept; beyond this the oldest are dropped
+    # Failed deliveries (server errors, not unreachable servers) before a record
+    # is moved to the dead-letter table; rejected records (4xx) move at once
+    "max_attempts": 20,
+    "max_dead_letters": 10000,  # Dead-letter rows kept, oldest dropped first
+    # SQLite synchronous mode: "NORMAL" in WAL mode fsyncs at checkpoints only,
+    # batching disk syncs across appends; "FULL" fsyncs every append
+    "synchronous": "NORMAL"
+}
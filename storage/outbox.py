@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Outbox Module
+This module provides a durable on-disk queue for records waiting to be uploaded.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from .config import OUTBOX_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Results of a send_batch call
+SENT = "sent"
+FAILED = "failed"  # The server answered with an error; counts towards max_attempts
+UNREACHABLE = "unreachable"  # No answer, or the server is busy; retried without counting
+REJECTED = "rejected"  # The server refused the records; they are moved to the dead-letter table
+
+# Outcomes of a flush
+DRAINED = "drained"
+BACKLOG = "backlog"  # Everything sent was delivered, but max_batches left records queued
+STOPPED = "stopped"  # A batch could not be delivered and stays at the head of the queue
+
+
+class Outbox:
+    """
+    SQLite-backed FIFO of JSON records
+
+    Records are appended in order and only removed once a flush has delivered them,
+    so they survive restarts and network outages and are replayed oldest first.
+    Records the server rejects, or that fail max_attempts times, are moved to a
+    dead-letter table so they cannot block the queue; the queue itself keeps at
+    most max_depth records.
+    """
+
+    def __init__(self, path: str = OUTBOX_CONFIG["path"], synchronous: str = OUTBOX_CONFIG["synchronous"],
+                 config: Optional[dict] = None):
+        """
+        Open (or create) the outbox
+
+        Args:
+            path (str): Path to the SQLite database file
+            synchronous (str): SQLite synchronous mode ("NORMAL" or "FULL")
+            config (dict): Overrides of OUTBOX_CONFIG's limits
+        """
+        self.config = {**OUTBOX_CONFIG, **(config or {})}
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        # AUTOINCREMENT guarantees ids are never reused, so id order is append order
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")]
+        if "attempts" not in columns:
+            # Outboxes created before delivery attempts were counted
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            "id INTEGER PRIMARY KEY, "
+            "payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, "
+            "reason TEXT NOT NULL, "
+            "failed_at TEXT NOT NULL)"
+        )
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """
+        Append a record
+
+        Args:
+            record (dict): JSON-serializable record
+
+        Returns:
+            int: Id of the stored record
+        """
+        with self._lock:
+            row_id = self._conn.execute("INSERT INTO outbox (payload) VALUES (?)", (json.dumps(record),)).lastrowid
+            # Ids only grow, so this keeps at most max_depth records without counting them
+            dropped = self._conn.execute("DELETE FROM outbox WHERE id <= ?",
+                                         (row_id - self.config["max_depth"],)).rowcount
+        if dropped:
+            logger.warning("Outbox full, dropped %d oldest record(s)", dropped,
+                           extra={"stage": "outbox", "dropped": dropped})
+        return row_id
+
+    def peek(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Get the oldest records without removing them
+
+        Args:
+            limit (int): Maximum number of records
+
+        Returns:
+            list: (id, record) tuples, oldest first
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, payload FROM outbox ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def dead_letter(self, row_ids: List[int], reason: str) -> None:
+        """
+        Move records from the queue to the dead-letter table
+
+        Args:
+            row_ids (list): Ids of the records
+            reason (str): Why they could not be delivered
+        """
+        if not row_ids:
+            return
+        placeholders = ",".join("?" * len(row_ids))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO dead_letter (id, payload, attempts, reason, failed_at) "
+                    f"SELECT id, payload, attempts, ?, ? FROM outbox WHERE id IN ({placeholders})",
+                    [reason, datetime.utcnow().isoformat(), *row_ids]
+                )
+                self._conn.execute(f"DELETE FROM outbox WHERE id IN ({placeholders})", row_ids)
+                self._conn.execute(
+                    "DELETE FROM dead_letter WHERE id NOT IN (SELECT id FROM dead_letter ORDER BY id DESC LIMIT ?)",
+                    (self.config["max_dead_letters"],)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.warning("Moved %d record(s) to the dead-letter table: %s", len(row_ids), reason,
+                       extra={"stage": "outbox", "records": len(row_ids)})
+
+    def dead_letter_depth(self) -> int:
+        """
+        Get the number of records in the dead-letter table
+
+        Returns:
+            int: Number of records
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+
+    def requeue_dead_letters(self) -> int:
+        """
+        Move every dead-lettered record back into the queue, e.g. after a server fix
+
+        Returns:
+            int: Number of records requeued
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Appended behind the queued records, in their original order
+                count = self._conn.execute(
+                    "INSERT INTO outbox (payload) SELECT payload FROM dead_letter ORDER BY id"
+                ).rowcount
+                self._conn.execute("DELETE FROM dead_letter")
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def depth(self) -> int:
+        """
+        Get the number of records waiting to be delivered
+
+        Returns:
+            int: Number of records
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def flush(self, send_batch: Callable[[List[Dict[str, Any]]], Union[str, bool]],
+              batch_size: int = OUTBOX_CONFIG["batch_size"],
+              max_batches: Optional[int] = OUTBOX_CONFIG["max_batches_per_flush"]) -> Dict[str, Any]:
+        """
+        Deliver queued records in order, batch_size at a time
+
+        Stops at the first batch that fails to send; that batch stays at the head
+        of the queue and is retried on the next flush, until it has failed
+        max_attempts times. When a batch is rejected, its records are sent one by
+        one so only the rejected ones are dead-lettered.
+
+        Args:
+            send_batch (callable): Called with a list of records, returns SENT,
+                FAILED, UNREACHABLE or REJECTED (True and False mean SENT and FAILED)
+            batch_size (int): Maximum records per batch
+            max_batches (int): Maximum batches to send, None for no limit
+
+        Returns:
+            dict: delivered and dead_lettered record counts, and the outcome
+            (DRAINED, BACKLOG or STOPPED)
+        """
+        result = {"delivered": 0, "dead_lettered": 0, "outcome": DRAINED}
+        batches = 0
+        while True:
+            batch = self.peek(batch_size)
+            if not batch:
+                return result
+            if max_batches is not None and batches >= max_batches:
+                result["outcome"] = BACKLOG
+                return result
+
+            status = _status(send_batch([record for _, record in batch]))
+            if status == REJECTED and len(batch) > 1:
+                # Find the records the server refuses; the rest are delivered
+                for row_id, record in batch:
+                    if not self._deliver([(row_id, record)], _status(send_batch([record])), result):
+                        return result
+            elif not self._deliver(batch, status, result):
+                return result
+            batches += 1
+
+    def _deliver(self, batch: List[Tuple[int, Dict[str, Any]]], status: str, result: Dict[str, Any]) -> bool:
+        # Applies the result of sending batch; returns whether the flush can go on
+        row_ids = [row_id for row_id, _ in batch]
+        if status == SENT:
+            self._delete(row_ids)
+            result["delivered"] += len(batch)
+            return True
+        if status == REJECTED:
+            self.dead_letter(row_ids, "rejected by the server")
+            result["dead_lettered"] += len(batch)
+            return True
+
+        if status == FAILED:
+            exhausted = self._count_attempt(row_ids)
+            if exhausted:
+                self.dead_letter(exhausted, f"failed {self.config['max_attempts']} times")
+                result["dead_lettered"] += len(exhausted)
+        result["outcome"] = STOPPED
+        return False
+
+    def _delete(self, row_ids: List[int]) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(row_ids))})", row_ids)
+
+    def _count_attempt(self, row_ids: List[int]) -> List[int]:
+        # Returns the ids that have now used up max_attempts
+        placeholders = ",".join("?" * len(row_ids))
+        with self._lock:
+            self._conn.execute(f"UPDATE outbox SET attempts = attempts + 1 WHERE id IN ({placeholders})", row_ids)
+            rows = self._conn.execute(
+                f"SELECT id FROM outbox WHERE id IN ({placeholders}) AND attempts >= ?",
+                [*row_ids, self.config["max_attempts"]]
+            ).fetchall()
+        return [row_id for row_id, in rows]
+
+    def close(self) -> None:
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+
+def _status(result: Union[str, bool]) -> str:
+    if result is True:
+        return SENT
+    if result is False:
+        return FAILED
+    return result
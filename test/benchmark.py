@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+LeafMeAlone Benchmarks
+This script measures the collection, formatting, upload and database ingest
+paths, writes the results as JSON and compares them against a stored baseline.
+
+Usage:
+    PYTHONPATH=. python test/benchmark.py --output bench.json
+    PYTHONPATH=. python test/benchmark.py --save-baseline test/benchmark_baseline.json
+    PYTHONPATH=. python test/benchmark.py --baseline test/benchmark_baseline.json --tolerance 0.3
+    PYTHONPATH=. python test/benchmark.py --mongodb-uri mongodb://localhost:27017
+
+The whole suite runs --repeat times and each metric keeps its best run (highest
+throughput, lowest latency), the one least disturbed by other load on the
+machine; throughput is taken from the median call. The committed baseline was
+recorded with the defaults and mongomock, so save a new one before comparing on
+different hardware.
+
+Sensors always use the simulated hardware backend. Uploads and weather requests
+go to a stub HTTP server on localhost. The database benchmarks use the given
+mongod (in a scratch database that is dropped afterwards) or, without
+--mongodb-uri, mongomock as an in-process stand-in if it is installed. The
+AsyncDatabaseConnection benchmark needs a real mongod.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Must be set before the sensors are created by importing leaf_me_alone
+os.environ["LEAFMEALONE_HARDWARE"] = "simulated"
+from sensors.config import HARDWARE_CONFIG
+HARDWARE_CONFIG["simulated"].update(seed=42, dht22_failure_rate=0)
+
+import leaf_me_alone
+from storage.outbox import Outbox
+from weather.weather_reader import WeatherCache, WeatherReader
+
+WEATHER_RESPONSE = {
+    "utc_offset_seconds": 0,
+    "current": {
+        "temperature_2m": 20.5,
+        "relative_humidity_2m": 60,
+        "precipitation": 0,
+        "cloud_cover": 25,
+        "weather_code": 1
+    },
+    "daily": {"precipitation_sum": [0], "precipitation_probability_max": [10]},
+    "hourly": {"time": []}
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Accepts every upload with 201 and answers weather requests with a canned response"""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle plus delayed
+    # ACKs add ~40ms to every keep-alive request
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(201, b"{}")
+
+    def do_GET(self):
+        self._reply(200, json.dumps(WEATHER_RESPONSE).encode())
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_server():
+    """Run the stub HTTP server in a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def measure(func, iterations, warmup=10):
+    """
+    Time func over a number of iterations
+
+    Returns:
+        list: Per-call durations in seconds
+    """
+    for _ in range(warmup):
+        func()
+    durations = []
+    # Like timeit, keep collection pauses out of the timings
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - started)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return durations
+
+
+def throughput(durations, items_per_call=1):
+    return {"value": items_per_call / statistics.median(durations), "unit": "ops/s", "higher_is_better": True}
+
+
+def latency(durations, quantile):
+    value = statistics.quantiles(durations, n=100)[quantile - 1] if len(durations) > 1 else durations[0]
+    return {"value": value * 1000, "unit": "ms", "higher_is_better": False}
+
+
+def bench_format_data(iterations):
+    sensor_data = {"air_temp": 21.3, "air_humidity": 55.2, "soil_moisture": 64.0}
+    weather_data = {"temperature": 20.5, "precipitation": 0, "cloud_cover": 25, "moon_phase": "full_moon"}
+    manual_data = leaf_me_alone.get_manual_variables()
+    durations = measure(lambda: leaf_me_alone.format_data(sensor_data, weather_data, manual_data), iterations)
+    return {"format_data.throughput": throughput(durations)}
+
+
+def bench_cycle(base_url, workdir, iterations):
+    leaf_me_alone.API_URL = f"{base_url}/api/plantdata"
+    if leaf_me_alone.outbox is not None:
+        leaf_me_alone.outbox.close()
+    leaf_me_alone.outbox = Outbox(os.path.join(workdir, "outbox.db"))
+    reader = WeatherReader(cache=WeatherCache(os.path.join(workdir, "weather_cache"), ttl=0))
+    reader.base_url = f"{base_url}/v1/forecast"
+    leaf_me_alone.weather_reader = reader
+
+    durations = measure(leaf_me_alone.run_cycle, iterations, warmup=3)
+    return {
+        "cycle.latency_p50": latency(durations, 50),
+        "cycle.latency_p95": latency(durations, 95)
+    }
+
+
+def bench_send_to_api(base_url, iterations):
+    leaf_me_alone.API_URL = f"{base_url}/api/plantdata"
+    data = leaf_me_alone.format_data(None, None, leaf_me_alone.get_manual_variables())
+    durations = measure(lambda: leaf_me_alone.send_to_api(data), iterations)
+    return {"send_to_api.throughput": throughput(durations)}
+
+
+def open_database(mongodb_uri):
+    """
+    Get a DatabaseConnection on a scratch database
+
+    Returns:
+        DatabaseConnection or None: None if neither mongod nor mongomock is available
+    """
+    from database.db_connection import DatabaseConnection
+
+    if mongodb_uri:
+        return DatabaseConnection(uri=mongodb_uri, database="LeafMeAlone_benchmark")
+
+    try:
+        import mongomock
+        import mongomock_support  # noqa: F401
+    except ImportError:
+        return None
+    # mongomock lacks list_collections, so provisioning is skipped
+    return DatabaseConnection(ensure_indexes=False, ensure_timeseries=False,
+                              database="LeafMeAlone_benchmark", client=mongomock.MongoClient())
+
+
+def bench_database(mongodb_uri, iterations):
+    db = open_database(mongodb_uri)
+    if db is None:
+        return {}
+
+    document = leaf_me_alone.format_data(None, None, leaf_me_alone.get_manual_variables())
+    document["timestamp"] = datetime(2025, 1, 1)
+    batch_size = 100
+    results = {}
+    try:
+        durations = measure(lambda: db.insert_plant_data(document), iterations)
+        results["db.insert_one.throughput"] = throughput(durations)
+
+        writer = db.buffered_writer(max_size=batch_size, max_age=3600)
+
+        def insert_batch():
+            for _ in range(batch_size):
+                writer.add_plant_data(document)
+            writer.flush()
+
+        durations = measure(insert_batch, max(1, iterations // batch_size), warmup=1)
+        results["db.buffered_insert.throughput"] = throughput(durations, batch_size)
+
+        durations = measure(db.get_latest_plant_data, iterations)
+        results["db.get_latest_plant_data.throughput"] = throughput(durations)
+
+        start = datetime.utcnow() - timedelta(days=1)
+        durations = measure(
+            lambda: sum(1 for _ in db.iter_plant_data("living_room", start=start, bucket=timedelta(hours=1))),
+            max(1, iterations // 10),
+            warmup=1
+        )
+        results["db.iter_plant_data_bucketed.latency_p50"] = latency(durations, 50)
+    finally:
+        if mongodb_uri:
+            db.client.drop_database(db.database)
+        db.close()
+    return results
+
+
+def bench_async_database(mongodb_uri, iterations, concurrency=200):
+    if not mongodb_uri:
+        return {}
+
+    from database.async_db_connection import AsyncDatabaseConnection
+
+    document = leaf_me_alone.format_data(None, None, leaf_me_alone.get_manual_variables())
+
+    async def run():
+        async with AsyncDatabaseConnection(uri=mongodb_uri, database="LeafMeAlone_benchmark") as db:
+            try:
+                await db.insert_plant_data(document)
+                started = time.perf_counter()
+                # Keep `concurrency` inserts in flight for the whole run
+                for _ in range(0, iterations * 10, concurrency):
+                    await asyncio.gather(*(db.insert_plant_data(document) for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+            finally:
+                await db.client.drop_database(db.database)
+        total = len(range(0, iterations * 10, concurrency)) * concurrency
+        return {"db.async_insert.throughput": {"value": total / elapsed, "unit": "ops/s", "higher_is_better": True}}
+
+    return asyncio.run(run())
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best(runs):
+    """
+    Combine repeated runs, keeping the best value of each metric
+
+    Returns:
+        dict: Results like a single run's, with the value of every run under "runs"
+    """
+    results = {}
+    for run in runs:
+        for name, result in run.items():
+            results.setdefault(name, {**result, "runs": []})["runs"].append(result["value"])
+    for result in results.values():
+        result["value"] = max(result["runs"]) if result["higher_is_better"] else min(result["runs"])
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against a baseline
+
+    Returns:
+        list: Descriptions of the metrics that regressed by more than tolerance
+            or that are in the baseline but missing from results
+    """
+    regressions = []
+    for name, reference in baseline["results"].items():
+        current = results.get(name)
+        if current is None:
+            regressions.append(f"{name}: missing from the results")
+            continue
+        if reference["higher_is_better"]:
+            regressed = current["value"] < reference["value"] * (1 - tolerance)
+        else:
+            regressed = current["value"] > reference["value"] * (1 + tolerance)
+        if regressed:
+            regressions.append(
+                f"{name}: {current['value']:.2f} {current['unit']} vs baseline {reference['value']:.2f}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LeafMeAlone benchmarks")
+    parser.add_argument("--iterations", type=int, default=200, help="iterations per benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of the whole suite, best kept (default: 5)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON file")
+    parser.add_argument("--save-baseline", help="write results as the new baseline to this file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression (default: 0.3)")
+    parser.add_argument("--mongodb-uri", help="mongod to benchmark against instead of mongomock")
+    args = parser.parse_args(argv)
+
+    db = open_database(args.mongodb_uri)
+    if db is None:
+        print("Skipping database benchmarks: pass --mongodb-uri or install mongomock")
+    else:
+        db.close()
+    if not args.mongodb_uri:
+        print("Skipping async database benchmarks: pass --mongodb-uri")
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir, stub_server() as base_url:
+        for _ in range(args.repeat):
+            run = {}
+            run.update(bench_format_data(args.iterations * 50))
+            run.update(bench_cycle(base_url, workdir, args.iterations // 4))
+            run.update(bench_send_to_api(base_url, args.iterations))
+            run.update(bench_database(args.mongodb_uri, args.iterations))
+            run.update(bench_async_database(args.mongodb_uri, args.iterations))
+            runs.append(run)
+        leaf_me_alone.cleanup()
+    results = best(runs)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "iterations": args.iterations,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+
+    for name, result in sorted(results.items()):
+        print(f"{name:45} {result['value']:12.2f} {result['unit']}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
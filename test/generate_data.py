@@ -1,7 +1,48 @@
+"""
+Test Data Generator
+
+Without arguments, inserts one random plant-data document. With --count, streams
+that many time-correlated synthetic samples to a JSONL file or to MongoDB:
+
+    PYTHONPATH=. python test/generate_data.py --count 1000000 --output plant_data.jsonl.gz
+    PYTHONPATH=. python test/generate_data.py --count 200000 --interval 60 --mongo
+    PYTHONPATH=. python test/generate_data.py --count 1000 --schema environmental --output -
+
+Samples are generated with NumPy one chunk at a time, so memory use depends on
+--chunk-size rather than --count.
+"""
+
+import argparse
+import gzip
 import json
+import logging
+import math
 import random
+import sys
 from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence
 from database.db_connection import DatabaseConnection
+from logs.structured import configure_logging, shutdown_logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+LOCATIONS = ["living_room", "bedroom", "kitchen", "balcony"]
+MOON_PHASES = ["new_moon", "waxing_crescent", "first_quarter", "waxing_gibbous",
+               "full_moon", "waning_gibbous", "last_quarter", "waning_crescent"]
+NEWS = [
+    "Local elections scheduled next month",
+    "New plant growth hormone identified",
+    "Water conservation measures announced in region"
+]
+SCHEMAS = ("format_data", "environmental")
+
+SYNODIC_MONTH_DAYS = 29.530588853
+REFERENCE_NEW_MOON = datetime(2000, 1, 6, 18, 14)
 
 def generate_random_float(min_val: float, max_val: float, decimals: int = 1) -> float:
     return round(random.uniform(min_val, max_val), decimals)
@@ -10,9 +51,8 @@ def generate_random_int(min_val: int, max_val: int) -> int:
     return random.randint(min_val, max_val)
 
 def generate_plant_data() -> dict:
-    locations = ["living_room", "bedroom", "kitchen", "balcony"]
-    moon_phases = ["new_moon", "waxing_crescent", "first_quarter", "waxing_gibbous",
-                  "full_moon", "waning_gibbous", "last_quarter", "waning_crescent"]
+    locations = LOCATIONS
+    moon_phases = MOON_PHASES
     
     data = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
@@ -52,7 +92,265 @@ def generate_plant_data() -> dict:
     
     return data
 
+def generate_bulk(count: int, locations: Sequence[str] = LOCATIONS, interval: float = 300,
+                  start: Optional[datetime] = None, schema: str = "format_data", chunk_size: int = 10000,
+                  seed: Optional[int] = None, as_datetime: bool = False) -> Iterator[List[dict]]:
+    """
+    Generate time-correlated samples in chunks
+
+    Every location gets a reading each interval seconds, in timestamp order.
+    Indoor temperature follows a daily cycle plus slow multi-day drift and part
+    of the outdoor temperature, air humidity moves against it, and soil moisture
+    decays exponentially between waterings every few days. Weather, market
+    indices and air quality are shared by all locations; the moon phase follows
+    the synodic month.
+
+    Args:
+        count (int): Number of documents to generate
+        locations (list): Location names
+        interval (float): Seconds between two readings of a location
+        start (datetime): Timestamp of the first reading, defaults to count readings before now
+        schema (str): "format_data" (the collector's upload records) or
+            "environmental" (environmental_data/external_factors documents)
+        chunk_size (int): Documents per yielded chunk
+        seed (int): Seed for reproducible output
+        as_datetime (bool): Give timestamps as datetime objects instead of ISO strings
+
+    Yields:
+        list: Up to chunk_size documents
+    """
+    if np is None:
+        raise RuntimeError("Bulk generation requires numpy")
+    if schema not in SCHEMAS:
+        raise ValueError(f"Unknown schema {schema!r}, expected one of {SCHEMAS}")
+
+    rng = np.random.default_rng(seed)
+    n_locations = len(locations)
+    steps = math.ceil(count / n_locations)
+    if start is None:
+        start = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=steps * interval)
+    start_day = (start - REFERENCE_NEW_MOON).total_seconds() / 86400
+
+    # Per-location character, drawn once so the series stay continuous across chunks
+    indoor_base = rng.uniform(19, 23, n_locations)
+    indoor_swing = rng.uniform(0.8, 2.5, n_locations)
+    humidity_base = rng.uniform(45, 65, n_locations)
+    light_peak = rng.uniform(3000, 8000, n_locations)
+    soil_dry = rng.uniform(20, 40, n_locations)
+    soil_wet = rng.uniform(75, 92, n_locations)
+    watering_days = rng.uniform(3, 7, n_locations)
+    watering_phase = rng.uniform(0, 1, n_locations) * watering_days
+    drying_days = watering_days * rng.uniform(0.4, 0.8, n_locations)
+
+    # Slow components (periods in days) for weather drift, cloud cover and markets
+    drift_periods = np.array([1.7, 3.9, 9.1])
+    drift_phases = rng.uniform(0, 2 * np.pi, (3, 3))
+
+    def drift(days, row):
+        return np.sin(2 * np.pi * days[:, None] / drift_periods + drift_phases[row]).mean(axis=1)
+
+    rows_per_chunk = max(1, chunk_size // n_locations)
+    produced = 0
+    for first_step in range(0, steps, rows_per_chunk):
+        step = np.arange(first_step, min(first_step + rows_per_chunk, steps))
+        seconds = step * interval
+        days = start_day + seconds / 86400
+        hour = (start.hour + start.minute / 60 + seconds / 3600) % 24
+        day_of_year = (start.timetuple().tm_yday + seconds / 86400) % 365.25
+        shape = (len(step), n_locations)
+
+        # Outdoor weather, shared by all locations
+        outdoor_temperature = 12 + 6 * np.sin(2 * np.pi * (hour - 9) / 24) + 4 * drift(days, 0) \
+            + rng.normal(0, 0.3, len(step))
+        cloud_cover = np.clip(50 + 60 * drift(days, 1) + rng.normal(0, 8, len(step)), 0, 100)
+        raining = (cloud_cover > 70) & (rng.random(len(step)) < 0.4)
+        precipitation = np.where(raining, rng.exponential(1.5, len(step)), 0)
+        moon_phase = np.floor((days % SYNODIC_MONTH_DAYS) / SYNODIC_MONTH_DAYS * 8 + 0.5).astype(int) % 8
+        air_quality = np.clip(85 + 8 * drift(days, 2) + 5 * raining + rng.normal(0, 2, len(step)), 0, 100)
+        market = drift(days, 2)
+        dow_jones = 36500 + 900 * market + rng.normal(0, 40, len(step))
+        nasdaq = 17450 + 450 * market + rng.normal(0, 20, len(step))
+
+        # Indoor readings, one column per location
+        daily = np.sin(2 * np.pi * (hour - 9) / 24)[:, None]
+        air_temperature = indoor_base + indoor_swing * daily + 0.15 * (outdoor_temperature[:, None] - 12) \
+            + rng.normal(0, 0.2, shape)
+        air_humidity = np.clip(humidity_base - 2 * (air_temperature - indoor_base)
+                               + 0.05 * (cloud_cover[:, None] - 50) + rng.normal(0, 0.8, shape), 15, 95)
+        since_watering = (days[:, None] - watering_phase) % watering_days
+        soil_humidity = np.clip(soil_dry + (soil_wet - soil_dry) * np.exp(-since_watering / drying_days)
+                                + rng.normal(0, 0.5, shape), 0, 100)
+        daylight = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None) * (1 - 0.6 * cloud_cover / 100)
+        light_intensity = light_peak * daylight[:, None] * rng.uniform(0.9, 1.1, shape)
+        light_duration = 6.5 + 2 * np.sin(2 * np.pi * (day_of_year - 80) / 365.25)
+
+        timestamps = np.datetime64(start, "us") + (seconds * 1e6).astype("timedelta64[us]")
+        if as_datetime:
+            timestamps = timestamps.astype(datetime).tolist()
+        else:
+            timestamps = np.datetime_as_string(timestamps, unit="s").tolist()
+            if schema == "environmental":
+                timestamps = [timestamp + "Z" for timestamp in timestamps]
+
+        # Convert once per chunk; building the dicts is the only per-document Python loop
+        columns = {
+            "air_temperature": np.round(air_temperature, 1).tolist(),
+            "air_humidity": np.round(air_humidity, 1).tolist(),
+            "soil_humidity": np.round(soil_humidity, 1).tolist(),
+            "light_intensity": np.round(light_intensity).astype(int).tolist(),
+        }
+        shared = {
+            "light_duration": np.round(light_duration, 1).tolist(),
+            "weather_temperature": np.round(outdoor_temperature, 1).tolist(),
+            "precipitation": np.round(precipitation, 1).tolist(),
+            "cloud_cover": np.round(cloud_cover).astype(int).tolist(),
+            "moon_phase": [MOON_PHASES[index] for index in moon_phase],
+            "air_quality": np.round(air_quality).astype(int).tolist(),
+            "dow_jones": np.round(dow_jones).astype(int).tolist(),
+            "nasdaq": np.round(nasdaq).astype(int).tolist()
+        }
+
+        chunk = []
+        for row in range(len(step)):
+            for column, location in enumerate(locations):
+                if produced == count:
+                    break
+                chunk.append(_build_document(schema, timestamps[row], location, row, column, columns, shared))
+                produced += 1
+        yield chunk
+
+
+def _build_document(schema: str, timestamp, location: str, row: int, column: int,
+                    columns: dict, shared: dict) -> dict:
+    air = {"humidity": columns["air_humidity"][row][column], "temperature": columns["air_temperature"][row][column]}
+    soil = {"humidity": columns["soil_humidity"][row][column]}
+    light = {"intensity": columns["light_intensity"][row][column], "duration": shared["light_duration"][row]}
+    weather = {
+        "temperature": shared["weather_temperature"][row],
+        "precipitation": shared["precipitation"][row],
+        "cloud_cover": shared["cloud_cover"][row],
+        "moon_phase": shared["moon_phase"][row],
+        "air_quality": shared["air_quality"][row]
+    }
+    market_indices = {"dow_jones": shared["dow_jones"][row], "nasdaq": shared["nasdaq"][row]}
+
+    if schema == "environmental":
+        return {
+            "timestamp": timestamp,
+            "environmental_data": {"location": location, "air": air, "soil": soil, "light": light},
+            "external_factors": {"weather": weather, "market_indices": market_indices, "news": list(NEWS)}
+        }
+    return {
+        "timestamp": timestamp,
+        "location": location,
+        "air": air,
+        "soil": soil,
+        "light": light,
+        "weather": weather,
+        "market_indices": market_indices,
+        "news": list(NEWS)
+    }
+
+
+def write_jsonl(chunks: Iterator[List[dict]], path: str) -> int:
+    """
+    Stream chunks to a JSONL file, gzip-compressed if path ends in .gz, or to stdout for "-"
+
+    Returns:
+        int: Number of documents written
+    """
+    written = 0
+    if path == "-":
+        f = sys.stdout
+    elif path.endswith(".gz"):
+        f = gzip.open(path, "wt")
+    else:
+        f = open(path, "w")
+    try:
+        for chunk in chunks:
+            f.write("".join(json.dumps(document) + "\n" for document in chunk))
+            written += len(chunk)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return written
+
+
+def insert_chunks(chunks: Iterator[List[dict]], db: DatabaseConnection,
+                  collection: str = "plant_data") -> Dict[str, Any]:
+    """
+    Insert chunks with one insert_batch each, keeping their timestamps
+
+    Returns:
+        dict: Number of documents inserted and the documents the server refused
+            as errors ({index, code, message}, index counted over all chunks)
+    """
+    inserted = 0
+    errors = []
+    offset = 0
+    for chunk in chunks:
+        result = db.insert_batch(collection, chunk)
+        inserted += result["inserted"]
+        errors += [{**error, "index": error["index"] + offset} for error in result["errors"]]
+        offset += len(chunk)
+        logger.info("Inserted chunk", extra={"stage": "generate_data", "collection": collection,
+                                             "inserted": inserted, "failed": len(errors)})
+    return {"inserted": inserted, "errors": errors}
+
+
+def bulk_main(args) -> None:
+    start = datetime.fromisoformat(args.start) if args.start else None
+    chunks = generate_bulk(
+        args.count,
+        locations=args.locations,
+        interval=args.interval,
+        start=start,
+        schema=args.schema,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+        as_datetime=args.mongo
+    )
+    if args.mongo:
+        db = DatabaseConnection()
+        try:
+            result = insert_chunks(chunks, db, args.collection)
+        finally:
+            db.close()
+        if result["errors"]:
+            logger.error("Some documents were not inserted", extra={
+                "stage": "generate_data", "collection": args.collection, "failed": len(result["errors"])})
+        logger.info("Successfully inserted %d documents into %s", result["inserted"], args.collection)
+    else:
+        written = write_jsonl(chunks, args.output)
+        if args.output != "-":
+            logger.info("Successfully wrote %d documents to %s", written, args.output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic LeafMeAlone data")
+    parser.add_argument("--count", type=int, help="generate this many documents in bulk mode")
+    parser.add_argument("--locations", nargs="+", default=LOCATIONS, help="location names")
+    parser.add_argument("--interval", type=float, default=300, help="seconds between readings per location")
+    parser.add_argument("--start", help="ISO timestamp of the first reading (default: ends now)")
+    parser.add_argument("--schema", choices=SCHEMAS, default="format_data", help="document layout")
+    parser.add_argument("--output", default="plant_data.jsonl", help="JSONL file, .gz to compress, - for stdout")
+    parser.add_argument("--mongo", action="store_true", help="insert into MongoDB instead of writing a file")
+    parser.add_argument("--collection", default="plant_data", help="collection for --mongo")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="documents generated and written at once")
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR")
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+    if args.count:
+        configure_logging(args.log_level)
+        try:
+            bulk_main(args)
+        finally:
+            shutdown_logging()
+        return
+
     try:
         # Initialize database connection
         db = DatabaseConnection()
@@ -0,0 +1,24 @@
+"""
+mongomock Support
+Lets the tests and benchmarks run against mongomock with a current PyMongo.
+
+PyMongo 4.11+ passes a sort option with every bulk update, which mongomock 4.3
+does not accept; updates without a sort are forwarded as they are.
+"""
+
+import functools
+
+import mongomock
+from mongomock.collection import BulkOperationBuilder
+
+_add_update = BulkOperationBuilder.add_update
+
+
+@functools.wraps(_add_update)
+def _add_update_without_sort(self, *args, sort=None, **kwargs):
+    if sort is not None:
+        raise NotImplementedError("mongomock does not support sorted bulk updates")
+    return _add_update(self, *args, **kwargs)
+
+
+BulkOperationBuilder.add_update = _add_update_without_sort
@@ -0,0 +1,196 @@
+"""
+Async Database Connection Tests
+Runs AsyncDatabaseConnection against mongomock, wrapped in coroutines the way
+AsyncMongoClient exposes a database.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import asyncio
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import mongomock
+import mongomock_support  # noqa: F401
+
+import database.async_db_connection as async_db_connection
+from database.async_db_connection import AsyncDatabaseConnection
+
+
+class FakeAsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def to_list(self, length=None):
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+
+
+class FakeAsyncCollection:
+    """Collection whose methods are coroutines, except find which returns a cursor"""
+
+    def __init__(self, collection, calls):
+        self._collection = collection
+        self._calls = calls
+
+    def find(self, *args, **kwargs):
+        return FakeAsyncCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            self._calls.append((self._collection.name, name, args))
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+        return call
+
+
+class FakeAsyncDatabase:
+    def __init__(self, database, calls):
+        self._database = database
+        self._calls = calls
+
+    def __getitem__(self, name):
+        return FakeAsyncCollection(self._database[name], self._calls)
+
+    def __getattr__(self, name):
+        return self[name]
+
+    async def command(self, name):
+        return {'ok': 1}
+
+
+class FakeAsyncClient:
+    instances = []
+
+    def __init__(self, uri, **options):
+        self.mongo = mongomock.MongoClient()
+        self.calls = []
+        self.closed = False
+        self.admin = FakeAsyncDatabase(self.mongo.admin, self.calls)
+        FakeAsyncClient.instances.append(self)
+
+    def __getitem__(self, name):
+        return FakeAsyncDatabase(self.mongo[name], self.calls)
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncDatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        FakeAsyncClient.instances = []
+        patcher = mock.patch.object(async_db_connection, 'AsyncMongoClient', FakeAsyncClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # A database per test, so the process-wide latest cache never carries over
+        self.db = AsyncDatabaseConnection(ensure_indexes=False, ensure_timeseries=False, uri='mongomock://',
+                                          database=f'LeafMeAlone_{self.id().rsplit(".", 1)[-1]}')
+
+    async def asyncTearDown(self):
+        await self.db.close()
+
+    def inserts(self, collection):
+        return [args for name, method, args in FakeAsyncClient.instances[0].calls
+                if name == collection and method in ('insert_one', 'insert_many')]
+
+
+class TestConnect(AsyncDatabaseTestCase):
+
+    async def test_concurrent_operations_share_one_client(self):
+        await asyncio.gather(*(self.db.connect() for _ in range(10)))
+        await self.db.connect()
+        self.assertEqual(len(FakeAsyncClient.instances), 1)
+
+    async def test_close_closes_the_client(self):
+        await self.db.connect()
+        client = self.db.client
+        await self.db.close()
+        self.assertTrue(client.closed)
+        self.assertIsNone(self.db.client)
+
+
+class TestInsertAndLatest(AsyncDatabaseTestCase):
+
+    async def test_insert_then_get_latest(self):
+        await self.db.insert_plant_data({'location': 'kitchen', 'air': {'temperature': 20.0}})
+        await self.db.insert_plant_data({'location': 'living_room', 'air': {'temperature': 21.0}})
+        await self.db.insert_plant_data({'location': 'kitchen', 'air': {'temperature': 22.0}})
+
+        kitchen = await self.db.get_latest_plant_data('kitchen')
+        self.assertEqual(kitchen['air']['temperature'], 22.0)
+        latest = await self.db.get_latest_plant_data()
+        self.assertEqual(latest['location'], 'kitchen')
+        self.assertEqual(sorted(await self.db.get_latest_by_location()), ['kitchen', 'living_room'])
+
+    async def test_get_latest_backfills_from_history(self):
+        await self.db.connect()
+        FakeAsyncClient.instances[0].mongo[self.db.database].weather_data.insert_one(
+            {'temperature': 4.0, 'timestamp': datetime(2025, 4, 14, 12)}
+        )
+        self.assertEqual((await self.db.get_latest_weather_data())['temperature'], 4.0)
+        # The lookup was mirrored into the latest collection
+        entry = await self.db.db.latest.find_one({'_id': 'weather_data'})
+        self.assertEqual(entry['document']['temperature'], 4.0)
+
+    async def test_get_latest_returns_copies(self):
+        await self.db.insert_weather_data({'temperature': 4.0})
+        (await self.db.get_latest_weather_data())['temperature'] = 99.0
+        self.assertEqual((await self.db.get_latest_weather_data())['temperature'], 4.0)
+
+
+class TestBufferedWriter(AsyncDatabaseTestCase):
+
+    async def test_writes_in_batches(self):
+        writer = await self.db.buffered_writer(max_size=50, max_age=60)
+        for index in range(120):
+            await writer.add_plant_data({'location': 'kitchen', 'index': index})
+        self.assertEqual([len(args[0]) for args in self.inserts('plant_data')], [50, 50])
+        self.assertEqual(writer.pending(), 20)
+
+        result = await writer.close()
+        self.assertEqual(result, {'inserted': 20, 'errors': []})
+        self.assertEqual([len(args[0]) for args in self.inserts('plant_data')], [50, 50, 20])
+        self.assertEqual((await self.db.get_latest_plant_data('kitchen'))['index'], 119)
+
+    async def test_flush_if_due_flushes_stale_buffers(self):
+        writer = await self.db.buffered_writer(max_size=50, max_age=60)
+        await writer.add_weather_data({'temperature': 4.0})
+        self.assertEqual((await writer.flush_if_due())['inserted'], 0)
+
+        writer.max_age = 0
+        self.assertEqual((await writer.flush_if_due())['inserted'], 1)
+        self.assertEqual(writer.pending(), 0)
+
+    async def test_idle_buffer_is_written(self):
+        writer = await self.db.buffered_writer(max_size=50, max_age=0.2)
+        await writer.add_weather_data({'temperature': 4.0})
+        for _ in range(100):
+            if not writer.pending():
+                break
+            await asyncio.sleep(0.02)
+        self.assertEqual(len(self.inserts('weather_data')), 1)
+
+    async def test_close_flushes_writers(self):
+        writer = await self.db.buffered_writer(max_size=50, max_age=60)
+        async with writer:
+            await writer.add_news_data({'title': 'a'})
+        self.assertEqual(len(self.inserts('news_data')), 1)
+
+        await writer.add_news_data({'title': 'b'})
+        await self.db.close()
+        self.assertEqual(len(self.inserts('news_data')), 2)
+
+    async def test_plain_with_is_refused(self):
+        writer = await self.db.buffered_writer()
+        with self.assertRaises(TypeError):
+            with writer:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Buffered Writer Tests
+Runs BufferedWriter against mongomock.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import time
+import unittest
+from unittest import mock
+
+import mongomock
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from database.buffered_writer import BufferedWriter
+
+
+class TestBufferedWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['LeafMeAlone_test']
+        self.inserted = []
+        self.writer = BufferedWriter(self.db, max_size=10, max_age=0.2,
+                                     on_insert=lambda collection, documents: self.inserted.extend(documents))
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_full_buffer_is_written(self):
+        for index in range(25):
+            self.writer.add_plant_data({'index': index})
+        self.assertEqual(self.db.plant_data.count_documents({}), 20)
+        self.assertEqual(self.writer.close(), {'inserted': 5, 'errors': []})
+        self.assertEqual(len(self.inserted), 25)
+
+    def test_idle_buffer_is_written(self):
+        self.writer.add_weather_data({'temperature': 4.0})
+        deadline = time.monotonic() + 2
+        while self.db.weather_data.count_documents({}) == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.db.weather_data.count_documents({}), 1)
+        self.assertEqual(self.writer.pending(), 0)
+
+    def test_connection_failure_is_retried(self):
+        self.writer.add_plant_data({'index': 0})
+        with mock.patch.object(self.db.plant_data.__class__, 'insert_many', side_effect=AutoReconnect('down')):
+            result = self.writer.flush()
+        # Requeued, not yet an error
+        self.assertEqual(result, {'inserted': 0, 'errors': []})
+        self.assertEqual(self.writer.errors, [])
+        self.assertEqual(self.writer.pending(), 1)
+
+        self.assertEqual(self.writer.flush(), {'inserted': 1, 'errors': []})
+        self.assertEqual(self.db.plant_data.count_documents({}), 1)
+
+    def test_full_buffer_waits_for_backoff(self):
+        with mock.patch.object(self.db.plant_data.__class__, 'insert_many',
+                               side_effect=AutoReconnect('down')) as insert_many:
+            for index in range(30):
+                self.writer.add_plant_data({'index': index})
+            # The first full buffer failed; later ones wait for the backoff
+            self.assertEqual(insert_many.call_count, 1)
+        self.assertEqual(self.writer.pending(), 30)
+
+    def test_requeue_is_capped(self):
+        writer = BufferedWriter(self.db, max_size=10, max_age=60, max_pending=15)
+        with mock.patch.object(self.db.plant_data.__class__, 'insert_many', side_effect=AutoReconnect('down')):
+            for index in range(20):
+                writer.add_plant_data({'index': index})
+        self.assertEqual(writer.pending(), 15)
+        self.assertEqual([error['document']['index'] for error in writer.errors], [0, 1, 2, 3, 4])
+
+        self.assertEqual(writer.close(), {'inserted': 15, 'errors': []})
+        self.assertEqual(sorted(self.db.plant_data.distinct('index')), list(range(5, 20)))
+
+    def test_close_gives_up_requeued_documents(self):
+        self.writer.add_plant_data({'index': 0})
+        with mock.patch.object(self.db.plant_data.__class__, 'insert_many', side_effect=AutoReconnect('down')):
+            self.writer.flush()
+            result = self.writer.close()
+        self.assertEqual([error['document']['index'] for error in result['errors']], [0])
+        self.assertEqual(len(self.writer.errors), 1)
+        self.assertEqual(self.writer.pending(), 0)
+
+    def test_server_error_is_reported(self):
+        self.writer.add_plant_data({'index': 0})
+        self.writer.add_plant_data({'index': 1})
+        with mock.patch.object(self.db.plant_data.__class__, 'insert_many',
+                               side_effect=OperationFailure('not authorized', code=13)):
+            result = self.writer.flush()
+        self.assertEqual(result['inserted'], 0)
+        self.assertEqual([error['code'] for error in result['errors']], [13, 13])
+        self.assertEqual([error['document']['index'] for error in self.writer.errors], [0, 1])
+        self.assertEqual(self.writer.pending(), 0)
+        self.assertEqual(self.inserted, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
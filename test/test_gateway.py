@@ -0,0 +1,178 @@
+"""
+Gateway Tests
+Runs the ingest gateway on a local port against mongomock.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import http.client
+import json
+import os
+import threading
+import unittest
+from datetime import datetime
+
+os.environ.setdefault("LEAFMEALONE_HARDWARE", "simulated")
+
+import mongomock
+import mongomock_support  # noqa: F401
+import requests
+from pymongo.errors import AutoReconnect
+
+import leaf_me_alone
+from database.db_connection import DatabaseConnection
+from gateway.server import IngestServer
+from network.payload import PayloadEncoder, encode_compact, CONTENT_TYPES
+
+
+def make_record(location="living_room", timestamp="2025-04-14T12:00:00"):
+    sensor_data = {"air_temp": 21.5, "air_humidity": 55.0, "soil_moisture": 61.0}
+    record = leaf_me_alone.format_data(sensor_data, None, leaf_me_alone.get_manual_variables(location))
+    record["timestamp"] = timestamp
+    return record
+
+
+class GatewayTestCase(unittest.TestCase):
+    config = {}
+
+    def setUp(self):
+        self.db = DatabaseConnection(ensure_indexes=False, ensure_timeseries=False,
+                                     database="LeafMeAlone_test", client=mongomock.MongoClient())
+        self.server = IngestServer(("127.0.0.1", 0), self.db, {"flush_interval": 0.05, **self.config})
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/plantdata"
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.db.close()
+
+    def stored(self):
+        return list(self.db.db.plant_data.find({}, {"_id": 0}))
+
+
+class TestIngest(GatewayTestCase):
+
+    def test_record_is_written_before_201(self):
+        response = self.session.post(self.url, json=make_record())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"accepted": 1})
+        # No waiting: the answer means the insert has completed
+        stored = self.stored()
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0]["timestamp"], datetime(2025, 4, 14, 12))
+        self.assertEqual(stored[0]["location"], "living_room")
+
+    def test_compact_payload(self):
+        encoder = PayloadEncoder(["gzip"])
+        encoder.negotiate(CONTENT_TYPES["gzip"])
+        body, headers = encoder.encode([make_record(), make_record("kitchen")])
+        response = self.session.post(self.url, data=body, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(document["location"] for document in self.stored()), ["kitchen", "living_room"])
+
+    def test_options_advertises_compact_formats(self):
+        response = self.session.options(self.url)
+        self.assertEqual(response.status_code, 204)
+        encoder = PayloadEncoder(["gzip"])
+        self.assertEqual(encoder.negotiate(response.headers.get("Accept-Post")), "gzip")
+
+    def test_invalid_records_get_422(self):
+        bad = make_record()
+        bad["air"]["temperature"] = "warm"
+        del bad["location"]
+        response = self.session.post(self.url, json=[make_record(), bad])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(sorted(response.json()["records"]), ["1"])
+        self.assertEqual(self.stored(), [])
+
+    def test_unsupported_content_type_gets_415(self):
+        response = self.session.post(self.url, data=b"a,b", headers={"Content-Type": "text/csv"})
+        self.assertEqual(response.status_code, 415)
+
+    def test_unknown_static_block_gets_409(self):
+        records = [make_record()]
+        known = set(encode_compact(records)["static"])
+        document = encode_compact(records, known)
+        response = self.session.post(self.url, data=json.dumps(document),
+                                     headers={"Content-Type": CONTENT_TYPES["gzip"]})
+        self.assertEqual(response.status_code, 409)
+
+    def test_malformed_payload_gets_400(self):
+        response = self.session.post(self.url, data=b"{not json", headers={"Content-Type": "application/json"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_content_length(self):
+        for value, status in (("abc", 400), ("-1", 400)):
+            connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port, timeout=5)
+            connection.putrequest("POST", "/api/plantdata")
+            connection.putheader("Content-Length", value)
+            connection.endheaders()
+            self.assertEqual(connection.getresponse().status, status)
+            connection.close()
+
+    def test_failed_insert_gets_503(self):
+        def fail(documents):
+            raise AutoReconnect("connection closed")
+
+        self.db.insert_plant_data_batch = fail
+        response = self.session.post(self.url, json=make_record())
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(self.server.ingest.depth(), 0)
+
+    def test_concurrent_uploads_share_an_insert(self):
+        calls = []
+        release = threading.Event()
+        insert = self.db.insert_plant_data_batch
+
+        def blocking_insert(documents):
+            calls.append(len(documents))
+            if len(calls) == 1:
+                release.wait(5)
+            return insert(documents)
+
+        self.db.insert_plant_data_batch = blocking_insert
+        statuses = []
+
+        def upload(location):
+            statuses.append(requests.post(self.url, json=[make_record(location)] * 10).status_code)
+
+        first = threading.Thread(target=upload, args=("living_room",))
+        first.start()
+        while not calls:
+            threading.Event().wait(0.01)
+        # These queue up while the first insert is blocked
+        others = [threading.Thread(target=upload, args=(f"room{index}",)) for index in range(5)]
+        for thread in others:
+            thread.start()
+        while self.server.ingest.depth() < 60:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+
+        self.assertEqual(statuses, [201] * 6)
+        self.assertEqual(calls, [10, 50])
+        self.assertEqual(len(self.stored()), 60)
+
+
+class TestBackpressure(GatewayTestCase):
+    config = {"max_pending_records": 5, "retry_after": 7}
+
+    def test_too_many_pending_records_get_429(self):
+        response = self.session.post(self.url, json=[make_record()] * 6)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "7")
+        self.assertEqual(self.stored(), [])
+
+        response = self.session.post(self.url, json=[make_record()] * 5)
+        self.assertEqual(response.status_code, 201)
+
+
+if __name__ == "__main__":
+    unittest.main()
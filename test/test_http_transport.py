@@ -0,0 +1,63 @@
+"""
+HTTP Transport Tests
+Runs HttpTransport against a stub server on a local port.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from network.http_transport import HttpTransport
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/slow answers after 3 seconds, /busy with 503, anything else with 200"""
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(3)
+        self.send_response(503 if self.path == "/busy" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.transport = HttpTransport({"backoff_base": 0.4})
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_slow_response_times_out_at_deadline(self):
+        started = time.monotonic()
+        with self.assertRaises(requests.Timeout):
+            self.transport.get(f"{self.url}/slow", deadline=1)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_retries_stop_at_deadline(self):
+        started = time.monotonic()
+        response = self.transport.get(f"{self.url}/busy", deadline=1)
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_fast_response(self):
+        self.assertEqual(self.transport.get(f"{self.url}/ok", deadline=1).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
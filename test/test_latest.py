@@ -0,0 +1,76 @@
+"""
+Latest Readings Tests
+Runs the latest collection of DatabaseConnection against mongomock.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import unittest
+from datetime import datetime
+
+import mongomock
+import mongomock_support  # noqa: F401
+
+from database.db_connection import DatabaseConnection
+
+
+class TestLatest(unittest.TestCase):
+
+    def setUp(self):
+        # A database per test, so the process-wide latest cache never carries over
+        self.db = DatabaseConnection(ensure_indexes=False, ensure_timeseries=False, uri='mongomock://',
+                                     database=f'LeafMeAlone_{self.id().rsplit(".", 1)[-1]}',
+                                     client=mongomock.MongoClient())
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_single_insert_updates_latest(self):
+        self.db.insert_plant_data({'location': 'kitchen', 'index': 0})
+        # Visible to other processes as soon as the insert returns
+        entry = self.db.db.latest.find_one({'_id': 'plant_data/kitchen'})
+        self.assertEqual(entry['document']['index'], 0)
+
+        self.db.insert_weather_data({'temperature': 4.0})
+        self.assertEqual(self.db.db.latest.find_one({'_id': 'weather_data'})['document']['temperature'], 4.0)
+
+    def test_insert_replaces_cached_lookup(self):
+        self.db.insert_plant_data({'location': 'kitchen', 'index': 0})
+        self.assertEqual(self.db.get_latest_plant_data('kitchen')['index'], 0)
+        self.db.insert_plant_data({'location': 'kitchen', 'index': 1})
+        self.assertEqual(self.db.get_latest_plant_data('kitchen')['index'], 1)
+
+    def test_batch_updates_latest(self):
+        documents = [{'location': 'kitchen', 'index': index, 'timestamp': datetime(2025, 4, 14, index)}
+                     for index in range(3)]
+        self.assertEqual(self.db.insert_plant_data_batch(documents), {'inserted': 3, 'errors': []})
+        entry = self.db.db.latest.find_one({'_id': 'plant_data/kitchen'})
+        self.assertEqual(entry['document']['index'], 2)
+
+    def test_unfiltered_lookup_backfills_a_location(self):
+        self.db.db.plant_data.insert_many([
+            {'location': 'kitchen', 'index': 0, 'timestamp': datetime(2025, 4, 14, 12)},
+            {'location': 'hall', 'index': 1, 'timestamp': datetime(2025, 4, 14, 13)}
+        ])
+        self.assertEqual(self.db.get_latest_plant_data()['index'], 1)
+        self.assertEqual(sorted(self.db.get_latest_by_location()), ['hall'])
+        self.assertIsNone(self.db.db.latest.find_one({'_id': 'plant_data'}))
+
+    def test_mixed_timestamp_types(self):
+        self.db.db.latest.insert_many([
+            {'_id': 'plant_data/kitchen', 'collection': 'plant_data', 'key': 'kitchen',
+             'document': {'location': 'kitchen', 'timestamp': '2025-04-14T13:00:00'}},
+            {'_id': 'plant_data/hall', 'collection': 'plant_data', 'key': 'hall',
+             'document': {'location': 'hall', 'timestamp': datetime(2025, 4, 14, 12)}}
+        ])
+        self.assertEqual(self.db.get_latest_plant_data()['location'], 'kitchen')
+
+    def test_summaries_do_not_replace_readings(self):
+        self.db.insert_plant_data({'location': 'kitchen', 'soil': {'humidity': 60.0}})
+        self.db.insert_plant_data({'location': 'kitchen', 'soil': {'humidity': 50.0}, 'aggregate': {'samples': 12}})
+        self.assertEqual(self.db.get_latest_plant_data('kitchen')['soil']['humidity'], 60.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Outbox Tests
+Runs Outbox against a SQLite file in a temporary directory.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import os
+import tempfile
+import unittest
+
+from storage.outbox import BACKLOG, DRAINED, FAILED, REJECTED, SENT, STOPPED, UNREACHABLE, Outbox
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "outbox.db")
+        self.outbox = self.open()
+
+    def tearDown(self):
+        self.outbox.close()
+
+    def open(self, **config):
+        return Outbox(self.path, config={"max_attempts": 3, **config})
+
+    def fill(self, count):
+        for index in range(count):
+            self.outbox.append({"index": index})
+
+    def test_append_and_peek_in_order(self):
+        self.fill(3)
+        self.assertEqual(self.outbox.depth(), 3)
+        self.assertEqual([record for _, record in self.outbox.peek(2)], [{"index": 0}, {"index": 1}])
+
+    def test_records_survive_reopening(self):
+        self.fill(2)
+        self.outbox.close()
+        self.outbox = self.open()
+        self.assertEqual([record for _, record in self.outbox.peek(10)], [{"index": 0}, {"index": 1}])
+
+    def test_flush_delivers_in_batches(self):
+        self.fill(5)
+        batches = []
+        result = self.outbox.flush(lambda records: batches.append(records) or SENT, batch_size=2)
+        self.assertEqual(result, {"delivered": 5, "dead_lettered": 0, "outcome": DRAINED})
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(self.outbox.depth(), 0)
+
+    def test_flush_stops_at_max_batches(self):
+        self.fill(5)
+        result = self.outbox.flush(lambda records: True, batch_size=2, max_batches=1)
+        self.assertEqual(result, {"delivered": 2, "dead_lettered": 0, "outcome": BACKLOG})
+        self.assertEqual(self.outbox.peek(1)[0][1], {"index": 2})
+
+    def test_failed_batch_is_retried(self):
+        self.fill(2)
+        result = self.outbox.flush(lambda records: False)
+        self.assertEqual(result, {"delivered": 0, "dead_lettered": 0, "outcome": STOPPED})
+        self.assertEqual(self.outbox.depth(), 2)
+
+        self.assertEqual(self.outbox.flush(lambda records: SENT)["delivered"], 2)
+
+    def test_unreachable_does_not_count_attempts(self):
+        self.fill(1)
+        for _ in range(5):
+            self.assertEqual(self.outbox.flush(lambda records: UNREACHABLE)["outcome"], STOPPED)
+        self.assertEqual(self.outbox.depth(), 1)
+        self.assertEqual(self.outbox.dead_letter_depth(), 0)
+
+    def test_dead_letter_after_max_attempts(self):
+        self.fill(2)
+        for _ in range(2):
+            self.assertEqual(self.outbox.flush(lambda records: FAILED)["dead_lettered"], 0)
+        result = self.outbox.flush(lambda records: FAILED)
+        self.assertEqual(result, {"delivered": 0, "dead_lettered": 2, "outcome": STOPPED})
+        self.assertEqual(self.outbox.depth(), 0)
+        self.assertEqual(self.outbox.dead_letter_depth(), 2)
+
+    def test_rejected_records_are_dead_lettered_one_by_one(self):
+        self.fill(3)
+        refuse = {"index": 1}
+        result = self.outbox.flush(lambda records: REJECTED if refuse in records else SENT)
+        self.assertEqual(result, {"delivered": 2, "dead_lettered": 1, "outcome": DRAINED})
+        self.assertEqual(self.outbox.dead_letter_depth(), 1)
+
+        # Requeued behind anything still waiting
+        self.outbox.append({"index": 3})
+        self.assertEqual(self.outbox.requeue_dead_letters(), 1)
+        self.assertEqual([record for _, record in self.outbox.peek(10)], [{"index": 3}, refuse])
+        self.assertEqual(self.outbox.dead_letter_depth(), 0)
+
+    def test_dead_letter_table_is_capped(self):
+        self.outbox.close()
+        self.outbox = self.open(max_dead_letters=2)
+        self.fill(3)
+        self.outbox.flush(lambda records: REJECTED, batch_size=1)
+        self.assertEqual(self.outbox.dead_letter_depth(), 2)
+
+    def test_max_depth_drops_oldest(self):
+        self.outbox.close()
+        self.outbox = self.open(max_depth=3)
+        self.fill(5)
+        self.assertEqual(self.outbox.depth(), 3)
+        self.assertEqual([record for _, record in self.outbox.peek(10)],
+                         [{"index": 2}, {"index": 3}, {"index": 4}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Parquet Export Tests
+Runs ParquetExporter against mongomock into a temporary directory.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+from bson import ObjectId
+
+from database.db_connection import DatabaseConnection
+
+try:
+    import pyarrow.dataset as ds
+    from export.parquet_export import ParquetExporter
+except ImportError:
+    ds = None
+
+START = datetime(2025, 4, 13)
+
+
+@unittest.skipIf(ds is None, "pyarrow is not installed")
+class TestParquetExport(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DatabaseConnection(ensure_indexes=False, ensure_timeseries=False,
+                                     database="LeafMeAlone_test", client=mongomock.MongoClient())
+        # Hourly readings of two locations over two days, inserted as they were taken
+        documents = []
+        for hour in range(48):
+            timestamp = START + timedelta(hours=hour)
+            for index, location in enumerate(("kitchen", "hall")):
+                inserted = timestamp.replace(tzinfo=timezone.utc) + timedelta(seconds=index)
+                documents.append({
+                    "_id": ObjectId.from_datetime(inserted),
+                    "timestamp": timestamp,
+                    "location": location,
+                    "air": {"temperature": 20.0 + hour % 5},
+                })
+        self.db.db.plant_data.insert_many(documents)
+        self.output = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+        self.exporter = ParquetExporter(self.db, self.output.name)
+
+    def tearDown(self):
+        self.db.close()
+
+    def rows(self, *parts):
+        dataset = ds.dataset(os.path.join(self.output.name, *parts), format="parquet", partitioning="hive")
+        return dataset.to_table().num_rows
+
+    def test_incremental_export(self):
+        result = self.exporter.export("plant_data")
+        self.assertEqual(result["rows"], 96)
+        self.assertEqual(len(result["files"]), 4)
+        self.assertEqual(self.rows("plant_data"), 96)
+
+        # Nothing new: the next run adds no rows
+        self.assertEqual(self.exporter.export("plant_data")["rows"], 0)
+        self.assertEqual(self.rows("plant_data"), 96)
+
+    def test_range_export_does_not_duplicate_rows(self):
+        self.exporter.export("plant_data")
+        result = self.exporter.export("plant_data", start=START, end=START + timedelta(days=1))
+        self.assertEqual(result["rows"], 48)
+        self.assertEqual(self.rows("plant_data"), 96)
+        self.assertEqual(self.rows("ranges", "20250413T000000-20250414T000000", "plant_data"), 48)
+
+        # Exporting the range again replaces its files
+        self.exporter.export("plant_data", start=START, end=START + timedelta(days=1))
+        self.assertEqual(self.rows("ranges", "20250413T000000-20250414T000000", "plant_data"), 48)
+
+
+if __name__ == "__main__":
+    unittest.main()
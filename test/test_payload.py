@@ -0,0 +1,155 @@
+"""
+Payload Tests
+Round-trips records through the compact upload format and checks the encoder's
+format fallback.
+
+Usage:
+    PYTHONPATH=. python -m unittest discover -s test -p "test_*.py"
+"""
+
+import copy
+import gzip
+import json
+import unittest
+
+from network.payload import (CONTENT_TYPES, PayloadEncoder, UnknownStaticBlockError, decode_compact,
+                             decode_payload, encode_compact, msgpack)
+
+
+def make_record(minute=0, location="living_room", temperature=21.5, news=None):
+    return {
+        "timestamp": f"2025-04-14T12:{minute:02d}:00",
+        "location": location,
+        "air": {"humidity": 55.0, "temperature": temperature},
+        "soil": {"humidity": 61.0},
+        "light": {"intensity": 5000, "duration": 6.5},
+        "weather": {"temperature": 12.3, "precipitation": 0, "cloud_cover": 25, "moon_phase": "full_moon",
+                    "air_quality": 85},
+        "market_indices": {"dow_jones": 36500, "nasdaq": 17450},
+        "news": news or ["Local elections scheduled next month"]
+    }
+
+
+class TestCompactRoundTrip(unittest.TestCase):
+
+    def round_trip(self, records, store=None):
+        document = json.loads(json.dumps(encode_compact(records)))
+        return decode_compact(document, {} if store is None else store)
+
+    def test_records_survive(self):
+        records = [make_record(minute, temperature=21.5 + minute / 10) for minute in range(0, 30, 5)]
+        self.assertEqual(self.round_trip(records), records)
+
+    def test_readings_are_delta_encoded(self):
+        document = encode_compact([make_record(0, temperature=21.3), make_record(5, temperature=21.4),
+                                   make_record(10, temperature=21.35)])
+        self.assertEqual(document["columns"]["air.temperature"], {"scale": 1000, "values": [21300, 100, -50]})
+        # Integer columns stay exact
+        self.assertEqual(document["columns"]["weather.cloud_cover"], {"scale": 1, "values": [25, 0, 0]})
+        self.assertEqual(document["timestamp"]["delta_us"][1:], [300000000, 300000000])
+
+    def test_schema_extras(self):
+        record = make_record()
+        record["notes"] = "repotted"
+        record["air"]["co2"] = 412
+        document = encode_compact([make_record(), record])
+        self.assertEqual(document["extra"], {"1": {"notes": "repotted", "air": {"co2": 412}}})
+        self.assertEqual(self.round_trip([make_record(), record])[1], record)
+
+    def test_absent_fields_stay_absent(self):
+        record = make_record()
+        del record["soil"]
+        record["weather"]["temperature"] = None
+        decoded = self.round_trip([make_record(), record])[1]
+        self.assertNotIn("soil", decoded)
+        self.assertIsNone(decoded["weather"]["temperature"])
+
+    def test_static_ref_is_run_length_encoded(self):
+        records = [make_record(0), make_record(5), make_record(10, news=["Other news"]), make_record(15)]
+        document = encode_compact(records)
+        first, second = document["static_ref"][0][0], document["static_ref"][1][0]
+        self.assertEqual(document["static_ref"], [[first, 2], [second, 1], [first, 1]])
+        self.assertEqual(sorted(document["static"]), sorted([first, second]))
+        self.assertEqual(self.round_trip(records), records)
+
+    def test_known_static_blocks_are_only_referenced(self):
+        records = [make_record(0), make_record(5)]
+        store = {}
+        decode_compact(encode_compact(records), store)
+
+        document = encode_compact(records, set(store))
+        self.assertEqual(document["static"], {})
+        self.assertEqual(decode_compact(document, store), records)
+
+
+class TestEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [make_record(0), make_record(5)]
+
+    def decode(self, body, headers, store):
+        return decode_payload(body, headers["Content-Type"], headers.get("Content-Encoding"), store)
+
+    def test_plain_json_until_negotiated(self):
+        encoder = PayloadEncoder(["gzip"])
+        body, headers = encoder.encode(self.records[:1])
+        self.assertEqual(headers, {"Content-Type": "application/json"})
+        self.assertEqual(json.loads(body), self.records[0])
+
+        self.assertEqual(encoder.negotiate(None), "json")
+
+    def test_gzip(self):
+        encoder = PayloadEncoder(["gzip"])
+        encoder.negotiate(f"application/json, {CONTENT_TYPES['gzip']}")
+        body, headers = encoder.encode(self.records)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(body))["count"], 2)
+        self.assertEqual(self.decode(body, headers, {}), self.records)
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        encoder = PayloadEncoder(["msgpack", "gzip"])
+        self.assertEqual(encoder.negotiate(f"{CONTENT_TYPES['gzip']}, {CONTENT_TYPES['msgpack']}"), "msgpack")
+        body, headers = encoder.encode(self.records)
+        self.assertEqual(self.decode(body, headers, {}), self.records)
+
+    def test_unsupported_media_type_falls_back_to_json(self):
+        encoder = PayloadEncoder(["gzip"])
+        encoder.negotiate(CONTENT_TYPES["gzip"])
+        self.assertTrue(encoder.rejected(415))
+        body, headers = encoder.encode(self.records)
+        self.assertEqual(headers, {"Content-Type": "application/json"})
+        self.assertEqual(json.loads(body), self.records)
+        # Plain JSON has nothing to fall back to
+        self.assertFalse(encoder.rejected(415))
+
+    def test_unknown_static_block_resends_blocks(self):
+        encoder = PayloadEncoder(["gzip"])
+        encoder.negotiate(CONTENT_TYPES["gzip"])
+        store = {}
+        body, headers = encoder.encode(self.records)
+        self.decode(body, headers, store)
+        encoder.accepted()
+
+        # The server forgot its blocks, e.g. after a restart
+        body, headers = encoder.encode(self.records)
+        with self.assertRaises(UnknownStaticBlockError):
+            self.decode(body, headers, {})
+        self.assertTrue(encoder.rejected(409))
+        body, headers = encoder.encode(self.records)
+        self.assertEqual(self.decode(body, headers, {}), self.records)
+
+        # Nothing acknowledged, so re-sending would not help
+        self.assertFalse(encoder.rejected(409))
+
+    def test_rejected_body_does_not_acknowledge_blocks(self):
+        encoder = PayloadEncoder(["gzip"])
+        encoder.negotiate(CONTENT_TYPES["gzip"])
+        encoder.encode(self.records)
+        # No accepted() call: the next batch still carries the blocks
+        body, headers = encoder.encode(copy.deepcopy(self.records))
+        self.assertEqual(self.decode(body, headers, {}), self.records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+"""
+Weather Configuration
+This module contains configuration settings for the weather reader.
+"""
+
+import os
+from storage.config import DATA_DIR
+
+# Weather Reader Configuration
+WEATHER_CONFIG = {
+    "base_url": "https://api.open-meteo.com/v1/forecast",
+    "cache_ttl": 900,  # Seconds; Open-Meteo refreshes "current" values every 15 minutes
+    "cache_dir": os.path.join(DATA_DIR, "weather_cache"),  # Shared by all collectors on the host
+    "forecast_days": 2,  # Hourly forecast kept for serving during outages
+    # Degrees; coordinates are snapped to this grid so nearby sites share one
+    # lookup (0.1 deg is about 11 km, finer than most Open-Meteo models). The
+    # weather is then that of the cell centre: the default 52.52, 13.41 is
+    # looked up as 52.5, 13.4
+    "grid_resolution": 0.1
+}
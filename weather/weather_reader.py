@@ -4,9 +4,163 @@ Weather Reader Module
 This module fetches weather data from the Open-Meteo API.
 """
 
-import requests
-from datetime import datetime
-from typing import Dict, Optional, Any
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+from metrics.metrics import get_metrics
+from network.http_transport import HttpTransport, get_transport
+from .config import WEATHER_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; cross-process locking is skipped there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Variables requested for the current conditions and the hourly forecast
+CURRENT_VARIABLES = [
+    "temperature_2m",
+    "relative_humidity_2m",
+    "precipitation",
+    "cloud_cover",
+    "weather_code"
+]
+HOURLY_VARIABLES = CURRENT_VARIABLES + ["precipitation_probability"]
+
+
+class WeatherCache:
+    """
+    Two-level cache of Open-Meteo responses keyed by (latitude, longitude)
+
+    Entries live in memory and in one JSON file per location under cache_dir, so
+    every collector on the host shares the same response. A per-location lock file
+    ensures only one process fetches while the others wait for its result.
+    """
+
+    def __init__(self, cache_dir: str = WEATHER_CONFIG["cache_dir"], ttl: float = WEATHER_CONFIG["cache_ttl"]):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir (str): Directory for the on-disk store
+            ttl (float): Seconds an entry is considered fresh
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._memory = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+        # Created on the first write, so constructing a cache touches no files
+        self._dir_ready = False
+
+    @staticmethod
+    def key(latitude: float, longitude: float) -> Tuple[float, float]:
+        """Normalize coordinates into a cache key"""
+        return round(latitude, 4), round(longitude, 4)
+
+    def get(self, key: Tuple[float, float]) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest entry for a location, from memory or disk
+
+        Args:
+            key (tuple): Key from WeatherCache.key
+
+        Returns:
+            dict or None: {"fetched_at": epoch seconds, "data": raw API response}
+        """
+        path = self._path(key)
+        with self._lock:
+            entry = self._memory.get(key)
+            loaded_mtime = self._mtimes.get(key)
+
+        try:
+            # Another process may have written a newer entry
+            mtime = os.path.getmtime(path)
+            if mtime != loaded_mtime:
+                with open(path) as f:
+                    entry = json.load(f)
+                with self._lock:
+                    self._memory[key] = entry
+                    self._mtimes[key] = mtime
+        except (OSError, ValueError):
+            pass
+
+        return entry
+
+    def put(self, key: Tuple[float, float], data: Dict[str, Any]) -> None:
+        """
+        Store a fresh API response
+
+        Args:
+            key (tuple): Key from WeatherCache.key
+            data (dict): Raw API response
+        """
+        entry = {"fetched_at": time.time(), "data": data}
+        with self._lock:
+            self._memory[key] = entry
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self._ensure_dir()
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._mtimes[key] = os.path.getmtime(path)
+        except OSError as e:
+            logger.error("Error writing weather cache: %s", e, extra={"path": path})
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        """Check whether an entry is within the TTL"""
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    @contextmanager
+    def lock(self, key: Tuple[float, float]):
+        """Hold the cross-process fetch lock for a location"""
+        if fcntl is None:
+            yield
+            return
+
+        self._ensure_dir()
+        with open(self._path(key) + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_dir(self) -> None:
+        if not self._dir_ready:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._dir_ready = True
+
+    def _path(self, key: Tuple[float, float]) -> str:
+        return os.path.join(self.cache_dir, f"{key[0]:.4f}_{key[1]:.4f}.json")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_weather_cache() -> WeatherCache:
+    """
+    Get the process-wide weather cache, creating it on first use
+
+    Returns:
+        WeatherCache: Shared cache instance
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = WeatherCache()
+        return _default_cache
 
 
 class WeatherReader:
@@ -14,61 +168,185 @@ class WeatherReader:
     Class to fetch and parse weather data from Open-Meteo API
     """
     
-    def __init__(self, latitude: float = 52.52, longitude: float = 13.41):
+    def __init__(self, latitude: float = 52.52, longitude: float = 13.41,
+                 transport: Optional[HttpTransport] = None, cache: Optional[WeatherCache] = None):
         """
         Initialize the weather reader with location coordinates
         
         Args:
             latitude (float): Latitude of the location
             longitude (float): Longitude of the location
+            transport (HttpTransport): HTTP transport to use, defaults to the shared one
+            cache (WeatherCache): Response cache to use, defaults to the shared one
         """
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+        self.base_url = WEATHER_CONFIG["base_url"]
         self.latitude = latitude
         self.longitude = longitude
+        self.transport = transport or get_transport()
+        self.cache = cache or get_weather_cache()
         
     def get_data(self) -> Optional[Dict[str, Any]]:
         """
-        Fetch weather data from Open-Meteo API
+        Get current weather data, from the cache while it is fresh
+        
+        On a failed fetch, the cached hourly forecast for the current hour is
+        returned instead.
         
         Returns:
-            dict or None: Weather data dictionary or None if error
+            dict or None: Weather data dictionary or None if nothing is available
+        """
+        coordinates = (self.latitude, self.longitude)
+        return self.get_data_batch([coordinates])[coordinates]
+
+    def get_data_batch(self, coordinates: Iterable[Tuple[float, float]],
+                       deadline: Optional[float] = None) -> Dict[Tuple[float, float], Optional[Dict[str, Any]]]:
+        """
+        Get current weather data for many locations with at most one API request
+        
+        Coordinates are snapped to a grid of WEATHER_CONFIG["grid_resolution"]
+        degrees, so nearby locations share one lookup. Cells missing from the cache
+        are fetched together, as Open-Meteo accepts comma-separated coordinate lists.
+        
+        Args:
+            coordinates (iterable): (latitude, longitude) pairs
+            deadline (float): Seconds the API request may take, retries included;
+                cells it cannot fetch in time are served from the cached forecast
+            
+        Returns:
+            dict: Each input (latitude, longitude) -> weather data dictionary or None
+        """
+        ends = time.monotonic() + deadline if deadline is not None else None
+        cells = {coordinate: self.snap(*coordinate) for coordinate in coordinates}
+        keys = sorted(set(cells.values()))
+
+        entries = {key: self.cache.get(key) for key in keys}
+        stale = [key for key in keys if not self.cache.is_fresh(entries[key])]
+
+        if stale:
+            # Locks are taken in sorted order so concurrent batches cannot deadlock
+            with ExitStack() as stack:
+                for key in stale:
+                    stack.enter_context(self.cache.lock(key))
+
+                # Another collector may have refreshed entries while we waited
+                for key in stale:
+                    entries[key] = self.cache.get(key)
+                stale = [key for key in stale if not self.cache.is_fresh(entries[key])]
+
+                # The deadline also covers waiting for the locks
+                remaining = ends - time.monotonic() if ends is not None else None
+                responses = self._fetch(stale, remaining) if stale and (remaining is None or remaining > 0) else None
+                if responses is not None:
+                    for key, api_data in zip(stale, responses):
+                        self.cache.put(key, api_data)
+                        entries[key] = {"fetched_at": time.time(), "data": api_data}
+                    stale = []
+
+        weather = {}
+        for key in keys:
+            entry = entries[key]
+            if entry is None:
+                weather[key] = None
+            elif key not in stale:
+                weather[key] = self._format_weather_data(entry["data"])
+            else:
+                weather[key] = self._format_forecast_hour(entry["data"])
+                if weather[key] is not None:
+                    logger.warning("Using cached forecast for the current hour", extra={"stage": "weather", "cell": key})
+
+        return {coordinate: weather[cell] for coordinate, cell in cells.items()}
+
+    @staticmethod
+    def snap(latitude: float, longitude: float) -> Tuple[float, float]:
+        """
+        Snap coordinates to the shared weather grid
+        
+        Args:
+            latitude (float): Latitude of the location
+            longitude (float): Longitude of the location
+            
+        Returns:
+            tuple: Cache key of the grid cell
+        """
+        resolution = WEATHER_CONFIG["grid_resolution"]
+        return WeatherCache.key(round(latitude / resolution) * resolution,
+                                round(longitude / resolution) * resolution)
+
+    def _fetch(self, cells: List[Tuple[float, float]], deadline: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch weather data for one or more grid cells from Open-Meteo API
+        
+        Args:
+            cells (list): (latitude, longitude) pairs
+            deadline (float): Seconds the request may take, retries included
+        
+        Returns:
+            list or None: Raw API responses in the order of cells, or None if error
         """
         try:
             # Construct query parameters
             params = {
-                "latitude": self.latitude,
-                "longitude": self.longitude,
-                "current": [
-                    "temperature_2m",
-                    "relative_humidity_2m",
-                    "precipitation",
-                    "cloud_cover",
-                    "weather_code"
-                ],
+                "latitude": ",".join(str(latitude) for latitude, _ in cells),
+                "longitude": ",".join(str(longitude) for _, longitude in cells),
+                "current": CURRENT_VARIABLES,
+                "hourly": HOURLY_VARIABLES,
                 "daily": [
                     "precipitation_sum",
                     "precipitation_probability_max"
                 ],
+                "forecast_days": WEATHER_CONFIG["forecast_days"],
                 "timezone": "auto"
             }
             
             # Make API request
-            response = requests.get(self.base_url, params=params)
+            with get_metrics().timed("weather_fetch") as timer:
+                response = self.transport.get(self.base_url, params=params, deadline=deadline)
+                timer.success = response.status_code == 200
+            logger.debug("Fetched weather", extra={"stage": "weather", "cells": len(cells),
+                                                   "status": response.status_code, "duration": timer.duration})
             
             # Check if request was successful
             if response.status_code == 200:
-                weather_data = response.json()
-                
-                # Format the data for our application
-                formatted_data = self._format_weather_data(weather_data)
-                return formatted_data
+                data = response.json()
+                # A single location comes back as an object, several as a list
+                responses = data if isinstance(data, list) else [data]
+                if len(responses) != len(cells):
+                    # Matching them up by position would file weather under the wrong cells
+                    logger.error("Expected weather for %d cells, got %d", len(cells), len(responses),
+                                 extra={"stage": "weather", "cells": len(cells)})
+                    return None
+                return responses
             else:
-                print(f"Error fetching weather data: {response.status_code}")
+                logger.error("Error fetching weather data", extra={"stage": "weather", "status": response.status_code})
                 return None
                 
         except Exception as e:
-            print(f"Error getting weather data: {e}")
+            logger.error("Error getting weather data: %s", e, extra={"stage": "weather"})
             return None
+
+    def _format_forecast_hour(self, api_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Format the cached hourly forecast for the current hour
+        
+        Args:
+            api_data (dict): Raw API response with an "hourly" block
+            
+        Returns:
+            dict or None: Formatted weather data or None if the hour is not covered
+        """
+        hourly = api_data.get("hourly", {})
+        # Hourly times are local to the location, e.g. "2025-04-14T15:00"
+        local_now = datetime.utcnow() + timedelta(seconds=api_data.get("utc_offset_seconds", 0))
+        try:
+            index = hourly.get("time", []).index(local_now.strftime("%Y-%m-%dT%H:00"))
+        except ValueError:
+            return None
+
+        hour = {variable: hourly.get(variable, [None] * (index + 1))[index] for variable in HOURLY_VARIABLES}
+        return self._format_weather_data({
+            "current": hour,
+            "daily": {"precipitation_probability_max": [hour["precipitation_probability"]]}
+        })
             
     def _format_weather_data(self, api_data: Dict[str, Any]) -> Dict[str, Any]:
         """